@@ -85,4 +85,51 @@ for bar in bars_cbor:
                 xytext=(0, 3), textcoords="offset points", ha='center', color=cbor_color)
 
 plt.tight_layout()
-plt.show()
\ No newline at end of file
+
+# Content-Encoding runs: requests/sec per coding, and the gain over identity, per bandwidth tier
+import os
+
+codings = ["identity", "gzip", "deflate", "zstd"]
+coding_colors = {"identity": 'tab:gray', "gzip": 'tab:blue', "deflate": 'tab:orange', "zstd": 'tab:green'}
+
+def coding_file(folder, encoding, coding, bw):
+    if coding == "identity":
+        return f"{folder}/results_{encoding}_{bw}.txt"
+    return f"{folder}/results_{encoding}_{coding}_{bw}.txt"
+
+def avg_requests(encoding, coding):
+    # None when the tier was not measured with this coding
+    values = []
+    for bw in bandwidths:
+        files = [coding_file(folder, encoding, coding, bw) for folder in folders]
+        files = [f for f in files if os.path.exists(f)]
+        values.append(np.mean([extract_metrics(f) for f in files]) if files else None)
+    return values
+
+measured = [c for c in codings[1:] if any(os.path.exists(coding_file(folder, e, c, bw))
+                                          for folder in folders for e in ["json", "xml", "cbor"] for bw in bandwidths)]
+if measured:
+    fig, axes = plt.subplots(3, 1, figsize=(12, 14))
+    width = 0.8 / (len(measured) + 1)
+    for ax, encoding in zip(axes, ["json", "xml", "cbor"]):
+        identity = avg_requests(encoding, "identity")
+        for i, coding in enumerate(["identity"] + measured):
+            values = identity if coding == "identity" else avg_requests(encoding, coding)
+            heights = [v if v is not None else 0 for v in values]
+            bars = ax.bar(x + (i - len(measured) / 2) * width, heights, width, label=coding, color=coding_colors[coding])
+            if coding == "identity":
+                continue
+            # Annotate each bar with its gain over the uncompressed body
+            for bar, value, base in zip(bars, values, identity):
+                if value is None or not base:
+                    continue
+                ax.annotate(f'x{value / base:.1f}', xy=(bar.get_x() + bar.get_width() / 2, bar.get_height()),
+                            xytext=(0, 3), textcoords="offset points", ha='center', color=coding_colors[coding])
+        ax.set_title(f"Requests/sec by Content-Encoding ({encoding.upper()})")
+        ax.set_xticks(x)
+        ax.set_xticklabels(bandwidths, rotation=45)
+        ax.set_ylabel("Requests/sec")
+        ax.legend()
+    plt.tight_layout()
+
+plt.show()
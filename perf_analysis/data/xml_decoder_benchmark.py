@@ -0,0 +1,79 @@
+"""
+Benchmark of the XML decoding path of the Flask collector.
+
+Compares the former three-pass path (xmltodict, namespace stripping, ad-hoc
+interface type conversion) with the single-pass streaming decoder on data.xml.
+
+Usage (from perf_analysis/data):
+    python3 xml_decoder_benchmark.py [iterations]
+"""
+
+import os
+import sys
+import timeit
+
+import xmltodict
+from yangson import DataModel
+
+FLASK_IMPL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'python', 'flask_impl')
+sys.path.insert(0, FLASK_IMPL_DIR)
+
+from type_coercion import build_coercion_table  # noqa: E402
+from xml_decoder import XmlNotificationDecoder, build_element_schema  # noqa: E402
+
+YANG_DIR_PATH = os.path.join(FLASK_IMPL_DIR, '..', '..', 'yang_modules')
+YANG_LIBRARY_PATH = os.path.join(YANG_DIR_PATH, 'yang-library.json')
+
+
+# Former three-pass path
+def strip_namespace(data):
+    if isinstance(data, dict):
+        return {key.split(':')[-1]: strip_namespace(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [strip_namespace(item) for item in data]
+    return data
+
+
+def process_xml_interface_data(json_data):
+    interfaces = json_data['ietf-https-notif:notification']['interface_data']['interface']
+    if isinstance(interfaces, dict):
+        interfaces = [interfaces]
+    for interface in interfaces:
+        if 'enabled' in interface:
+            interface['enabled'] = interface['enabled'] != 'false'
+        if 'if-index' in interface and isinstance(interface['if-index'], str):
+            interface['if-index'] = int(interface['if-index'])
+        if 'statistics' in interface:
+            for key in ['in-discards', 'in-errors', 'in-unknown-protos', 'out-discards', 'out-errors']:
+                if key in interface['statistics'] and isinstance(interface['statistics'][key], str):
+                    interface['statistics'][key] = int(interface['statistics'][key])
+    json_data['ietf-https-notif:notification']['interface_data']['interface'] = interfaces
+
+
+def three_pass(body):
+    tree = xmltodict.parse(body.decode('utf-8'), process_namespaces=False)
+    process_xml_interface_data(tree)
+    return strip_namespace(tree)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with open('data.xml', 'rb') as file:
+        body = file.read()
+
+    data_model = DataModel.from_file(YANG_LIBRARY_PATH, [YANG_DIR_PATH])
+    decoder = XmlNotificationDecoder(build_element_schema(data_model, build_coercion_table(data_model)))
+
+    results = {
+        'xmltodict + strip_namespace + process_xml_interface_data': timeit.timeit(
+            lambda: three_pass(body), number=iterations),
+        'streaming decoder': timeit.timeit(lambda: decoder.decode(body), number=iterations),
+    }
+
+    print(f"data.xml: {len(body)} bytes, {iterations} iterations")
+    for name, total in results.items():
+        print(f"{name:<60} {total / iterations * 1e6:10.1f} us/notification")
+
+
+if __name__ == '__main__':
+    main()
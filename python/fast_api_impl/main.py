@@ -1,175 +1,384 @@
-from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse, Response
-import json
-import xmltodict
-import re
+"""
+HTTPS Notification Receiver FastAPI Application
+
+ASGI counterpart of the Flask collector: supports JSON, XML and CBOR
+notifications, forwards validated notifications to Kafka and exposes
+Prometheus metrics. Decoding and YANG validation run in a bounded process
+pool (validation_worker.py), so the event loop only does I/O.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
 from http import HTTPStatus
-from yangson import DataModel
-from yangson.enumerations import ContentType
-
-# Define constants for the URNs, namespace, and JSON keys
-URN_ENCODING_JSON = "urn:ietf:capability:https-notif-receiver:encoding:json"
-URN_ENCODING_XML = "urn:ietf:capability:https-notif-receiver:encoding:xml"
-JSON_RECEIVER_CAPABILITIES = "receiver-capabilities"
-JSON_RECEIVER_CAPABILITY = "receiver-capability"
+from typing import AsyncIterator, Dict, Optional, Tuple, Union
+
+from confluent_kafka import KafkaError, Producer
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+from validation_worker import FLASK_IMPL_DIR, init_worker, process_notification
+
+if FLASK_IMPL_DIR not in sys.path:
+    sys.path.insert(0, FLASK_IMPL_DIR)
+
+from capabilities import CapabilityResponses, build_capabilities_data  # noqa: E402
+from metric_labels import request_labels  # noqa: E402
+from notification_pipeline import (  # noqa: E402
+    ENCODING_LABEL_NONE, ENCODING_LABELS, MIME_APPLICATION_CBOR, MIME_APPLICATION_JSON, MIME_APPLICATION_XML,
+)
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+# HTTP Headers
 UHTTPS_CONTENT_TYPE = 'Content-Type'
 UHTTPS_ACCEPT = 'Accept'
 
-# Define constants for media types
-MIME_APPLICATION_XML = "application/xml"
-MIME_APPLICATION_JSON = "application/json"
-
-# collector capabilities
-json_capable = True
-xml_capable = True
-
-# Define your YANG module path and model name
-yang_dir_path = "../../yang_modules/"
-yang_library_path = "../../yang_modules/yang-library.json"
-
-app = FastAPI()
-
-# Initialize the YANG data model
-data_model = DataModel.from_file(yang_library_path, [yang_dir_path])
-
-# Custom function to remove namespaces from XML keys
-def strip_namespace(data):
-    if isinstance(data, dict):
-        new_data = {}
-        for key, value in data.items():
-            # Remove namespace prefix
-            stripped_key = key.split(':')[-1] if ':' in key else key
-            new_data[stripped_key] = strip_namespace(value)
-        return new_data
-    elif isinstance(data, list):
-        return [strip_namespace(item) for item in data]
-    else:
-        return data
-
-async def validate_relay_notif(data_string):
-    try:
-        # Try to parse the data string as JSON
-        json_data = json.loads(data_string)
-    except json.JSONDecodeError:
-        # If JSON parsing fails, assume the data is XML and parse it
+# Kafka Configuration
+KAFKA_TOPIC_NAME = 'test-topic'
+KAFKA_BOOTSTRAP_SERVERS = 'kafka:9092'
+KAFKA_DELIVERY_MODE_ACK = 'ack-before-204'
+KAFKA_DELIVERY_MODE_FIRE_AND_FORGET = 'fire-and-forget'
+KAFKA_DELIVERY_MODE = os.getenv('KAFKA_DELIVERY_MODE', KAFKA_DELIVERY_MODE_FIRE_AND_FORGET)
+KAFKA_PRODUCER_CONFIG = {
+    'bootstrap.servers': KAFKA_BOOTSTRAP_SERVERS,
+    'linger.ms': int(os.getenv('KAFKA_LINGER_MS', '5')),
+    'batch.num.messages': int(os.getenv('KAFKA_BATCH_NUM_MESSAGES', '10000')),
+    'compression.type': os.getenv('KAFKA_COMPRESSION_TYPE', 'lz4'),
+    'queue.buffering.max.messages': int(os.getenv('KAFKA_MAX_IN_FLIGHT', '100000')),
+}
+KAFKA_POLL_INTERVAL = 0.1           # seconds the poll thread blocks waiting for events
+KAFKA_ACK_TIMEOUT = float(os.getenv('KAFKA_ACK_TIMEOUT', '10'))
+KAFKA_FLUSH_TIMEOUT = float(os.getenv('KAFKA_FLUSH_TIMEOUT', '30'))
+KAFKA_RETRY_AFTER_SECONDS = int(os.getenv('KAFKA_RETRY_AFTER_SECONDS', '1'))
+KAFKA_FORWARD_MODE_RAW = 'raw'
+KAFKA_FORWARD_MODE = os.getenv('KAFKA_FORWARD_MODE', 'json')
+KAFKA_HEADER_CONTENT_TYPE = 'content-type'
+KAFKA_QUEUE_FULL_ERROR = "Kafka producer queue is full"
+
+# YANG Model Configuration
+YANG_DIR_PATH = "../../yang_modules/"
+YANG_LIBRARY_PATH = "../../yang_modules/yang-library.json"
+
+# Validation Pool Configuration
+# - VALIDATION_WORKERS: processes decoding and validating notifications
+# - VALIDATION_MAX_PENDING: notifications queued for or inside the pool before
+#   /relay-notification answers 503
+# - VALIDATION_RETRY_AFTER_SECONDS: Retry-After of the 503 answered when a worker
+#   died and the pool is being replaced
+VALIDATION_WORKERS = int(os.getenv('VALIDATION_WORKERS', str(os.cpu_count() or 1)))
+VALIDATION_MAX_PENDING = int(os.getenv('VALIDATION_MAX_PENDING', str(4 * VALIDATION_WORKERS)))
+VALIDATION_RETRY_AFTER_SECONDS = int(os.getenv('VALIDATION_RETRY_AFTER_SECONDS', '1'))
+SHAPE_CACHE_SIZE = int(os.getenv('SHAPE_CACHE_SIZE', '128'))
+
+# Collector Capabilities Configuration
+COLLECTOR_CAPABILITIES = {
+    'json_capable': True,
+    'xml_capable': True,
+    'cbor_capable': True,
+}
+
+# Reply Support Configuration
+REPLY_SUPPORT = {
+    'json': True,
+    'xml': True,
+    'cbor': True,
+}
+
+# Capabilities Response Configuration
+CAPABILITIES_CACHE_CONTROL = os.getenv('CAPABILITIES_CACHE_CONTROL', 'no-cache')
+CAPABILITIES_ACCEPT_CACHE_SIZE = int(os.getenv('CAPABILITIES_ACCEPT_CACHE_SIZE', '256'))
+
+# Histogram Buckets (comma-separated upper bounds; same latency buckets as the Flask collector)
+REQUEST_LATENCY_BUCKETS = tuple(float(bound) for bound in os.getenv(
+    'REQUEST_LATENCY_BUCKETS', '0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10').split(','))
+BODY_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+# =============================================================================
+# PROMETHEUS METRICS
+# =============================================================================
+
+REQUEST_COUNT = Counter(
+    'http_requests_total',
+    'Total HTTP Requests',
+    ['method', 'endpoint', 'status_code', 'content_type']
+)
+METRICS_LABELS_NORMALIZED = Counter(
+    'metrics_labels_normalized_total',
+    'Request label values replaced by "other" because they are not allowlisted',
+    ['label']
+)
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Latency of HTTP requests by endpoint and request body encoding',
+    ['method', 'endpoint', 'encoding'],
+    buckets=REQUEST_LATENCY_BUCKETS
+)
+VALIDATION_OUTCOMES = Counter(
+    'notification_validation_total',
+    'Notifications by validation outcome (validated, skipped, failed)',
+    ['outcome']
+)
+VALIDATION_PENDING = Gauge(
+    'notification_validation_pending',
+    'Notifications queued for or inside the validation process pool'
+)
+VALIDATION_POOL_RESTARTS = Counter(
+    'notification_validation_pool_restarts_total',
+    'Validation process pools replaced after a worker process died'
+)
+POST_BODY_SIZE = Histogram(
+    'post_request_body_size_bytes',
+    'Size of accepted POST request bodies in bytes, by encoding',
+    ['encoding'],
+    buckets=BODY_SIZE_BUCKETS
+)
+
+
+# =============================================================================
+# KAFKA UTILITIES
+# =============================================================================
+
+class KafkaForwarder:
+    """
+    confluent-kafka producer driven from asyncio.
+
+    produce() never blocks; delivery reports are served by a background poll
+    thread and handed back to the event loop.
+    """
+
+    def __init__(self, config: Dict[str, Union[str, int]]) -> None:
+        """
+        Args:
+            config: librdkafka producer configuration
+        """
+        self.producer = Producer(config)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._poll_loop, name='kafka-poll', daemon=True)
+        self._thread.start()
+
+    def _poll_loop(self) -> None:
+        while not self._stop.is_set():
+            self.producer.poll(KAFKA_POLL_INTERVAL)
+
+    async def send(self, value: bytes, content_type: str) -> Tuple[bool, str]:
+        """
+        Queue a message according to KAFKA_DELIVERY_MODE.
+
+        Args:
+            value: Serialized message value
+            content_type: Encoding of the value, recorded in the message headers
+
+        Returns:
+            Tuple of (success: bool, error_message: str)
+        """
+        headers = [(KAFKA_HEADER_CONTENT_TYPE, content_type.encode('ascii'))]
+        if KAFKA_DELIVERY_MODE != KAFKA_DELIVERY_MODE_ACK:
+            try:
+                self.producer.produce(KAFKA_TOPIC_NAME, value=value, headers=headers)
+            except BufferError:
+                return False, KAFKA_QUEUE_FULL_ERROR
+            return True, ""
+
+        loop = asyncio.get_running_loop()
+        delivered: asyncio.Future = loop.create_future()
+
+        def on_delivery(err: Optional[KafkaError], msg) -> None:
+            loop.call_soon_threadsafe(_resolve, delivered, err)
+
+        try:
+            self.producer.produce(KAFKA_TOPIC_NAME, value=value, headers=headers, callback=on_delivery)
+        except BufferError:
+            return False, KAFKA_QUEUE_FULL_ERROR
         try:
-            parsed_xml = xmltodict.parse(data_string, process_namespaces=True)
-            parsed_xml = strip_namespace(parsed_xml)
-            # Restructure
-            json_data = {
-                "ietf-https-notif:notification": {
-                    "eventTime": parsed_xml["notification"]["eventTime"],
-                    "event": parsed_xml["notification"]["event"]
-                }
-            }
-        except Exception as e:
-            return False
-            
-    # Validate the parsed JSON data against the YANG model
+            err = await asyncio.wait_for(delivered, KAFKA_ACK_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False, f"No delivery report from Kafka within {KAFKA_ACK_TIMEOUT}s"
+        if err:
+            return False, f"Message delivery failed: {err}"
+        return True, ""
+
+    def close(self) -> int:
+        """
+        Stop the poll thread and flush the queued messages.
+
+        Returns:
+            Number of messages that could not be delivered
+        """
+        self._stop.set()
+        self._thread.join()
+        return self.producer.flush(KAFKA_FLUSH_TIMEOUT)
+
+
+def _resolve(future: asyncio.Future, err: Optional[KafkaError]) -> None:
+    """Complete a delivery future unless the request already gave up on it."""
+    if not future.done():
+        future.set_result(err)
+
+
+# =============================================================================
+# CAPABILITIES
+# =============================================================================
+
+# Rendered by capabilities.py, like the responses of the Flask collector
+capability_responses = CapabilityResponses(CAPABILITIES_CACHE_CONTROL, CAPABILITIES_ACCEPT_CACHE_SIZE)
+capability_responses.reload(build_capabilities_data(COLLECTOR_CAPABILITIES), REPLY_SUPPORT)
+
+
+# =============================================================================
+# APPLICATION
+# =============================================================================
+
+def create_validation_pool() -> ProcessPoolExecutor:
+    """Start the process pool that decodes and validates notifications."""
+    # spawn: workers must not inherit the librdkafka threads of this process
+    return ProcessPoolExecutor(
+        max_workers=VALIDATION_WORKERS,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker,
+        initargs=(YANG_LIBRARY_PATH, YANG_DIR_PATH, SHAPE_CACHE_SIZE),
+    )
+
+
+async def replace_broken_pool(app: FastAPI, broken: ProcessPoolExecutor) -> None:
+    """
+    Replace the validation pool after one of its workers died.
+
+    Every request that was waiting on the broken pool fails at once; the lock
+    and the identity check make sure that only the first of them starts a new pool.
+
+    Args:
+        app: The application holding the pool
+        broken: The pool that raised BrokenProcessPool
+    """
+    async with app.state.pool_lock:
+        if app.state.pool is not broken:
+            return
+        broken.shutdown(wait=False, cancel_futures=True)
+        app.state.pool = create_validation_pool()
+        VALIDATION_POOL_RESTARTS.inc()
+        print("Validation worker died; the validation pool was restarted", file=sys.stderr)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Start the validation pool and the Kafka producer, and drain them on shutdown."""
+    app.state.pool = create_validation_pool()
+    app.state.pool_lock = asyncio.Lock()
+    app.state.pending = 0
+    app.state.kafka = KafkaForwarder(KAFKA_PRODUCER_CONFIG)
     try:
-        instance = data_model.from_raw(json_data)
-        instance.validate(ctype=ContentType.all)
-        return True
-    except Exception as e:
-        return False
-
-async def build_capabilities_data(json_capable, xml_capable):
-    capabilities_data = []
-    if json_capable:
-        capabilities_data.append(URN_ENCODING_JSON)
-    if xml_capable:
-        capabilities_data.append(URN_ENCODING_XML)
-    return capabilities_data
-
-async def build_xml(capabilities_data):
-    """Builds an XML string from capabilities data."""
-    xml_content = '<receiver-capabilities>'
-    for capability in capabilities_data:
-        xml_content += f'    <receiver-capability>{capability}</receiver-capability>\n'
-    xml_content += '</receiver-capabilities>'
-    return xml_content
-
-async def build_json(capabilities_data):
-    """Builds a JSON structure from capabilities data."""
-    return json.dumps({
-        JSON_RECEIVER_CAPABILITIES: {
-            JSON_RECEIVER_CAPABILITY: capabilities_data
-        }
-    }, indent=2)
-
-def get_q_value(accept_header, media_type):
-    """Extracts the q value for a specific media type from the Accept header."""
-    pattern = re.compile(rf"{media_type}(;q=([0-9.]+))?")
-    match = pattern.search(accept_header)
-    if match:
-        q_value = match.group(2)
-        return float(q_value) if q_value else 1.0
-    return 0.0
-
-async def get_default_response(json_capable, xml_capable, capabilities_data):
-    """Returns the default response based on capabilities."""
-    if xml_capable:
-        return Response(content=await build_xml(capabilities_data), media_type=MIME_APPLICATION_XML), HTTPStatus.OK, {'Content-Type': MIME_APPLICATION_XML}        
-    elif json_capable:
-        return JSONResponse(content=await build_json(capabilities_data)), HTTPStatus.OK, {'Content-Type': MIME_APPLICATION_JSON}
-    return JSONResponse({"error": "No valid capabilities found"}), HTTPStatus.INTERNAL_SERVER_ERROR
-
-async def respond_with_content_type(accept_header, json_capable, xml_capable, capabilities_data):
-    """Responds based on the Accept header and content capabilities, considering q-values."""
-    q_xml = get_q_value(accept_header, MIME_APPLICATION_XML)
-    q_json = get_q_value(accept_header, MIME_APPLICATION_JSON)
-
-    if q_xml < 0 or q_json < 0 or q_xml > 1 or q_json > 1:
-        return JSONResponse({"error": "Invalid q value"}), HTTPStatus.BAD_REQUEST
-
-    if q_json == 0 and q_xml == 0:
-        return await get_default_response(json_capable, xml_capable, capabilities_data)
-
-    if xml_capable and (q_xml >= q_json or not json_capable):
-        return await build_xml(capabilities_data), HTTPStatus.OK, {'Content-Type': MIME_APPLICATION_XML}
-
-    if json_capable and q_json > 0:
-        return await build_json(capabilities_data), HTTPStatus.OK, {'Content-Type': MIME_APPLICATION_JSON}
-
-    return JSONResponse({"error": "Not acceptable"}), HTTPStatus.NOT_ACCEPTABLE
+        yield
+    finally:
+        app.state.pool.shutdown(wait=True)
+        remaining = app.state.kafka.close()
+        if remaining:
+            print(f"{remaining} message(s) were not delivered to Kafka before shutdown", file=sys.stderr)
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    """Record request count and latency metrics, with the labels of the Flask collector."""
+    start_time = time.perf_counter()
+    response = await call_next(request)
+
+    # The route template; unrouted paths (404) share one label value
+    route = request.scope.get('route')
+    labels, normalized = request_labels(request.method, request.headers.get(UHTTPS_CONTENT_TYPE),
+                                        getattr(route, 'path', None))
+    for label in normalized:
+        METRICS_LABELS_NORMALIZED.labels(label=label).inc()
+
+    REQUEST_COUNT.labels(status_code=response.status_code, **labels).inc()
+    if route is not None:
+        REQUEST_LATENCY.labels(
+            method=labels['method'],
+            endpoint=labels['endpoint'],
+            encoding=ENCODING_LABELS.get(labels['content_type'], ENCODING_LABEL_NONE)
+        ).observe(time.perf_counter() - start_time)
+    return response
+
 
 @app.get("/capabilities")
-async def get_capabilities(request: Request):
+async def get_capabilities(request: Request) -> Response:
     """Handles the /capabilities GET request."""
-    
-    capabilities_data = await build_capabilities_data(json_capable, xml_capable)
-
-    accept_header = request.headers.get(UHTTPS_ACCEPT)
-    if accept_header:
-        return await respond_with_content_type(accept_header, json_capable, xml_capable, capabilities_data)
+    status, body, headers = capability_responses.respond(request.headers.get(UHTTPS_ACCEPT),
+                                                         request.headers.get('If-None-Match'))
+    if status >= HTTPStatus.BAD_REQUEST:
+        return JSONResponse({"error": body}, status_code=status)
+    return Response(content=body, status_code=status, headers=headers)
 
-    return await get_default_response(json_capable, xml_capable, capabilities_data)
 
 @app.post("/relay-notification")
-async def post_notification(request: Request):
-    # Get the Content-Type of the request
+async def post_notification(request: Request) -> Response:
+    """Validates a notification in the process pool and forwards it to Kafka."""
     req_content_type = request.headers.get(UHTTPS_CONTENT_TYPE)
 
-    if req_content_type == None:
-        return JSONResponse("Content-type is None -> Empty Body Notification", status_code=HTTPStatus.UNSUPPORTED_MEDIA_TYPE)
-
-    # Check for XML content type and XML support
-    if req_content_type == MIME_APPLICATION_XML:
-        if not xml_capable:
-            return JSONResponse("XML encoding not supported", status_code=HTTPStatus.UNSUPPORTED_MEDIA_TYPE)
-
-    # Check for JSON content type and JSON support
-    elif req_content_type == MIME_APPLICATION_JSON:
-        if not json_capable:
-            return JSONResponse("JSON encoding not supported", status_code=HTTPStatus.UNSUPPORTED_MEDIA_TYPE)
-
-    # Unsupported Content-Type
-    else:
-        return JSONResponse("Unsupported Media Type", status_code=HTTPStatus.UNSUPPORTED_MEDIA_TYPE)
-
-    # If the Content-Type is supported, respond with 204 No Content
-    if await validate_relay_notif(await request.body()):
-        # Use Response for 204 No Content
-        return Response(status_code=HTTPStatus.NO_CONTENT)
-    else:
-        return JSONResponse("relay notification doesn't correspond with the yang module", status_code=HTTPStatus.BAD_REQUEST)
+    if req_content_type is None:
+        return Response("Content-type is None -> Empty Body Notification",
+                        status_code=HTTPStatus.UNSUPPORTED_MEDIA_TYPE)
+
+    if req_content_type not in (MIME_APPLICATION_JSON, MIME_APPLICATION_XML, MIME_APPLICATION_CBOR):
+        return Response("Unsupported Media Type", status_code=HTTPStatus.UNSUPPORTED_MEDIA_TYPE)
+
+    if ((req_content_type == MIME_APPLICATION_JSON and not COLLECTOR_CAPABILITIES['json_capable']) or
+            (req_content_type == MIME_APPLICATION_XML and not COLLECTOR_CAPABILITIES['xml_capable']) or
+            (req_content_type == MIME_APPLICATION_CBOR and not COLLECTOR_CAPABILITIES['cbor_capable'])):
+        return Response(f"{req_content_type} encoding not supported",
+                        status_code=HTTPStatus.UNSUPPORTED_MEDIA_TYPE)
+
+    retry_after = {'Retry-After': str(KAFKA_RETRY_AFTER_SECONDS)}
+    if request.app.state.pending >= VALIDATION_MAX_PENDING:
+        return Response("Service Unavailable", status_code=HTTPStatus.SERVICE_UNAVAILABLE, headers=retry_after)
+
+    body = await request.body()
+    pool = request.app.state.pool
+    request.app.state.pending += 1
+    VALIDATION_PENDING.set(request.app.state.pending)
+    try:
+        status, error_message, value, kafka_content_type = await asyncio.get_running_loop().run_in_executor(
+            pool, process_notification, body, req_content_type,
+            KAFKA_FORWARD_MODE == KAFKA_FORWARD_MODE_RAW)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed by the OOM killer); the notification may be resent
+        await replace_broken_pool(request.app, pool)
+        return Response("Service Unavailable", status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+                        headers={'Retry-After': str(VALIDATION_RETRY_AFTER_SECONDS)})
+    finally:
+        request.app.state.pending -= 1
+        VALIDATION_PENDING.set(request.app.state.pending)
+
+    if status == HTTPStatus.BAD_REQUEST:
+        VALIDATION_OUTCOMES.labels(outcome='failed').inc()
+    if status != HTTPStatus.NO_CONTENT:
+        return Response(error_message, status_code=status)
+    VALIDATION_OUTCOMES.labels(outcome='validated').inc()
+
+    success, error_message = await request.app.state.kafka.send(value, kafka_content_type)
+    if not success:
+        if error_message == KAFKA_QUEUE_FULL_ERROR:
+            return Response("Service Unavailable", status_code=HTTPStatus.SERVICE_UNAVAILABLE, headers=retry_after)
+        return Response("Internal Server Error", status_code=HTTPStatus.INTERNAL_SERVER_ERROR)
+
+    POST_BODY_SIZE.labels(encoding=ENCODING_LABELS[req_content_type]).observe(len(body))
+    return Response(status_code=HTTPStatus.NO_CONTENT)
+
+
+@app.get("/metrics")
+async def metrics() -> Response:
+    """Prometheus metrics endpoint."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,86 @@
+"""
+Notification Validation Worker
+
+CPU-bound part of the FastAPI collector, executed in a process pool so that
+the event loop never runs decoding or YANG validation. Every worker process
+loads the YANG data model once (init_worker) and then decodes, validates and
+re-encodes notifications (process_notification).
+
+The notification pipeline itself is the one of the Flask collector
+(notification_pipeline), imported from ../flask_impl.
+"""
+
+import os
+import sys
+from http import HTTPStatus
+from typing import Optional, Tuple
+
+from yangson import DataModel
+
+FLASK_IMPL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'flask_impl')
+if FLASK_IMPL_DIR not in sys.path:
+    sys.path.insert(0, FLASK_IMPL_DIR)
+
+from notification_pipeline import NotificationPipeline, PipelineContext  # noqa: E402
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+# Result of process_notification: (status, error_message, kafka_value, kafka_content_type)
+WorkerResult = Tuple[int, str, Optional[bytes], str]
+
+
+# =============================================================================
+# WORKER STATE
+# =============================================================================
+
+_context: Optional[PipelineContext] = None
+
+
+def init_worker(yang_library_path: str, yang_dir_path: str, shape_cache_size: int) -> None:
+    """
+    Process pool initializer: load the YANG data model in this worker.
+
+    Args:
+        yang_library_path: Path of the YANG library file
+        yang_dir_path: Directory of the YANG modules
+        shape_cache_size: Number of notification shapes cached by this worker
+    """
+    global _context
+    _context = PipelineContext(DataModel.from_file(yang_library_path, [yang_dir_path]),
+                               shape_cache_size=shape_cache_size)
+
+
+# =============================================================================
+# NOTIFICATION PROCESSING
+# =============================================================================
+
+def process_notification(body: bytes, content_type: str, forward_raw: bool) -> WorkerResult:
+    """
+    Decode, validate and encode one notification for Kafka.
+
+    Args:
+        body: Raw request body
+        content_type: Content type of the request
+        forward_raw: Forward JSON and CBOR bodies unchanged instead of re-encoding them
+
+    Returns:
+        Tuple of (status, error_message, kafka_value, kafka_content_type);
+        kafka_value is None unless status is 204
+    """
+    pipeline = NotificationPipeline(_context, body, content_type)
+    is_decoded, error_message = pipeline.decode()
+    if not is_decoded:
+        return HTTPStatus.UNSUPPORTED_MEDIA_TYPE, error_message, None, ""
+
+    # Every notification is validated: the workers keep no per-publisher policy state
+    is_valid, error_message = pipeline.validate('')
+    if not is_valid:
+        return HTTPStatus.BAD_REQUEST, error_message, None, ""
+
+    value, kafka_content_type = pipeline.kafka_payload(forward_raw)
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return HTTPStatus.NO_CONTENT, "", value, kafka_content_type
@@ -6,56 +6,149 @@ encoding formats (JSON, XML, CBOR) and integrates with Kafka for message process
 It includes Prometheus metrics collection and YANG model validation.
 """
 
-from typing import Dict, List, Tuple, Any, Union, Optional
+from typing import ContextManager, Dict, List, Tuple, Any, Union, Optional
+import atexit
+import functools
+import hashlib
+import hmac
+import io
 import json
-import re
+import os
+import threading
 import time
 from http import HTTPStatus
+from xml.parsers.expat import ExpatError
 
 from flask import Flask, request, jsonify, Response
-from prometheus_client import Counter, Gauge, generate_latest
-import xmltodict
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
 import cbor2
 from confluent_kafka import Producer, KafkaError
 from yangson import DataModel
-from yangson.enumerations import ContentType
+
+from content_coding import CODING_IDENTITY, BodyTooLarge, available_codings, decode_stream
+from capabilities import CapabilityResponses, build_capabilities_data as build_capability_urns
+from delta_merge import DELTA_DELTA, DELTA_KEYFRAME, DeltaStateStore
+from metric_labels import request_labels
+from notification_pipeline import (
+    ENCODING_LABEL_NONE, ENCODING_LABELS, INVALID_CONTENT_TYPE_ERROR, STAGE_DECODE, NotificationPipeline,
+    PipelineContext, PipelineMetrics,
+)
+from profiler import StackSampler
+from shape_cache import ShapeCache
+from validation_policy import ValidationPolicy
+from xml_decoder import SequenceTooLong
 
 
 # =============================================================================
 # CONSTANTS
 # =============================================================================
 
-# URN Constants for capabilities
-URN_ENCODING_JSON = "urn:ietf:capability:https-notif-receiver:encoding:json"
-URN_ENCODING_XML = "urn:ietf:capability:https-notif-receiver:encoding:xml"
-URN_ENCODING_CBOR = "urn:ietf:capability:https-notif-receiver:encoding:cbor"
-
-# JSON Structure Keys
-JSON_RECEIVER_CAPABILITIES = "receiver-capabilities"
-JSON_RECEIVER_CAPABILITY = "receiver-capability"
-
 # HTTP Headers
 UHTTPS_CONTENT_TYPE = 'Content-Type'
 UHTTPS_ACCEPT = 'Accept'
+UHTTPS_NOTIF_DELTA = 'Notif-Delta'
+UHTTPS_NOTIF_SEQUENCE = 'Notif-Sequence'
+UHTTPS_NOTIF_PUBLISHER_ID = 'Notif-Publisher-Id'
+UHTTPS_CONTENT_ENCODING = 'Content-Encoding'
+UHTTPS_ACCEPT_ENCODING = 'Accept-Encoding'
 
 # MIME Types
 MIME_APPLICATION_XML = "application/xml"
 MIME_APPLICATION_JSON = "application/json"
 MIME_APPLICATION_CBOR = "application/cbor"
+MIME_APPLICATION_CBOR_SEQ = "application/cbor-seq"
 
 # Kafka Configuration
 KAFKA_TOPIC_NAME = 'test-topic'
 KAFKA_BOOTSTRAP_SERVERS = 'kafka:9092'
 
+# Kafka Delivery Modes
+# - ack-before-204: the 204 is only sent once the broker acknowledged the message
+# - fire-and-forget: the 204 is sent as soon as the message is queued locally
+KAFKA_DELIVERY_MODE_ACK = 'ack-before-204'
+KAFKA_DELIVERY_MODE_FIRE_AND_FORGET = 'fire-and-forget'
+KAFKA_DELIVERY_MODE = os.getenv('KAFKA_DELIVERY_MODE', KAFKA_DELIVERY_MODE_FIRE_AND_FORGET)
+
+# Kafka Producer Tuning
+KAFKA_PRODUCER_CONFIG = {
+    'bootstrap.servers': KAFKA_BOOTSTRAP_SERVERS,
+    'linger.ms': int(os.getenv('KAFKA_LINGER_MS', '5')),
+    'batch.num.messages': int(os.getenv('KAFKA_BATCH_NUM_MESSAGES', '10000')),
+    'compression.type': os.getenv('KAFKA_COMPRESSION_TYPE', 'lz4'),
+    # Bounds the number of in-flight messages; produce() raises BufferError beyond it
+    'queue.buffering.max.messages': int(os.getenv('KAFKA_MAX_IN_FLIGHT', '100000')),
+}
+KAFKA_POLL_INTERVAL = 0.1           # seconds the poll thread blocks waiting for events
+KAFKA_ACK_TIMEOUT = float(os.getenv('KAFKA_ACK_TIMEOUT', '10'))
+KAFKA_FLUSH_TIMEOUT = float(os.getenv('KAFKA_FLUSH_TIMEOUT', '30'))
+KAFKA_RETRY_AFTER_SECONDS = int(os.getenv('KAFKA_RETRY_AFTER_SECONDS', '1'))
+
+# Kafka Forwarding Modes
+# - json: every notification is re-encoded as JSON text
+# - raw: validated JSON and CBOR bodies are forwarded byte-for-byte
+KAFKA_FORWARD_MODE_JSON = 'json'
+KAFKA_FORWARD_MODE_RAW = 'raw'
+KAFKA_FORWARD_MODE = os.getenv('KAFKA_FORWARD_MODE', KAFKA_FORWARD_MODE_JSON)
+KAFKA_HEADER_CONTENT_TYPE = 'content-type'
+
+# Kafka Error Messages
+KAFKA_QUEUE_FULL_ERROR = "Kafka producer queue is full"
+
 # YANG Model Configuration
 YANG_DIR_PATH = "../../yang_modules/"
 YANG_LIBRARY_PATH = "../../yang_modules/yang-library.json"
 
+# YANG Validation Engines
+# - compiled: pre-compiled checkers, yangson only confirms rejected notifications
+# - yangson: every notification is validated by yangson
+YANG_ENGINE_COMPILED = 'compiled'
+YANG_ENGINE_YANGSON = 'yangson'
+YANG_VALIDATION_ENGINE = os.getenv('YANG_VALIDATION_ENGINE', YANG_ENGINE_COMPILED)
+
+# Validation Policy Configuration
+# - all: validate every notification
+# - sample: validate 1 in VALIDATION_SAMPLE_RATE notifications per publisher
+# - trusted: validate the first VALIDATION_TRUST_THRESHOLD notifications per
+#   (publisher, notification shape), then only check the structural fingerprint
+VALIDATION_POLICY = os.getenv('VALIDATION_POLICY', 'all')
+VALIDATION_SAMPLE_RATE = int(os.getenv('VALIDATION_SAMPLE_RATE', '10'))
+VALIDATION_TRUST_THRESHOLD = int(os.getenv('VALIDATION_TRUST_THRESHOLD', '100'))
+VALIDATION_MAX_PUBLISHERS = int(os.getenv('VALIDATION_MAX_PUBLISHERS', '10000'))
+
+# Notification Shape Cache Configuration
+# Number of distinct notification shapes whose validation plan and namespace
+# renaming are kept between requests
+SHAPE_CACHE_SIZE = int(os.getenv('SHAPE_CACHE_SIZE', '128'))
+
+# Batch Configuration
+# Maximum number of notifications accepted in one POST /relay-notifications
+BATCH_MAX_NOTIFICATIONS = int(os.getenv('BATCH_MAX_NOTIFICATIONS', '1000'))
+BATCH_TOO_LARGE_ERROR = "Batch exceeds the maximum number of notifications"
+
+# Delta Notification Configuration
+# Number of publishers whose last full notification is kept to merge their deltas
+DELTA_MAX_PUBLISHERS = int(os.getenv('DELTA_MAX_PUBLISHERS', '10000'))
+DELTA_BASE_MISSING_ERROR = "Delta does not follow the last notification; send a keyframe"
+DELTA_PUBLISHER_ID_MAX_LENGTH = 256
+# Publisher identities derived from the remote address, which is not accepted as key of the delta state
+PUBLISHER_ID_ADDRESS_PREFIX = 'addr:'
+# Number of processes serving the collector, set by serve.py. The delta state lives in the memory of
+# each process, so deltas are only offered when a single process receives all notifications
+COLLECTOR_WORKERS = int(os.getenv('COLLECTOR_WORKERS', '1'))
+
+# Content Coding Configuration
+# Compressed bodies are decompressed while they are read, up to this many bytes (zip bomb protection)
+MAX_DECOMPRESSED_BODY_SIZE = int(os.getenv('MAX_DECOMPRESSED_BODY_SIZE', str(16 * 1024 * 1024)))
+CONTENT_CODINGS = available_codings()
+
 # Collector Capabilities Configuration
 COLLECTOR_CAPABILITIES = {
     'json_capable': True,
     'xml_capable': True,
     'cbor_capable': True,
+    'batch_capable': True,
+    'delta_capable': COLLECTOR_WORKERS == 1,
+    'compression_capable': True,
 }
 
 # Reply Support Configuration
@@ -65,6 +158,47 @@ REPLY_SUPPORT = {
     'cbor': True,
 }
 
+# Capabilities Response Caching
+# Responses are rendered once per media type and revalidated through their ETag
+CAPABILITIES_CACHE_CONTROL = os.getenv('CAPABILITIES_CACHE_CONTROL', 'no-cache')
+CAPABILITIES_ACCEPT_CACHE_SIZE = int(os.getenv('CAPABILITIES_ACCEPT_CACHE_SIZE', '256'))
+
+# Prometheus Configuration
+# - PROMETHEUS_MULTIPROC_DIR: directory of the mmap-backed metric files shared by
+#   the worker processes (set by serve.py); /metrics then aggregates all workers
+# - METRICS_CACHE_TTL: seconds a rendered /metrics response is reused, so that
+#   aggregation cost does not grow with the scrape rate
+PROMETHEUS_MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+METRICS_CACHE_TTL = float(os.getenv('METRICS_CACHE_TTL', '1'))
+
+# Profiling Endpoint Configuration
+# /debug/profile is only served when PROFILE_TOKEN is set; requests must send
+# "Authorization: Bearer <PROFILE_TOKEN>"
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+PROFILE_DEFAULT_SECONDS = 10.0
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', '60'))
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.01'))
+PROFILE_MAX_DEPTH = 128
+PROFILE_TOP_N = 30
+# Background threads that are not sampled: they only wait (Kafka poll loop, the
+# master watch and the shutdown drain of serve.py) and would dominate every profile
+PROFILE_IGNORED_THREADS = frozenset(['kafka-poll', 'watch-master', 'drain'])
+
+# Latency Histogram Buckets (comma-separated upper bounds, in seconds)
+# - REQUEST_LATENCY_BUCKETS: whole requests, from before_request to after_request
+# - STAGE_LATENCY_BUCKETS: single stages of the notification pipeline
+REQUEST_LATENCY_BUCKETS = tuple(float(bound) for bound in os.getenv(
+    'REQUEST_LATENCY_BUCKETS', '0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10').split(','))
+STAGE_LATENCY_BUCKETS = tuple(float(bound) for bound in os.getenv(
+    'STAGE_LATENCY_BUCKETS', '0.00005,0.0001,0.00025,0.0005,0.001,0.0025,0.005,0.01,0.025,0.05,0.1,1').split(','))
+
+# Pipeline Stages (values of the 'stage' label of STAGE_LATENCY)
+# The decode, delta merge, namespace strip and validation stages are timed by notification_pipeline
+STAGE_BODY_READ = 'body_read'
+STAGE_DECOMPRESS = 'decompress'
+STAGE_KAFKA_ENQUEUE = 'kafka_enqueue'
+STAGE_KAFKA_ACK = 'kafka_ack'
+
 
 # =============================================================================
 # GLOBAL VARIABLES
@@ -73,7 +207,8 @@ REPLY_SUPPORT = {
 app = Flask(__name__)
 
 # Initialize Kafka Producer
-producer = Producer({'bootstrap.servers': KAFKA_BOOTSTRAP_SERVERS})
+producer = Producer(KAFKA_PRODUCER_CONFIG)
+kafka_poll_stop = threading.Event()
 
 # Initialize YANG Data Model
 try:
@@ -82,373 +217,359 @@ except Exception as e:
     app.logger.error(f"Failed to initialize YANG data model: {e}")
     data_model = None
 
+# Initialize Validation Policy
+validation_policy = ValidationPolicy(
+    VALIDATION_POLICY,
+    sample_rate=VALIDATION_SAMPLE_RATE,
+    trust_threshold=VALIDATION_TRUST_THRESHOLD,
+    max_publishers=VALIDATION_MAX_PUBLISHERS,
+)
+
+# Initialize Delta State Store
+delta_states = DeltaStateStore(DELTA_MAX_PUBLISHERS)
+
+# Initialize Stack Sampler of /debug/profile
+stack_sampler = StackSampler(PROFILE_INTERVAL, PROFILE_MAX_DEPTH, PROFILE_IGNORED_THREADS)
+
 # Prometheus Metrics
 REQUEST_COUNT = Counter(
     'http_requests_total', 
     'Total HTTP Requests', 
     ['method', 'endpoint', 'status_code', 'content_type']
 )
-REQUEST_LATENCY_CAPABILITIES = Gauge(
-    'http_request_latency_seconds_capabilities', 
-    'Latency of HTTP GET /capabilities'
+METRICS_LABELS_NORMALIZED = Counter(
+    'metrics_labels_normalized_total',
+    'Request label values replaced by "other" because they are not allowlisted',
+    ['label']
 )
-REQUEST_LATENCY_NOTIFICATION_JSON = Gauge(
-    'http_request_latency_seconds_notification_json', 
-    'Latency of HTTP POST /relay-notification (JSON)'
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Latency of HTTP requests by endpoint and request body encoding',
+    ['method', 'endpoint', 'encoding'],
+    buckets=REQUEST_LATENCY_BUCKETS
 )
-REQUEST_LATENCY_NOTIFICATION_XML = Gauge(
-    'http_request_latency_seconds_notification_xml', 
-    'Latency of HTTP POST /relay-notification (XML)'
+STAGE_LATENCY = Histogram(
+    'notification_stage_duration_seconds',
+    'Time spent per notification in each pipeline stage, by encoding',
+    ['stage', 'encoding'],
+    buckets=STAGE_LATENCY_BUCKETS
+)
+VALIDATION_OUTCOMES = Counter(
+    'notification_validation_total',
+    'Notifications by validation outcome (validated, skipped, failed)',
+    ['outcome']
+)
+SHAPE_CACHE_LOOKUPS = Counter(
+    'notification_shape_cache_lookups_total',
+    'Notification shape cache lookups by result (hit, miss)',
+    ['result']
+)
+SHAPE_CACHE_ENTRIES = Gauge(
+    'notification_shape_cache_entries',
+    'Number of notification shapes in the shape cache',
+    multiprocess_mode='livesum'
 )
 POST_BODY_SIZE = Gauge(
     'post_request_body_size_bytes', 
-    'Size of POST request body in bytes'
+    'Size of POST request body in bytes',
+    multiprocess_mode='mostrecent'
 )
 
+# Last rendered /metrics response
+metrics_cache: Dict[str, Any] = {'expires': 0.0, 'body': b''}
+metrics_lock = threading.Lock()
+
 
 # =============================================================================
 # KAFKA UTILITIES
 # =============================================================================
 
-def delivery_report(err: Optional[KafkaError], msg) -> None:
+def delivery_report(err: Optional[KafkaError], msg, encoding: str = ENCODING_LABEL_NONE) -> None:
     """
     Kafka message delivery callback function.
     
     Args:
         err: Kafka error if delivery failed, None if successful
         msg: Message object containing delivery information
+        encoding: Encoding label of the notification, for the delivery latency
     """
+    latency = msg.latency()
+    if latency is not None:
+        STAGE_LATENCY.labels(stage=STAGE_KAFKA_ACK, encoding=encoding).observe(latency)
     if err:
         app.logger.error(f"Message delivery failed: {err}")
     else:
         app.logger.info(f"Message delivered to {msg.topic()} [{msg.partition()}]")
 
 
-# =============================================================================
-# DATA PROCESSING UTILITIES
-# =============================================================================
+def kafka_poll_loop() -> None:
+    """
+    Serve Kafka delivery callbacks until the producer is shut down.
 
-def strip_namespace(data: Union[Dict, List, Any]) -> Union[Dict, List, Any]:
+    Runs on a background thread so request handlers never have to call
+    poll() or flush() themselves.
     """
-    Recursively removes namespaces from XML keys in nested data structures.
-    
+    while not kafka_poll_stop.is_set():
+        producer.poll(KAFKA_POLL_INTERVAL)
+
+
+def shutdown_kafka_producer() -> None:
+    """Stop the poll thread and flush every message still queued in the producer."""
+    kafka_poll_stop.set()
+    kafka_poll_thread.join()
+    remaining = producer.flush(KAFKA_FLUSH_TIMEOUT)
+    if remaining:
+        app.logger.error(f"{remaining} message(s) were not delivered to Kafka before shutdown")
+
+
+def produce_to_kafka(value: Union[str, bytes], content_type: str,
+                     encoding: str = ENCODING_LABEL_NONE) -> Tuple[bool, str]:
+    """
+    Queue a message on the Kafka producer according to KAFKA_DELIVERY_MODE.
+
     Args:
-        data: The data structure to process (dict, list, or primitive)
-        
+        value: Serialized message value
+        content_type: Encoding of the value, recorded in the message headers
+        encoding: Encoding label of the notification, for the stage latency metrics
+
     Returns:
-        The data structure with namespaces stripped from keys
-    """
-    if isinstance(data, dict):
-        new_data = {}
-        for key, value in data.items():
-            # Extract key after the last colon (namespace separator)
-            stripped_key = key.split(':')[-1] if ':' in key else key
-            new_data[stripped_key] = strip_namespace(value)
-        return new_data
-    elif isinstance(data, list):
-        return [strip_namespace(item) for item in data]
-    else:
-        return data
+        Tuple of (success: bool, error_message: str)
+    """
+    return produce_batch_to_kafka([(value, content_type)], encoding)[0]
 
 
-def process_xml_interface_data(json_data: Dict[str, Any]) -> None:
+def produce_batch_to_kafka(messages: List[Tuple[Union[str, bytes], str]],
+                           encoding: str = ENCODING_LABEL_NONE) -> List[Tuple[bool, str]]:
     """
-    Process and convert XML interface data types to appropriate Python types.
-    
+    Queue several messages on the Kafka producer according to KAFKA_DELIVERY_MODE.
+
+    In fire-and-forget mode this returns as soon as the messages are queued.
+    In ack-before-204 mode all messages are queued first and their delivery
+    reports, served by the poll thread, are awaited together.
+
     Args:
-        json_data: The parsed JSON data from XML conversion
-    """
-    try:
-        interfaces = json_data['ietf-https-notif:notification']['interface_data']['interface']
-        
-        # Ensure interfaces is always a list
-        if isinstance(interfaces, dict):
-            interfaces = [interfaces]
-        
-        # Process each interface
-        for interface in interfaces:
-            # Convert 'enabled' string to boolean
-            if 'enabled' in interface:
-                interface['enabled'] = interface['enabled'] != 'false'
-            
-            # Convert 'if-index' to integer
-            if 'if-index' in interface and isinstance(interface['if-index'], str):
-                interface['if-index'] = int(interface['if-index'])
-            
-            # Convert statistics values to integers
-            if 'statistics' in interface:
-                stats_keys = ['in-discards', 'in-errors', 'in-unknown-protos', 
-                             'out-discards', 'out-errors']
-                for key in stats_keys:
-                    if (key in interface['statistics'] and 
-                        isinstance(interface['statistics'][key], str)):
-                        interface['statistics'][key] = int(interface['statistics'][key])
-        
-        # Update the original data structure
-        json_data['ietf-https-notif:notification']['interface_data']['interface'] = interfaces
-        
-    except KeyError as e:
-        app.logger.warning(f"Expected key not found in interface data: {e}")
-    except (ValueError, TypeError) as e:
-        app.logger.error(f"Type conversion error in interface data: {e}")
+        messages: List of (message_value, content_type) tuples
+        encoding: Encoding label of the notifications, for the stage latency metrics
+
+    Returns:
+        List of (success: bool, error_message: str) tuples, one per message
+    """
+    wait_for_ack = KAFKA_DELIVERY_MODE == KAFKA_DELIVERY_MODE_ACK
+    results: List[Tuple[bool, str]] = []
+    pending: List[Tuple[int, threading.Event, List[KafkaError]]] = []
+    enqueue_latency = STAGE_LATENCY.labels(stage=STAGE_KAFKA_ENQUEUE, encoding=encoding)
+
+    for value, content_type in messages:
+        headers = [(KAFKA_HEADER_CONTENT_TYPE, content_type.encode('ascii'))]
+        callback = functools.partial(delivery_report, encoding=encoding)
+        if wait_for_ack:
+            delivered = threading.Event()
+            delivery_errors: List[KafkaError] = []
+            callback = _ack_callback(delivered, delivery_errors, encoding)
+        try:
+            with enqueue_latency.time():
+                producer.produce(KAFKA_TOPIC_NAME, key=None, value=value, headers=headers,
+                                 callback=callback)
+        except BufferError:
+            results.append((False, KAFKA_QUEUE_FULL_ERROR))
+            continue
+        results.append((True, ""))
+        if wait_for_ack:
+            pending.append((len(results) - 1, delivered, delivery_errors))
+
+    deadline = time.monotonic() + KAFKA_ACK_TIMEOUT
+    for index, delivered, delivery_errors in pending:
+        if not delivered.wait(max(0.0, deadline - time.monotonic())):
+            results[index] = (False, f"No delivery report from Kafka within {KAFKA_ACK_TIMEOUT}s")
+        elif delivery_errors:
+            results[index] = (False, f"Message delivery failed: {delivery_errors[0]}")
+    return results
+
+
+def _ack_callback(delivered: threading.Event, delivery_errors: List[KafkaError], encoding: str):
+    """Build a delivery callback that records the outcome and wakes up the waiting request."""
+    def on_delivery(err: Optional[KafkaError], msg) -> None:
+        delivery_report(err, msg, encoding)
+        if err:
+            delivery_errors.append(err)
+        delivered.set()
+    return on_delivery
+
+
+kafka_poll_thread = threading.Thread(target=kafka_poll_loop, name='kafka-poll', daemon=True)
+kafka_poll_thread.start()
+atexit.register(shutdown_kafka_producer)
 
 
 # =============================================================================
-# VALIDATION FUNCTIONS
+# DATA PROCESSING UTILITIES
 # =============================================================================
 
-def validate_relay_notif(data_string: bytes) -> Tuple[bool, Optional[str]]:
-    """
-    Validate the relay notification data against the YANG model.
-    
-    Args:
-        data_string: Raw request data as bytes
-        
-    Returns:
-        Tuple of (is_valid: bool, error_message: Optional[str])
+def get_publisher_id() -> str:
     """
-    if not data_model:
-        return False, "YANG data model not initialized"
-    
-    req_content_type = request.headers.get(UHTTPS_CONTENT_TYPE)
-    
-    try:
-        # Parse data based on content type
-        if req_content_type == MIME_APPLICATION_JSON:
-            json_data = json.loads(data_string.decode('utf-8'))
-            
-        elif req_content_type == MIME_APPLICATION_XML:
-            json_data = xmltodict.parse(data_string.decode('utf-8'), process_namespaces=False)
-            process_xml_interface_data(json_data)
-            
-        elif req_content_type == MIME_APPLICATION_CBOR:
-            json_data = cbor2.loads(data_string)
-            
-        else:
-            return False, "Invalid Content-Type"
+    Identify the publisher of the current request.
 
-    except (json.JSONDecodeError, UnicodeDecodeError, cbor2.CBORDecodeError) as e:
-        app.logger.error(f"Parsing error for {req_content_type}: {e}")
-        return False, "Parsing error: invalid data format"
-    except Exception as e:
-        app.logger.error(f"Unexpected parsing error: {e}")
-        return False, "Parsing error: unexpected format issue"
+    Uses the TLS client certificate when one was presented. The
+    Notif-Publisher-Id header only tells apart publishers sharing a
+    certificate: any client can send it, so it is ignored without one.
+    Without a certificate, the remote address is used, which several
+    publishers behind a NAT or proxy share.
 
-    # Validate against YANG model
-    try:
-        instance = data_model.from_raw(json_data)
-        instance.validate(ctype=ContentType.all)
-        return True, None
-    except Exception as e:
-        app.logger.error(f"YANG validation error: {e}")
-        return False, "Validation error: data does not conform to the YANG module"
+    Returns:
+        Publisher identity string; it starts with PUBLISHER_ID_ADDRESS_PREFIX
+        when derived from the remote address
+    """
+    client_cert = request.environ.get('SSL_CLIENT_CERT')
+    if not client_cert:
+        return f"{PUBLISHER_ID_ADDRESS_PREFIX}{request.remote_addr}"
+    identity = 'cert:' + hashlib.sha256(client_cert.encode('ascii')).hexdigest()
+    publisher = request.headers.get(UHTTPS_NOTIF_PUBLISHER_ID)
+    if publisher:
+        identity += ';id:' + publisher
+    return identity
 
 
 # =============================================================================
-# CAPABILITY BUILDING FUNCTIONS
+# NOTIFICATION PIPELINE
 # =============================================================================
 
-def build_capabilities_data() -> List[str]:
-    """
-    Build the list of supported capabilities based on configuration.
-    
-    Returns:
-        List of capability URN strings
-    """
-    capabilities = []
-    
-    if COLLECTOR_CAPABILITIES['json_capable']:
-        capabilities.append(URN_ENCODING_JSON)
-    if COLLECTOR_CAPABILITIES['xml_capable']:
-        capabilities.append(URN_ENCODING_XML)
-    if COLLECTOR_CAPABILITIES['cbor_capable']:
-        capabilities.append(URN_ENCODING_CBOR)
-    
-    return capabilities
+class PrometheusPipelineMetrics(PipelineMetrics):
+    """Records the measurements of the notification pipeline in the Prometheus metrics."""
 
+    def stage(self, stage: str, encoding: str) -> ContextManager[Any]:
+        return STAGE_LATENCY.labels(stage=stage, encoding=encoding).time()
 
-def build_xml_response(capabilities_data: List[str]) -> str:
-    """
-    Build XML response for capabilities.
-    
-    Args:
-        capabilities_data: List of capability URN strings
-        
-    Returns:
-        XML string representation of capabilities
-    """
-    xml_content = '<receiver-capabilities>\n'
-    for capability in capabilities_data:
-        xml_content += f'    <receiver-capability>{capability}</receiver-capability>\n'
-    xml_content += '</receiver-capabilities>'
-    return xml_content
+    def shape_lookup(self, was_hit: bool, shape_cache: ShapeCache) -> None:
+        SHAPE_CACHE_LOOKUPS.labels(result='hit' if was_hit else 'miss').inc()
+        if not was_hit:
+            SHAPE_CACHE_ENTRIES.set(shape_cache.stats()['size'])
 
+    def validation_outcome(self, outcome: str) -> None:
+        VALIDATION_OUTCOMES.labels(outcome=outcome).inc()
 
-def build_json_response(capabilities_data: List[str]) -> str:
-    """
-    Build JSON response for capabilities.
-    
-    Args:
-        capabilities_data: List of capability URN strings
-        
-    Returns:
-        JSON string representation of capabilities
-    """
-    return json.dumps({
-        JSON_RECEIVER_CAPABILITIES: {
-            JSON_RECEIVER_CAPABILITY: capabilities_data
-        }
-    }, indent=2)
+
+# Decoding, validation and normalization state derived from the YANG model; the
+# agreement of the compiled validator with yangson is covered by tests/test_yang_validator.py
+pipeline_context = PipelineContext(
+    data_model,
+    compile_validator=YANG_VALIDATION_ENGINE == YANG_ENGINE_COMPILED,
+    shape_cache_size=SHAPE_CACHE_SIZE,
+    validation_policy=validation_policy,
+    metrics=PrometheusPipelineMetrics(),
+    logger=app.logger,
+)
 
 
-def build_cbor_response(capabilities_data: List[str]) -> str:
+def decode_batch(data_string: bytes, content_type: str) -> Tuple[Optional[List[NotificationPipeline]],
+                                                                  Optional[str]]:
     """
-    Build CBOR response for capabilities.
-    
+    Split a batch body into the pipelines of its notifications.
+
+    - application/json: a JSON array of notifications
+    - application/cbor-seq: a CBOR sequence (RFC 8742), one item per notification
+    - application/xml: concatenated XML documents
+
+    The number of notifications is checked before any of them is analyzed:
+    CBOR and XML decoding stops at the first notification beyond
+    BATCH_MAX_NOTIFICATIONS.
+
     Args:
-        capabilities_data: List of capability URN strings
-        
+        data_string: Raw request data as bytes
+        content_type: Content type of the request
+
     Returns:
-        CBOR hex string representation of capabilities
+        Tuple of (pipelines, error_message); pipelines is None if the body cannot be
+        decoded, or has too many notifications (BATCH_TOO_LARGE_ERROR)
     """
-    data = cbor2.dumps({
-        JSON_RECEIVER_CAPABILITIES: {
-            JSON_RECEIVER_CAPABILITY: capabilities_data
-        }
-    }).hex()
-    return data
+    try:
+        if content_type == MIME_APPLICATION_JSON:
+            items = json.loads(data_string.decode('utf-8'))
+            if not isinstance(items, list):
+                return None, "Parsing error: batch must be a JSON array"
+            if len(items) > BATCH_MAX_NOTIFICATIONS:
+                return None, BATCH_TOO_LARGE_ERROR
+            return [NotificationPipeline.from_tree(pipeline_context, item, MIME_APPLICATION_JSON) for item in items], None
+
+        if content_type == MIME_APPLICATION_XML:
+            items = pipeline_context.xml_decoder.decode_sequence(data_string, BATCH_MAX_NOTIFICATIONS)
+            return [NotificationPipeline.from_tree(pipeline_context, item, MIME_APPLICATION_XML)
+                    for item in items], None
+
+        if content_type == MIME_APPLICATION_CBOR_SEQ:
+            pipelines = []
+            stream = io.BytesIO(data_string)
+            decoder = cbor2.CBORDecoder(stream)
+            while stream.tell() < len(data_string):
+                if len(pipelines) == BATCH_MAX_NOTIFICATIONS:
+                    return None, BATCH_TOO_LARGE_ERROR
+                start = stream.tell()
+                tree = pipeline_context.coercion_table.apply(decoder.decode())
+                pipelines.append(NotificationPipeline.from_tree(
+                    pipeline_context, tree, MIME_APPLICATION_CBOR, data_string[start:stream.tell()]))
+            return pipelines, None
+
+    except SequenceTooLong:
+        return None, BATCH_TOO_LARGE_ERROR
+    except (json.JSONDecodeError, UnicodeDecodeError, cbor2.CBORDecodeError, ExpatError) as e:
+        app.logger.error(f"Parsing error for {content_type} batch: {e}")
+        return None, "Parsing error: invalid data format"
+    except Exception as e:
+        app.logger.error(f"Unexpected parsing error in batch: {e}")
+        return None, "Parsing error: unexpected format issue"
+
+    return None, "Invalid Content-Type"
 
 
 # =============================================================================
-# CONTENT NEGOTIATION FUNCTIONS
+# CAPABILITIES
 # =============================================================================
 
-def get_q_value(accept_header: str, media_type: str) -> float:
+def build_capabilities_data() -> List[str]:
     """
-    Extract the quality (q) value for a specific media type from Accept header.
-    
-    Args:
-        accept_header: The Accept header value
-        media_type: The media type to search for
-        
+    Build the list of supported capabilities based on configuration.
+
     Returns:
-        The q-value (0.0 to 1.0), defaults to 1.0 if not specified
+        List of capability URN strings
     """
-    pattern = re.compile(rf"{re.escape(media_type)}(;q=([0-9.]+))?")
-    match = pattern.search(accept_header)
-    if match:
-        q_value = match.group(2)
-        return float(q_value) if q_value else 1.0
-    return 0.0
+    return build_capability_urns(COLLECTOR_CAPABILITIES, CONTENT_CODINGS)
 
 
-def get_default_response(capabilities_data: List[str]) -> Tuple[str, HTTPStatus, Dict[str, str]]:
+def reload_capabilities() -> None:
     """
-    Get the default response based on reply support configuration.
-    
-    Args:
-        capabilities_data: List of capability URN strings
-        
-    Returns:
-        Tuple of (response_body, status_code, headers)
-    """
-    if REPLY_SUPPORT['xml']:
-        return (build_xml_response(capabilities_data), 
-                HTTPStatus.OK, 
-                {'Content-Type': MIME_APPLICATION_XML})
-    elif REPLY_SUPPORT['json']:
-        return (build_json_response(capabilities_data), 
-                HTTPStatus.OK, 
-                {'Content-Type': MIME_APPLICATION_JSON})
-    elif REPLY_SUPPORT['cbor']:
-        return (build_cbor_response(capabilities_data), 
-                HTTPStatus.OK, 
-                {'Content-Type': MIME_APPLICATION_CBOR})
-    
-    return (jsonify({"error": "No valid capabilities found"}), 
-            HTTPStatus.INTERNAL_SERVER_ERROR, {})
-
+    Re-render the capabilities responses and forget the negotiated Accept headers.
 
-def respond_with_content_type(accept_header: str, 
-                            capabilities_data: List[str]) -> Tuple[str, HTTPStatus, Dict[str, str]]:
-    """
-    Respond based on Accept header and content capabilities, considering q-values.
-    
-    Args:
-        accept_header: The Accept header from the request
-        capabilities_data: List of capability URN strings
-        
-    Returns:
-        Tuple of (response_body, status_code, headers)
+    Must be called whenever COLLECTOR_CAPABILITIES or REPLY_SUPPORT change.
     """
-    q_xml = get_q_value(accept_header, MIME_APPLICATION_XML)
-    q_json = get_q_value(accept_header, MIME_APPLICATION_JSON)
-    q_cbor = get_q_value(accept_header, MIME_APPLICATION_CBOR)
+    capability_responses.reload(build_capabilities_data(), REPLY_SUPPORT)
 
-    # Validate q-values are in valid range
-    if not all(0 <= q <= 1 for q in [q_xml, q_json, q_cbor]):
-        return (jsonify({"error": "Invalid q value"}), HTTPStatus.BAD_REQUEST, {})
 
-    # If all q-values are 0, return default response
-    if q_json == 0 and q_xml == 0 and q_cbor == 0:
-        return get_default_response(capabilities_data)
-    
-    # Find the highest q-value and corresponding supported format
-    q_max = max(q_xml, q_json, q_cbor)
-    
-    if q_max == q_xml and REPLY_SUPPORT['xml']:
-        return (build_xml_response(capabilities_data), 
-                HTTPStatus.OK, 
-                {'Content-Type': MIME_APPLICATION_XML})
-    elif q_max == q_json and REPLY_SUPPORT['json']:
-        return (build_json_response(capabilities_data), 
-                HTTPStatus.OK, 
-                {'Content-Type': MIME_APPLICATION_JSON})
-    elif q_max == q_cbor and REPLY_SUPPORT['cbor']:
-        return (build_cbor_response(capabilities_data), 
-                HTTPStatus.OK, 
-                {'Content-Type': MIME_APPLICATION_CBOR})
-
-    return (jsonify({"error": "Not acceptable"}), HTTPStatus.NOT_ACCEPTABLE, {})
+# Responses are rendered by capabilities.py, shared with the FastAPI collector
+capability_responses = CapabilityResponses(CAPABILITIES_CACHE_CONTROL, CAPABILITIES_ACCEPT_CACHE_SIZE)
+reload_capabilities()
 
 
 # =============================================================================
 # MESSAGE PROCESSING FUNCTIONS
 # =============================================================================
 
-def process_and_send_to_kafka(data_string: bytes, content_type: str) -> Tuple[bool, str]:
+def process_and_send_to_kafka(pipeline: NotificationPipeline) -> Tuple[bool, str]:
     """
-    Process the notification data and send it to Kafka.
+    Encode the validated notification for Kafka and send it.
     
     Args:
-        data_string: Raw request data
-        content_type: Content type of the request
+        pipeline: Notification that has already been decoded and validated
         
     Returns:
         Tuple of (success: bool, error_message: str)
     """
     try:
-        # Parse the message based on content type
-        if content_type == MIME_APPLICATION_JSON:
-            message = json.loads(data_string.decode('utf-8'))
-        elif content_type == MIME_APPLICATION_XML:
-            message = xmltodict.parse(data_string.decode('utf-8'), process_namespaces=False)
-            message = strip_namespace(message)
-        elif content_type == MIME_APPLICATION_CBOR:
-            message = cbor2.loads(data_string)
-        else:
-            return False, f"Unsupported content type: {content_type}"
-
         # Send message to Kafka
-        producer.produce(
-            KAFKA_TOPIC_NAME,
-            key=None,
-            value=json.dumps(message),
-            callback=delivery_report
-        )
-        producer.flush()
-        
-        app.logger.info(f"Message sent to Kafka topic '{KAFKA_TOPIC_NAME}'")
+        success, error_msg = produce_to_kafka(*pipeline.kafka_payload(KAFKA_FORWARD_MODE == KAFKA_FORWARD_MODE_RAW), encoding=pipeline.encoding)
+        if not success:
+            app.logger.error(f"Error sending message to Kafka: {error_msg}")
+            return False, error_msg
+
+        app.logger.info(f"Message queued for Kafka topic '{KAFKA_TOPIC_NAME}'")
         return True, ""
         
     except Exception as e:
@@ -457,6 +578,41 @@ def process_and_send_to_kafka(data_string: bytes, content_type: str) -> Tuple[bo
         return False, error_msg
 
 
+def read_body(content_type: str) -> Tuple[Optional[bytes], Optional[Tuple[str, HTTPStatus, Dict[str, str]]]]:
+    """
+    Read the whole request body, decompressing it according to its Content-Encoding.
+
+    The read is timed as the body read stage, or as the decompress stage for
+    a compressed body.
+
+    Args:
+        content_type: Content type of the request
+
+    Returns:
+        The (decompressed) request body, or None and the error response for an
+        unsupported coding (415), a malformed body (400) or a decompressed body
+        above MAX_DECOMPRESSED_BODY_SIZE (413)
+    """
+    encoding = ENCODING_LABELS.get(content_type, ENCODING_LABEL_NONE)
+    coding = request.headers.get(UHTTPS_CONTENT_ENCODING, CODING_IDENTITY).strip().lower()
+    if coding == CODING_IDENTITY:
+        with STAGE_LATENCY.labels(stage=STAGE_BODY_READ, encoding=encoding).time():
+            return request.get_data(), None
+
+    if not COLLECTOR_CAPABILITIES['compression_capable'] or coding not in CONTENT_CODINGS:
+        # RFC 9110, section 15.5.16: tell the publisher which codings would be accepted
+        accepted = ', '.join(CONTENT_CODINGS) if COLLECTOR_CAPABILITIES['compression_capable'] else CODING_IDENTITY
+        return None, (f"Unsupported {UHTTPS_CONTENT_ENCODING}: {coding}", HTTPStatus.UNSUPPORTED_MEDIA_TYPE,
+                      {UHTTPS_ACCEPT_ENCODING: accepted})
+    try:
+        with STAGE_LATENCY.labels(stage=STAGE_DECOMPRESS, encoding=encoding).time():
+            return decode_stream(request.stream, coding, MAX_DECOMPRESSED_BODY_SIZE), None
+    except BodyTooLarge as e:
+        return None, (str(e), HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {})
+    except ValueError as e:
+        return None, (str(e), HTTPStatus.BAD_REQUEST, {})
+
+
 # =============================================================================
 # FLASK ROUTES
 # =============================================================================
@@ -468,19 +624,18 @@ def get_capabilities() -> Union[Tuple[str, HTTPStatus, Dict[str, str]], Tuple[st
     
     Returns capabilities based on Accept header preferences or default format.
     """
-    capabilities_data = build_capabilities_data()
     accept_header = request.headers.get(UHTTPS_ACCEPT)
     
     app.logger.info(f"Capabilities request with Accept header: {accept_header}")
-    
-    if accept_header:
-        return respond_with_content_type(accept_header, capabilities_data)
-    
-    return get_default_response(capabilities_data)
+
+    status, body, headers = capability_responses.respond(accept_header, request.headers.get('If-None-Match'))
+    if status >= HTTPStatus.BAD_REQUEST:
+        return (jsonify({"error": body}), status, {})
+    return body, status, headers
 
 
 @app.route('/relay-notification', methods=['POST'])
-def post_notification() -> Tuple[str, HTTPStatus]:
+def post_notification() -> Union[Tuple[str, HTTPStatus], Tuple[str, HTTPStatus, Dict[str, str]]]:
     """
     Handle POST requests to /relay-notification endpoint.
     
@@ -501,25 +656,204 @@ def post_notification() -> Tuple[str, HTTPStatus]:
         (req_content_type == MIME_APPLICATION_CBOR and not COLLECTOR_CAPABILITIES['cbor_capable'])):
         return f"{req_content_type} encoding not supported", HTTPStatus.UNSUPPORTED_MEDIA_TYPE
 
-    # Validate the notification data
-    is_valid, error_message = validate_relay_notif(request.data)
+    # Delta mode: keyframes and deltas carry consecutive sequence numbers
+    delta_kind = request.headers.get(UHTTPS_NOTIF_DELTA)
+    sequence = None
+    if delta_kind is not None:
+        if not COLLECTOR_CAPABILITIES['delta_capable'] or delta_kind not in (DELTA_KEYFRAME, DELTA_DELTA):
+            return f"Unsupported {UHTTPS_NOTIF_DELTA}: {delta_kind}", HTTPStatus.BAD_REQUEST
+        try:
+            sequence = int(request.headers.get(UHTTPS_NOTIF_SEQUENCE, ''))
+        except ValueError:
+            return f"Missing or invalid {UHTTPS_NOTIF_SEQUENCE} header", HTTPStatus.BAD_REQUEST
+    publisher_id = get_publisher_id()
+    if delta_kind is not None:
+        # The delta state of one publisher must never be merged into another's
+        if publisher_id.startswith(PUBLISHER_ID_ADDRESS_PREFIX):
+            return "Delta notifications need a TLS client certificate", HTTPStatus.BAD_REQUEST
+        if len(request.headers.get(UHTTPS_NOTIF_PUBLISHER_ID, '')) > DELTA_PUBLISHER_ID_MAX_LENGTH:
+            return f"{UHTTPS_NOTIF_PUBLISHER_ID} header is too long", HTTPStatus.BAD_REQUEST
+
+    # Decode the body once and validate the parsed tree
+    data, error_response = read_body(req_content_type)
+    if data is None:
+        return error_response
+    pipeline = NotificationPipeline(pipeline_context, data, req_content_type)
+    is_valid, error_message = pipeline.decode(analyze=delta_kind != DELTA_DELTA)
+    if is_valid and delta_kind == DELTA_DELTA:
+        # Validation and Kafka see the full state, with the delta applied
+        base = delta_states.base(publisher_id, sequence)
+        if base is None:
+            return DELTA_BASE_MISSING_ERROR, HTTPStatus.CONFLICT
+        pipeline.merge_delta(base)
+    if is_valid:
+        is_valid, error_message = pipeline.validate(publisher_id)
     if not is_valid:
         if error_message and (error_message.startswith("Parsing error") or 
-                             error_message == "Invalid Content-Type"):
+                             error_message == INVALID_CONTENT_TYPE_ERROR):
             return error_message, HTTPStatus.UNSUPPORTED_MEDIA_TYPE
         return error_message or "Validation failed", HTTPStatus.BAD_REQUEST
 
+    # The next delta is merged onto the tree as validated, so keep it out of normalization
+    state_tree = pipeline.tree
+    if sequence is not None:
+        pipeline.detach()
+
     # Process and send to Kafka
-    success, error_msg = process_and_send_to_kafka(request.data, req_content_type)
+    success, error_msg = process_and_send_to_kafka(pipeline)
     if not success:
+        if error_msg == KAFKA_QUEUE_FULL_ERROR:
+            return ("Service Unavailable", HTTPStatus.SERVICE_UNAVAILABLE,
+                    {'Retry-After': str(KAFKA_RETRY_AFTER_SECONDS)})
         return "Internal Server Error", HTTPStatus.INTERNAL_SERVER_ERROR
+
+    # Only notifications that reached Kafka become the base of the next delta
+    if sequence is not None:
+        delta_states.store(publisher_id, sequence, state_tree)
     
     # Record metrics
-    POST_BODY_SIZE.set(len(request.data))
+    POST_BODY_SIZE.set(len(data))
     
     return '', HTTPStatus.NO_CONTENT
 
 
+@app.route('/relay-notifications', methods=['POST'])
+def post_notifications() -> Union[Tuple[str, HTTPStatus], Tuple[str, HTTPStatus, Dict[str, str]],
+                                 Tuple[Response, HTTPStatus, Dict[str, str]]]:
+    """
+    Handle POST requests to /relay-notifications endpoint.
+
+    Accepts several notifications in one body, validates each of them and
+    forwards the valid ones to Kafka in one batch. The response lists the
+    status of every notification, in order, as it would have been returned
+    by /relay-notification.
+    """
+    if not COLLECTOR_CAPABILITIES['batch_capable']:
+        return "Batch notifications not supported", HTTPStatus.NOT_FOUND
+
+    # Deltas depend on the previous notification; batches only carry full notifications
+    if request.headers.get(UHTTPS_NOTIF_DELTA) is not None:
+        return "Delta notifications are not supported in batches", HTTPStatus.BAD_REQUEST
+
+    req_content_type = request.headers.get(UHTTPS_CONTENT_TYPE)
+    if req_content_type is None:
+        return "Content-type is None -> Empty Body Notification", HTTPStatus.UNSUPPORTED_MEDIA_TYPE
+
+    if req_content_type not in [MIME_APPLICATION_JSON, MIME_APPLICATION_XML, MIME_APPLICATION_CBOR_SEQ]:
+        return "Unsupported Media Type", HTTPStatus.UNSUPPORTED_MEDIA_TYPE
+
+    if ((req_content_type == MIME_APPLICATION_JSON and not COLLECTOR_CAPABILITIES['json_capable']) or
+        (req_content_type == MIME_APPLICATION_XML and not COLLECTOR_CAPABILITIES['xml_capable']) or
+        (req_content_type == MIME_APPLICATION_CBOR_SEQ and not COLLECTOR_CAPABILITIES['cbor_capable'])):
+        return f"{req_content_type} encoding not supported", HTTPStatus.UNSUPPORTED_MEDIA_TYPE
+
+    data, error_response = read_body(req_content_type)
+    if data is None:
+        return error_response
+    with STAGE_LATENCY.labels(stage=STAGE_DECODE, encoding=ENCODING_LABELS[req_content_type]).time():
+        pipelines, error_message = decode_batch(data, req_content_type)
+    if pipelines is None:
+        if error_message == BATCH_TOO_LARGE_ERROR:
+            return (f"Batch exceeds {BATCH_MAX_NOTIFICATIONS} notifications",
+                    HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        return error_message, HTTPStatus.UNSUPPORTED_MEDIA_TYPE
+
+    # Validate every notification, then produce the valid ones together
+    publisher_id = get_publisher_id()
+    results: List[Dict[str, Any]] = []
+    accepted: List[int] = []
+    for index, pipeline in enumerate(pipelines):
+        is_valid, error_message = pipeline.validate(publisher_id)
+        if is_valid:
+            results.append({'status': HTTPStatus.NO_CONTENT.value})
+            accepted.append(index)
+        else:
+            results.append({'status': HTTPStatus.BAD_REQUEST.value,
+                            'error': error_message or "Validation failed"})
+
+    headers: Dict[str, str] = {}
+    try:
+        sent = produce_batch_to_kafka([pipelines[index].kafka_payload(KAFKA_FORWARD_MODE == KAFKA_FORWARD_MODE_RAW) for index in accepted],
+                                      ENCODING_LABELS[req_content_type])
+    except Exception as e:
+        app.logger.error(f"Error processing/sending batch to Kafka: {e}")
+        sent = [(False, str(e))] * len(accepted)
+    for index, (success, error_msg) in zip(accepted, sent):
+        if success:
+            continue
+        app.logger.error(f"Error sending message to Kafka: {error_msg}")
+        if error_msg == KAFKA_QUEUE_FULL_ERROR:
+            results[index] = {'status': HTTPStatus.SERVICE_UNAVAILABLE.value, 'error': "Service Unavailable"}
+            headers['Retry-After'] = str(KAFKA_RETRY_AFTER_SECONDS)
+        else:
+            results[index] = {'status': HTTPStatus.INTERNAL_SERVER_ERROR.value, 'error': "Internal Server Error"}
+
+    POST_BODY_SIZE.set(len(data))
+
+    return jsonify({'results': results}), HTTPStatus.OK, headers
+
+
+@app.route('/debug/profile', methods=['GET'])
+def get_profile() -> Union[Tuple[str, HTTPStatus], Tuple[str, HTTPStatus, Dict[str, str]],
+                           Tuple[Response, HTTPStatus]]:
+    """
+    Handle GET requests to /debug/profile endpoint.
+
+    Samples the stacks of all threads of this process for ?seconds=N and
+    returns the hottest functions with the collapsed stacks, or only the
+    collapsed stacks with ?format=collapsed. Disabled unless PROFILE_TOKEN
+    is set; only one profile runs at a time.
+    """
+    if not PROFILE_TOKEN:
+        return "Not Found", HTTPStatus.NOT_FOUND
+
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(token.encode('utf-8'),
+                                                             PROFILE_TOKEN.encode('utf-8')):
+        return "Unauthorized", HTTPStatus.UNAUTHORIZED, {'WWW-Authenticate': 'Bearer'}
+
+    try:
+        seconds = float(request.args.get('seconds', PROFILE_DEFAULT_SECONDS))
+    except ValueError:
+        seconds = -1.0
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        return f"seconds must be in (0, {PROFILE_MAX_SECONDS}]", HTTPStatus.BAD_REQUEST
+
+    profile = stack_sampler.sample(seconds)
+    if profile is None:
+        return "A profile is already running", HTTPStatus.CONFLICT
+
+    if request.args.get('format') == 'collapsed':
+        return profile.collapsed(), HTTPStatus.OK, {'Content-Type': 'text/plain; charset=utf-8'}
+    return jsonify({
+        'pid': os.getpid(),
+        'duration': profile.duration,
+        'interval': profile.interval,
+        'samples': profile.samples,
+        'idle_samples': profile.idle_samples,
+        'top': [function._asdict() for function in profile.top(PROFILE_TOP_N)],
+        'collapsed': profile.collapsed(),
+    }), HTTPStatus.OK
+
+
+def render_metrics() -> bytes:
+    """
+    Render the metrics in the Prometheus text format.
+
+    With PROMETHEUS_MULTIPROC_DIR set, the metric files of every worker
+    process, live or dead, are aggregated; otherwise only this process is
+    reported.
+
+    Returns:
+        The exposition text
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, PROMETHEUS_MULTIPROC_DIR)
+        return generate_latest(registry)
+    return generate_latest()
+
+
 @app.route('/metrics', methods=['GET'])
 def metrics() -> Response:
     """
@@ -528,7 +862,13 @@ def metrics() -> Response:
     Returns:
         Prometheus metrics in text format
     """
-    return Response(generate_latest(), mimetype="text/plain")
+    with metrics_lock:
+        now = time.monotonic()
+        if now >= metrics_cache['expires']:
+            metrics_cache['body'] = render_metrics()
+            metrics_cache['expires'] = now + METRICS_CACHE_TTL
+        body = metrics_cache['body']
+    return Response(body, mimetype="text/plain")
 
 
 # =============================================================================
@@ -538,7 +878,7 @@ def metrics() -> Response:
 @app.before_request
 def start_timer() -> None:
     """Start the timer before processing each request for latency metrics."""
-    request.start_time = time.time()
+    request.start_time = time.perf_counter()
 
 
 @app.after_request
@@ -552,27 +892,22 @@ def record_metrics(response: Response) -> Response:
     Returns:
         The unmodified response object
     """
-    content_type = request.headers.get('Content-Type', 'unknown')
-    
+    # Unrouted paths (404) share one label value
+    labels, normalized = request_labels(request.method, request.headers.get(UHTTPS_CONTENT_TYPE),
+                                        request.url_rule.rule if request.url_rule is not None else None)
+    for label in normalized:
+        METRICS_LABELS_NORMALIZED.labels(label=label).inc()
+
     # Record request count metrics
-    REQUEST_COUNT.labels(
-        method=request.method,
-        endpoint=request.path,
-        status_code=response.status_code,
-        content_type=content_type
-    ).inc()
+    REQUEST_COUNT.labels(status_code=response.status_code, **labels).inc()
     
     # Record latency metrics
-    if hasattr(request, 'start_time'):
-        latency = time.time() - request.start_time
-        
-        if request.path == '/capabilities' and request.method == 'GET':
-            REQUEST_LATENCY_CAPABILITIES.set(latency)
-        elif request.path == '/relay-notification' and request.method == 'POST':
-            if content_type == MIME_APPLICATION_JSON:
-                REQUEST_LATENCY_NOTIFICATION_JSON.set(latency)
-            elif content_type == MIME_APPLICATION_XML:
-                REQUEST_LATENCY_NOTIFICATION_XML.set(latency)
+    if hasattr(request, 'start_time') and request.url_rule is not None:
+        REQUEST_LATENCY.labels(
+            method=labels['method'],
+            endpoint=labels['endpoint'],
+            encoding=ENCODING_LABELS.get(labels['content_type'], ENCODING_LABEL_NONE)
+        ).observe(time.perf_counter() - request.start_time)
 
     return response
 
@@ -0,0 +1,290 @@
+"""
+Receiver Capabilities
+
+The /capabilities resource of the collectors: the capability URNs of the
+receiver, rendered as XML, JSON or CBOR. The responses are rendered once per
+reply encoding, with an ETag, and the Accept header of a request is
+negotiated as specified in RFC 9110 (content_negotiation.py), memoized per
+distinct header value.
+
+The Flask and the FastAPI collector both serve their capabilities through
+this module, so that the same configuration yields the same bytes and the
+same ETags from either collector.
+"""
+
+import functools
+import hashlib
+import json
+from http import HTTPStatus
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cbor2
+
+from content_negotiation import negotiate
+from notification_pipeline import MIME_APPLICATION_CBOR, MIME_APPLICATION_JSON, MIME_APPLICATION_XML
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+# URN Constants for capabilities
+URN_ENCODING_JSON = "urn:ietf:capability:https-notif-receiver:encoding:json"
+URN_ENCODING_XML = "urn:ietf:capability:https-notif-receiver:encoding:xml"
+URN_ENCODING_CBOR = "urn:ietf:capability:https-notif-receiver:encoding:cbor"
+URN_BATCH = "urn:ietf:capability:https-notif-receiver:batch"
+URN_DELTA = "urn:ietf:capability:https-notif-receiver:delta"
+# Followed by ":<coding>" for every Content-Encoding the receiver decodes
+URN_CONTENT_ENCODING = "urn:ietf:capability:https-notif-receiver:content-encoding"
+
+# JSON Structure Keys
+JSON_RECEIVER_CAPABILITIES = "receiver-capabilities"
+JSON_RECEIVER_CAPABILITY = "receiver-capability"
+
+# Reply encodings as (media type, REPLY_SUPPORT key), in order of preference:
+# ties of the negotiation and requests without Accept header go to the first
+REPLY_ENCODINGS = (
+    (MIME_APPLICATION_XML, 'xml'),
+    (MIME_APPLICATION_JSON, 'json'),
+    (MIME_APPLICATION_CBOR, 'cbor'),
+)
+
+# Error messages of the failed negotiations, by status
+NEGOTIATION_ERRORS = {
+    HTTPStatus.BAD_REQUEST: "Invalid q value",
+    HTTPStatus.NOT_ACCEPTABLE: "Not acceptable",
+    HTTPStatus.INTERNAL_SERVER_ERROR: "No valid capabilities found",
+}
+
+
+# =============================================================================
+# CAPABILITY BUILDING FUNCTIONS
+# =============================================================================
+
+def build_capabilities_data(collector_capabilities: Dict[str, bool],
+                            content_codings: Sequence[str] = ()) -> List[str]:
+    """
+    Build the list of supported capabilities based on configuration.
+
+    Args:
+        collector_capabilities: COLLECTOR_CAPABILITIES of the collector; missing
+            flags count as False
+        content_codings: Content codings advertised when compression_capable is set
+
+    Returns:
+        List of capability URN strings
+    """
+    capabilities = []
+
+    if collector_capabilities.get('json_capable'):
+        capabilities.append(URN_ENCODING_JSON)
+    if collector_capabilities.get('xml_capable'):
+        capabilities.append(URN_ENCODING_XML)
+    if collector_capabilities.get('cbor_capable'):
+        capabilities.append(URN_ENCODING_CBOR)
+    if collector_capabilities.get('batch_capable'):
+        capabilities.append(URN_BATCH)
+    if collector_capabilities.get('delta_capable'):
+        capabilities.append(URN_DELTA)
+    if collector_capabilities.get('compression_capable'):
+        capabilities.extend(f"{URN_CONTENT_ENCODING}:{coding}" for coding in content_codings)
+
+    return capabilities
+
+
+def build_xml_response(capabilities_data: List[str]) -> str:
+    """
+    Build XML response for capabilities.
+
+    Args:
+        capabilities_data: List of capability URN strings
+
+    Returns:
+        XML string representation of capabilities
+    """
+    xml_content = '<receiver-capabilities>\n'
+    for capability in capabilities_data:
+        xml_content += f'    <receiver-capability>{capability}</receiver-capability>\n'
+    xml_content += '</receiver-capabilities>'
+    return xml_content
+
+
+def build_json_response(capabilities_data: List[str]) -> str:
+    """
+    Build JSON response for capabilities.
+
+    Args:
+        capabilities_data: List of capability URN strings
+
+    Returns:
+        JSON string representation of capabilities
+    """
+    return json.dumps({
+        JSON_RECEIVER_CAPABILITIES: {
+            JSON_RECEIVER_CAPABILITY: capabilities_data
+        }
+    }, indent=2)
+
+
+def build_cbor_response(capabilities_data: List[str]) -> str:
+    """
+    Build CBOR response for capabilities.
+
+    Args:
+        capabilities_data: List of capability URN strings
+
+    Returns:
+        CBOR hex string representation of capabilities
+    """
+    data = cbor2.dumps({
+        JSON_RECEIVER_CAPABILITIES: {
+            JSON_RECEIVER_CAPABILITY: capabilities_data
+        }
+    }).hex()
+    return data
+
+
+BUILDERS = {
+    MIME_APPLICATION_XML: build_xml_response,
+    MIME_APPLICATION_JSON: build_json_response,
+    MIME_APPLICATION_CBOR: build_cbor_response,
+}
+
+
+# =============================================================================
+# CONTENT NEGOTIATION FUNCTIONS
+# =============================================================================
+
+def negotiate_capabilities_variant(accept_header: Optional[str],
+                                   supported: Sequence[str]) -> Tuple[Optional[str], HTTPStatus]:
+    """
+    Select the capabilities response for an Accept header (RFC 9110 negotiation).
+
+    Args:
+        accept_header: The Accept header from the request, None if absent
+        supported: Media types the collector replies in, in order of preference
+
+    Returns:
+        Tuple of (media type of the response or None, status_code)
+    """
+    if accept_header:
+        known = [media_type for media_type, _ in REPLY_ENCODINGS]
+        try:
+            variant = negotiate(accept_header, supported)
+            if variant:
+                return variant, HTTPStatus.OK
+            # Only encodings this collector does not reply in are acceptable
+            if negotiate(accept_header, known):
+                return None, HTTPStatus.NOT_ACCEPTABLE
+        except ValueError:
+            return None, HTTPStatus.BAD_REQUEST
+
+    # No Accept header, or it names no known encoding: default response
+    if supported:
+        return supported[0], HTTPStatus.OK
+    return None, HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Check an If-None-Match header against an entity tag (weak comparison, RFC 9110).
+
+    Args:
+        if_none_match: The If-None-Match header value
+        etag: The current entity tag of the response
+
+    Returns:
+        True if the client already holds the current response
+    """
+    if if_none_match.strip() == '*':
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(','))
+    return any((tag[2:] if tag.startswith('W/') else tag) == etag for tag in candidates)
+
+
+# =============================================================================
+# CAPABILITIES RESPONSE CACHE
+# =============================================================================
+
+def render_capability_variants(capabilities_data: List[str],
+                               cache_control: str) -> Dict[str, Tuple[str, Dict[str, str]]]:
+    """
+    Render the capabilities response in every reply encoding.
+
+    Args:
+        capabilities_data: List of capability URN strings
+        cache_control: Cache-Control header of the responses
+
+    Returns:
+        Dictionary of media type -> (response_body, headers)
+    """
+    variants = {}
+    for media_type, build in BUILDERS.items():
+        body = build(capabilities_data)
+        etag = '"' + hashlib.sha256(f"{media_type}\n{body}".encode('utf-8')).hexdigest()[:32] + '"'
+        variants[media_type] = (body, {
+            'Content-Type': media_type,
+            'ETag': etag,
+            'Cache-Control': cache_control,
+            'Vary': 'Accept',
+        })
+    return variants
+
+
+class CapabilityResponses:
+    """
+    Pre-rendered /capabilities responses of a collector.
+
+    The negotiation result only depends on the Accept header and the reply
+    configuration, so it is memoized per distinct header; reload() renders
+    the responses again and forgets the negotiated headers.
+    """
+
+    def __init__(self, cache_control: str, accept_cache_size: int) -> None:
+        """
+        Args:
+            cache_control: Cache-Control header of the responses
+            accept_cache_size: Number of distinct Accept headers whose negotiation is memoized
+        """
+        self.cache_control = cache_control
+        self.variants: Dict[str, Tuple[str, Dict[str, str]]] = {}
+        self.supported: List[str] = []
+        self.negotiate = functools.lru_cache(maxsize=accept_cache_size)(self._negotiate)
+
+    def reload(self, capabilities_data: List[str], reply_support: Dict[str, bool]) -> None:
+        """
+        Render the responses for a configuration.
+
+        Args:
+            capabilities_data: List of capability URN strings
+            reply_support: REPLY_SUPPORT of the collector, by encoding key
+        """
+        self.variants = render_capability_variants(capabilities_data, self.cache_control)
+        self.supported = [media_type for media_type, key in REPLY_ENCODINGS if reply_support.get(key)]
+        self.negotiate.cache_clear()
+
+    def _negotiate(self, accept_header: Optional[str]) -> Tuple[Optional[str], HTTPStatus]:
+        return negotiate_capabilities_variant(accept_header, self.supported)
+
+    def respond(self, accept_header: Optional[str],
+                if_none_match: Optional[str]) -> Tuple[HTTPStatus, str, Dict[str, str]]:
+        """
+        Answer a /capabilities request.
+
+        Args:
+            accept_header: The Accept header from the request, None if absent
+            if_none_match: The If-None-Match header from the request, None if absent
+
+        Returns:
+            Tuple of (status, body, headers). The body is the error message for
+            400, 406 and 500, and empty for 304, which carries the headers of the
+            response except Content-Type
+        """
+        variant, status = self.negotiate(accept_header)
+        if variant is None:
+            return status, NEGOTIATION_ERRORS[status], {}
+        body, headers = self.variants[variant]
+        if if_none_match and etag_matches(if_none_match, headers['ETag']):
+            return HTTPStatus.NOT_MODIFIED, '', {name: value for name, value in headers.items()
+                                                 if name != 'Content-Type'}
+        return HTTPStatus.OK, body, headers
@@ -0,0 +1,127 @@
+"""
+HTTP Content Codings
+
+Publishers may compress notification bodies on constrained links and label
+them with a Content-Encoding header (RFC 9110, section 8.4). The collector
+advertises the codings it can decode as receiver capabilities and
+decompresses bodies while reading them, chunk by chunk, so that a small
+compressed body cannot expand into an arbitrarily large one in memory
+(zip bomb): decoding stops as soon as the output exceeds a size limit.
+
+gzip and deflate come with zlib; zstd needs the optional zstandard package
+and is only offered when it is installed.
+"""
+
+import io
+import zlib
+from typing import BinaryIO, Iterator, List
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+# Content Codings (RFC 9110, section 8.4.1; zstd: RFC 8878)
+CODING_IDENTITY = 'identity'
+CODING_GZIP = 'gzip'
+CODING_DEFLATE = 'deflate'
+CODING_ZSTD = 'zstd'
+
+# zlib window bits: gzip framing, zlib framing (the "deflate" coding of HTTP)
+ZLIB_WBITS = {
+    CODING_GZIP: 16 + zlib.MAX_WBITS,
+    CODING_DEFLATE: zlib.MAX_WBITS,
+}
+
+# Bytes read from the request, and produced by the decompressor, per step
+CHUNK_SIZE = 64 * 1024
+
+
+class BodyTooLarge(ValueError):
+    """The decompressed body exceeds the size limit."""
+
+
+# =============================================================================
+# DECODING
+# =============================================================================
+
+def available_codings() -> List[str]:
+    """
+    Content codings that can be decoded, in order of preference.
+
+    Returns:
+        Coding names, as used in Content-Encoding
+    """
+    codings = [CODING_GZIP, CODING_DEFLATE]
+    if zstandard is not None:
+        codings.insert(0, CODING_ZSTD)
+    return codings
+
+
+def decode_stream(stream: BinaryIO, coding: str, max_size: int) -> bytes:
+    """
+    Read and decompress a request body.
+
+    Args:
+        stream: The compressed body
+        coding: One of available_codings()
+        max_size: Largest decompressed size accepted, in bytes
+
+    Returns:
+        The decompressed body
+
+    Raises:
+        BodyTooLarge: The decompressed body exceeds max_size
+        ValueError: The body is not valid for the coding
+    """
+    chunks = _zstd_chunks(stream) if coding == CODING_ZSTD else _zlib_chunks(stream, coding)
+    body = bytearray()
+    for chunk in chunks:
+        body += chunk
+        if len(body) > max_size:
+            raise BodyTooLarge(f"Decompressed body exceeds {max_size} bytes")
+    return bytes(body)
+
+
+def _zlib_chunks(stream: BinaryIO, coding: str) -> Iterator[bytes]:
+    """Decompressed output of a gzip or deflate body, at most CHUNK_SIZE bytes at a time."""
+    decompressor = zlib.decompressobj(ZLIB_WBITS[coding])
+    data = b''
+    try:
+        while not decompressor.eof:
+            if not data:
+                data = stream.read(CHUNK_SIZE)
+                if not data:
+                    raise ValueError(f"Truncated {coding} body")
+            # Bounded output: input that would expand further stays in unconsumed_tail
+            yield decompressor.decompress(data, CHUNK_SIZE)
+            data = decompressor.unconsumed_tail
+    except zlib.error as e:
+        raise ValueError(f"Malformed {coding} body: {e}")
+    if decompressor.unused_data or stream.read(1):
+        raise ValueError(f"Trailing data after the {coding} body")
+
+
+def _zstd_chunks(stream: BinaryIO) -> Iterator[bytes]:
+    """Decompressed output of a zstd body, at most CHUNK_SIZE bytes at a time."""
+    buffered = io.BufferedReader(stream, CHUNK_SIZE)
+    try:
+        # The reader ends quietly on a truncated frame; the size in the frame header tells
+        content_size = zstandard.get_frame_parameters(buffered.peek(CHUNK_SIZE)).content_size
+        reader = zstandard.ZstdDecompressor().stream_reader(buffered, read_size=CHUNK_SIZE)
+        size = 0
+        while True:
+            chunk = reader.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            yield chunk
+    except zstandard.ZstdError as e:
+        raise ValueError(f"Malformed {CODING_ZSTD} body: {e}")
+    if content_size != zstandard.CONTENTSIZE_UNKNOWN and size != content_size:
+        raise ValueError(f"Truncated {CODING_ZSTD} body")
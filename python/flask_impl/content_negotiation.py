@@ -0,0 +1,186 @@
+"""
+HTTP Content Negotiation
+
+Proactive negotiation on the Accept header as specified in RFC 9110,
+section 12.5.1: the header is tokenized into media ranges with their
+parameters and weights, each available media type takes the weight of the
+most specific range that matches it, and the type with the highest weight
+wins. Ties are broken by the specificity of the matching range, then by the
+server's order of preference.
+"""
+
+import re
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+# qvalue = ( "0" [ "." 0*3DIGIT ] ) / ( "1" [ "." 0*3("0") ] )
+QVALUE_PATTERN = re.compile(r'(0(\.[0-9]{0,3})?|1(\.0{0,3})?)')
+
+# token characters of RFC 9110, section 5.6.2
+TOKEN_PATTERN = re.compile(r"[!#$%&'*+.^_`|~0-9A-Za-z-]+")
+
+
+# =============================================================================
+# ACCEPT HEADER PARSING
+# =============================================================================
+
+class MediaRange(NamedTuple):
+    """One element of an Accept header."""
+
+    type: str
+    subtype: str
+    params: Tuple[Tuple[str, str], ...]
+    q: float
+
+    @property
+    def specificity(self) -> int:
+        """Precedence of the range: */* < type/* < type/subtype < type/subtype;params."""
+        if self.type == '*':
+            return 0
+        if self.subtype == '*':
+            return 1
+        return 2 + len(self.params)
+
+    def matches(self, media_type: str, subtype: str, params: Dict[str, str]) -> bool:
+        """
+        Check whether the range includes the given media type.
+
+        Range parameters only restrict the match for parameters that the media
+        type defines; e.g. a charset on application/json is ignored.
+        """
+        if self.type != '*' and self.type != media_type:
+            return False
+        if self.subtype != '*' and self.subtype != subtype:
+            return False
+        return all(params.get(name, value) == value for name, value in self.params)
+
+
+def parse_accept(accept_header: str) -> List[MediaRange]:
+    """
+    Tokenize an Accept header into media ranges.
+
+    Type, subtype and parameter names are case-insensitive; parameters after
+    the weight are accept-extensions and are ignored, and so are malformed
+    media ranges.
+
+    Args:
+        accept_header: The Accept header value
+
+    Returns:
+        List of media ranges, in header order
+
+    Raises:
+        ValueError: If a q-value is malformed
+    """
+    ranges = []
+    for element in _split_list(accept_header, ','):
+        if not element:
+            continue
+        parts = _split_list(element, ';')
+        media_type, _, subtype = parts[0].partition('/')
+        media_type, subtype = media_type.strip().lower(), subtype.strip().lower()
+        # Malformed media ranges are ignored, as if they were not in the header
+        if not TOKEN_PATTERN.fullmatch(media_type) or not TOKEN_PATTERN.fullmatch(subtype):
+            continue
+        if media_type == '*' and subtype != '*':
+            continue
+
+        params = []
+        q = 1.0
+        for parameter in parts[1:]:
+            if not parameter:
+                continue
+            name, _, value = parameter.partition('=')
+            name, value = name.strip().lower(), _unquote(value.strip())
+            if name == 'q':
+                if not QVALUE_PATTERN.fullmatch(value):
+                    raise ValueError(f"Invalid q value: {value!r}")
+                q = float(value)
+                break
+            params.append((name, value))
+        ranges.append(MediaRange(media_type, subtype, tuple(params), q))
+    return ranges
+
+
+def _split_list(value: str, separator: str) -> List[str]:
+    """Split a header on a separator, ignoring separators inside quoted strings."""
+    items, current, quoted, escaped = [], [], False, False
+    for char in value:
+        if escaped:
+            escaped = False
+        elif char == '\\' and quoted:
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif char == separator and not quoted:
+            items.append(''.join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    items.append(''.join(current).strip())
+    return items
+
+
+def _unquote(value: str) -> str:
+    """Remove the quotes of a quoted-string parameter value."""
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return re.sub(r'\\(.)', r'\1', value[1:-1])
+    return value
+
+
+# =============================================================================
+# NEGOTIATION
+# =============================================================================
+
+def weigh(ranges: List[MediaRange], media_type: str) -> Tuple[float, int]:
+    """
+    Weight given by the Accept ranges to one available media type.
+
+    Args:
+        ranges: Parsed Accept header
+        media_type: Available media type, e.g. "application/json"
+
+    Returns:
+        Tuple of (q-value, specificity of the matching range); (0.0, -1) if no range matches
+    """
+    parts = _split_list(media_type, ';')
+    main, _, subtype = parts[0].lower().partition('/')
+    params = dict((name.strip().lower(), value.strip())
+                  for name, _, value in (p.partition('=') for p in parts[1:] if p))
+
+    best: Optional[MediaRange] = None
+    for media_range in ranges:
+        if media_range.matches(main, subtype, params):
+            if best is None or media_range.specificity > best.specificity:
+                best = media_range
+    if best is None:
+        return 0.0, -1
+    return best.q, best.specificity
+
+
+def negotiate(accept_header: str, available: Sequence[str]) -> Optional[str]:
+    """
+    Select the best available media type for an Accept header.
+
+    Args:
+        accept_header: The Accept header value
+        available: Media types the server can produce, in order of preference
+
+    Returns:
+        The selected media type, or None if none of them is acceptable
+
+    Raises:
+        ValueError: If a q-value in the header is malformed
+    """
+    ranges = parse_accept(accept_header)
+    best, best_rank = None, (0.0, -1)
+    for media_type in available:
+        rank = weigh(ranges, media_type)
+        # Strictly better only: earlier types win ties
+        if rank[0] > 0 and rank > best_rank:
+            best, best_rank = media_type, rank
+    return best
@@ -0,0 +1,208 @@
+"""
+Delta Notification Merging
+
+Publishers in delta mode send a full notification (keyframe) from time to
+time and, in between, deltas that only carry the leaves that changed since
+the previous notification. The collector keeps the last full state of every
+publisher and merges each delta into it before validation, so that Kafka
+consumers keep receiving complete notifications:
+
+- containers are merged member by member
+- list entries are matched on their key leaves; unknown entries are appended
+- leaves and leaf-lists are replaced
+
+Notifications of a publisher carry consecutive sequence numbers. A delta is
+only merged onto the state of the immediately preceding sequence number; after
+a gap, or once the state was evicted, the publisher has to send a keyframe.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from yangson import DataModel
+from yangson.schemanode import InternalNode, ListNode
+
+from shape_cache import TreePath
+from type_coercion import SchemaPath
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+# Notification Kinds
+DELTA_KEYFRAME = 'keyframe'
+DELTA_DELTA = 'delta'
+
+
+# =============================================================================
+# LIST KEYS
+# =============================================================================
+
+# Local names of the key leaves of every list, keyed by schema path
+ListKeys = Dict[SchemaPath, Tuple[str, ...]]
+
+
+def build_list_keys(data_model: DataModel) -> ListKeys:
+    """
+    Collect the key leaves of every list of a data model.
+
+    Args:
+        data_model: The yangson data model
+
+    Returns:
+        Key leaf names of every keyed list
+    """
+    list_keys: ListKeys = {}
+    _collect(data_model.schema, (), list_keys)
+    return list_keys
+
+
+def _collect(node: InternalNode, path: SchemaPath, list_keys: ListKeys) -> None:
+    """Recursive helper of build_list_keys()."""
+    for child in node.data_children():
+        child_path = path + (child.name,)
+        if isinstance(child, ListNode) and child.keys:
+            list_keys[child_path] = tuple(name for name, _ in child.keys)
+        if isinstance(child, InternalNode):
+            _collect(child, child_path, list_keys)
+
+
+# =============================================================================
+# MERGING
+# =============================================================================
+
+def merge_tree(base: Any, delta: Any, list_keys: ListKeys, path: SchemaPath = ()) -> Any:
+    """
+    Apply a delta to a full notification tree.
+
+    Neither argument is modified: objects and lists touched by the delta are
+    copied, everything else is shared with the base.
+
+    Args:
+        base: Full tree of the previous notification
+        delta: Changed members of the new notification
+        list_keys: Key leaves of the lists, from build_list_keys()
+        path: Schema path of base and delta
+
+    Returns:
+        The full tree of the new notification
+    """
+    if isinstance(base, dict) and isinstance(delta, dict):
+        merged = dict(base)
+        for key, value in delta.items():
+            if key in base:
+                merged[key] = merge_tree(base[key], value, list_keys, path + (key.rpartition(':')[2],))
+            else:
+                merged[key] = value
+        return merged
+
+    keys = list_keys.get(path)
+    if keys and isinstance(base, list) and isinstance(delta, list):
+        merged_list = list(base)
+        positions = {_entry_key(entry, keys): index for index, entry in enumerate(base)}
+        for entry in delta:
+            index = positions.get(_entry_key(entry, keys))
+            if index is None:
+                merged_list.append(entry)
+            else:
+                merged_list[index] = merge_tree(base[index], entry, list_keys, path)
+        return merged_list
+
+    return delta
+
+
+def _entry_key(entry: Any, keys: Tuple[str, ...]) -> Optional[Tuple[Any, ...]]:
+    """Key leaf values of a list entry; None for entries that cannot be matched."""
+    if not isinstance(entry, dict):
+        return None
+    return tuple(entry.get(key) for key in keys)
+
+
+def copy_paths(tree: Any, paths: List[TreePath]) -> Any:
+    """
+    Copy the objects at the given paths, and their ancestors, out of a shared tree.
+
+    In-place changes at these paths (such as strip_prefixes_at()) then leave
+    the original tree untouched.
+
+    Args:
+        tree: Decoded notification tree
+        paths: Paths of the objects about to be modified
+
+    Returns:
+        The partially copied tree
+    """
+    if not paths:
+        return tree
+    copied = _shallow_copy(tree)
+    for path in paths:
+        obj = copied
+        for step in path:
+            obj[step] = _shallow_copy(obj[step])
+            obj = obj[step]
+    return copied
+
+
+def _shallow_copy(obj: Any) -> Any:
+    return list(obj) if isinstance(obj, list) else dict(obj)
+
+
+# =============================================================================
+# PUBLISHER STATE
+# =============================================================================
+
+class PublisherState(NamedTuple):
+    """Last full notification of a publisher."""
+
+    sequence: int
+    tree: Any
+
+
+class DeltaStateStore:
+    """Last full notification of every publisher in delta mode, least recently used evicted first."""
+
+    def __init__(self, max_publishers: int = 10000) -> None:
+        """
+        Args:
+            max_publishers: Bound on the number of publishers whose state is kept
+        """
+        self.max_publishers = max_publishers
+        self._state: 'OrderedDict[str, PublisherState]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def base(self, publisher_id: str, sequence: int) -> Optional[Any]:
+        """
+        Look up the state a delta applies to.
+
+        Args:
+            publisher_id: Identity of the sending publisher
+            sequence: Sequence number of the delta
+
+        Returns:
+            Full tree of the preceding notification, or None if it is not known
+        """
+        with self._lock:
+            state = self._state.get(publisher_id)
+            if state is None or state.sequence + 1 != sequence:
+                return None
+            self._state.move_to_end(publisher_id)
+            return state.tree
+
+    def store(self, publisher_id: str, sequence: int, tree: Any) -> None:
+        """
+        Record the full tree of an accepted notification.
+
+        The tree must not be modified afterwards; see copy_paths().
+
+        Args:
+            publisher_id: Identity of the sending publisher
+            sequence: Sequence number of the notification
+            tree: Full notification tree
+        """
+        with self._lock:
+            self._state[publisher_id] = PublisherState(sequence, tree)
+            self._state.move_to_end(publisher_id)
+            if len(self._state) > self.max_publishers:
+                self._state.popitem(last=False)
@@ -3,6 +3,7 @@ import influxdb_client
 from influxdb_client.client.write_api import SYNCHRONOUS
 from influxdb_client import Point
 import json
+import cbor2
 from dotenv import load_dotenv
 import os
 
@@ -13,6 +14,12 @@ KAFKA_BROKER = "kafka:9092"
 KAFKA_TOPIC = "test-topic"
 GROUP_ID = "influxdb-consumer-group"
 
+# Encoding of the message value, set by the collector in the message headers.
+# Messages without the header are JSON text.
+HEADER_CONTENT_TYPE = "content-type"
+MIME_APPLICATION_JSON = "application/json"
+MIME_APPLICATION_CBOR = "application/cbor"
+
 consumer_config = {
     "bootstrap.servers": KAFKA_BROKER,
     "group.id": GROUP_ID,
@@ -30,6 +37,20 @@ INFLUXDB_BUCKET = os.getenv("INFLUXDB_BUCKET")
 client = influxdb_client.InfluxDBClient(url=INFLUXDB_URL, token=INFLUXDB_TOKEN, org=INFLUXDB_ORG)
 write_api = client.write_api(write_options=SYNCHRONOUS)
 
+def get_content_type(msg):
+    for key, value in msg.headers() or []:
+        if key == HEADER_CONTENT_TYPE and value is not None:
+            return value.decode("ascii")
+    return MIME_APPLICATION_JSON
+
+def decode_message(msg):
+    content_type = get_content_type(msg)
+    if content_type == MIME_APPLICATION_CBOR:
+        return cbor2.loads(msg.value())
+    if content_type == MIME_APPLICATION_JSON:
+        return json.loads(msg.value().decode("utf-8"))
+    raise ValueError(f"Unsupported message content type: {content_type}")
+
 def consume_and_insert():
     print("Consuming messages from Kafka and inserting into InfluxDB...")
     try:
@@ -44,12 +65,11 @@ def consume_and_insert():
                     print(f"Consumer error: {msg.error()}")
                     break
             
-            # Parse the Kafka message
-            message = msg.value().decode("utf-8")
-            print(f"Received message: {message}")
+            print(f"Received message: {msg.value()!r}")
             
             try:
-                data = json.loads(message)
+                # Parse the Kafka message according to its content-type header
+                data = decode_message(msg)
                 
                 notification_data = data.get("ietf-https-notif:notification", data.get("notification", {}))
 
@@ -0,0 +1,61 @@
+"""
+Request Metric Labels
+
+Label values of the HTTP request metrics that both collectors record. Values
+taken from the request (method, Content-Type) are replaced by 'other' unless
+allowlisted, and unrouted paths share one endpoint value, so that the number
+of time series does not depend on the traffic.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from notification_pipeline import (
+    MIME_APPLICATION_CBOR, MIME_APPLICATION_CBOR_SEQ, MIME_APPLICATION_JSON, MIME_APPLICATION_XML,
+)
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+METRICS_LABEL_OTHER = 'other'
+METRICS_LABEL_UNKNOWN = 'unknown'   # request without Content-Type
+METRICS_ALLOWED_METHODS = frozenset(['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'])
+METRICS_ALLOWED_CONTENT_TYPES = frozenset([
+    MIME_APPLICATION_JSON, MIME_APPLICATION_XML, MIME_APPLICATION_CBOR, MIME_APPLICATION_CBOR_SEQ])
+
+
+# =============================================================================
+# LABEL MAPPING
+# =============================================================================
+
+def request_labels(method: str, content_type: Optional[str],
+                   endpoint: Optional[str]) -> Tuple[Dict[str, str], List[str]]:
+    """
+    Map the attributes of a request to metric label values.
+
+    Args:
+        method: HTTP method of the request
+        content_type: Content-Type header, None if absent
+        endpoint: Route template that served the request, None if unrouted
+
+    Returns:
+        Tuple of (label values by label name, names of the labels whose value
+        was replaced because it is not allowlisted)
+    """
+    normalized = []
+    if content_type is None:
+        content_type = METRICS_LABEL_UNKNOWN
+    else:
+        # Media type parameters (e.g. charset) are not part of the label
+        content_type = content_type.split(';', 1)[0].strip().lower()
+        if content_type not in METRICS_ALLOWED_CONTENT_TYPES:
+            normalized.append('content_type')
+            content_type = METRICS_LABEL_OTHER
+    if endpoint is None:
+        normalized.append('endpoint')
+        endpoint = METRICS_LABEL_OTHER
+    if method not in METRICS_ALLOWED_METHODS:
+        normalized.append('method')
+        method = METRICS_LABEL_OTHER
+    return {'method': method, 'endpoint': endpoint, 'content_type': content_type}, normalized
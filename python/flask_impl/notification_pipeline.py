@@ -0,0 +1,354 @@
+"""
+Notification Pipeline
+
+Decoding, YANG validation and normalization of notifications, shared by the
+Flask collector and the validation workers of the FastAPI collector. A
+PipelineContext holds everything derived once from the YANG data model; a
+NotificationPipeline carries one notification from the request body to the
+message forwarded to Kafka, decoding the body exactly once.
+
+Measurements are reported to a PipelineMetrics object. The default one
+records nothing; the Flask collector plugs in its Prometheus metrics.
+"""
+
+import json
+import logging
+from contextlib import nullcontext
+from typing import Any, ContextManager, Dict, List, Optional, Tuple, Union
+from xml.parsers.expat import ExpatError
+
+import cbor2
+from yangson import DataModel
+from yangson.enumerations import ContentType
+
+from delta_merge import ListKeys, build_list_keys, copy_paths, merge_tree
+from shape_cache import ShapeCache, prefixed_member_paths, split_structure, strip_prefixes_at
+from type_coercion import CoercionTable, build_coercion_table
+from validation_policy import OUTCOME_FAILED, OUTCOME_VALIDATED, ValidationPolicy
+from xml_decoder import ElementSchema, XmlNotificationDecoder, build_element_schema
+from yang_validator import CompiledValidator, ValidationPlan
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+# MIME Types
+MIME_APPLICATION_XML = "application/xml"
+MIME_APPLICATION_JSON = "application/json"
+MIME_APPLICATION_CBOR = "application/cbor"
+MIME_APPLICATION_CBOR_SEQ = "application/cbor-seq"
+
+# Values of the 'encoding' label of the latency histograms
+ENCODING_LABELS = {
+    MIME_APPLICATION_JSON: 'json',
+    MIME_APPLICATION_XML: 'xml',
+    MIME_APPLICATION_CBOR: 'cbor',
+    MIME_APPLICATION_CBOR_SEQ: 'cbor',
+}
+ENCODING_LABEL_NONE = 'none'
+
+# Pipeline Stages (values of the 'stage' label of the stage latency histogram)
+STAGE_DECODE = 'decode'
+STAGE_DELTA_MERGE = 'delta_merge'
+STAGE_NAMESPACE_STRIP = 'namespace_strip'
+STAGE_VALIDATION = 'validation'
+
+# Error Messages
+INVALID_CONTENT_TYPE_ERROR = "Invalid Content-Type"
+VALIDATION_ERROR = "Validation error: data does not conform to the YANG module"
+
+
+# =============================================================================
+# CONTEXT
+# =============================================================================
+
+class PipelineMetrics:
+    """Receives the measurements of the pipeline; records nothing."""
+
+    def stage(self, stage: str, encoding: str) -> ContextManager[Any]:
+        """
+        Time a pipeline stage.
+
+        Args:
+            stage: One of the STAGE_* constants
+            encoding: Value of ENCODING_LABELS
+
+        Returns:
+            Context manager around the stage
+        """
+        return nullcontext()
+
+    def shape_lookup(self, was_hit: bool, shape_cache: ShapeCache) -> None:
+        """A notification shape was looked up in shape_cache."""
+
+    def validation_outcome(self, outcome: str) -> None:
+        """A notification was validated, skipped or rejected."""
+
+
+class PipelineContext:
+    """Everything derived once from the YANG data model, plus the collector policies."""
+
+    def __init__(self, data_model: Optional[DataModel], compile_validator: bool = True,
+                 shape_cache_size: int = 128, validation_policy: Optional[ValidationPolicy] = None,
+                 metrics: Optional[PipelineMetrics] = None, logger: Optional[logging.Logger] = None) -> None:
+        """
+        Args:
+            data_model: The yangson data model; None rejects every notification
+            compile_validator: Use the compiled validator as fast path in front of yangson
+            shape_cache_size: Number of notification shapes whose plan is cached
+            validation_policy: Decides when validation may be skipped; None validates everything
+            metrics: Receiver of the measurements
+            logger: Logger of decoding and validation errors
+        """
+        self.data_model = data_model
+        self.validation_policy = validation_policy
+        self.metrics = metrics or PipelineMetrics()
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.compiled_validator: Optional[CompiledValidator] = None
+        if data_model and compile_validator:
+            try:
+                self.compiled_validator = CompiledValidator(data_model)
+            except Exception as e:
+                self.logger.error(f"Failed to compile YANG validator, falling back to yangson: {e}")
+
+        # Type coercion table and XML decoder generated from the YANG schema
+        if data_model:
+            self.coercion_table = build_coercion_table(data_model)
+            self.xml_decoder = XmlNotificationDecoder(build_element_schema(data_model, self.coercion_table))
+            self.list_keys: ListKeys = build_list_keys(data_model)
+        else:
+            self.coercion_table = CoercionTable({}, frozenset())
+            self.xml_decoder = XmlNotificationDecoder(ElementSchema(''))
+            self.list_keys = {}
+
+        self.shape_cache = ShapeCache(shape_cache_size)
+
+    def validate(self, tree: Any, shape_plan: Optional['ShapePlan'] = None,
+                 values: Optional[List[Any]] = None) -> Tuple[bool, Optional[str]]:
+        """
+        Validate a decoded notification against the YANG model.
+
+        Args:
+            tree: Notification tree produced by NotificationPipeline.decode
+            shape_plan: Cached plan of the notification shape, if already looked up
+            values: Scalar values of the tree, as split off by split_structure()
+
+        Returns:
+            Tuple of (is_valid: bool, error_message: Optional[str])
+        """
+        if not self.data_model:
+            return False, "YANG data model not initialized"
+
+        # Fast path: compiled checkers; anything they reject is confirmed by yangson
+        if shape_plan is not None and values is not None:
+            if shape_plan.validation and shape_plan.validation.check(values):
+                return True, None
+        elif self.compiled_validator and self.compiled_validator.check(tree):
+            return True, None
+
+        try:
+            instance = self.data_model.from_raw(tree)
+            instance.validate(ctype=ContentType.all)
+            return True, None
+        except Exception as e:
+            self.logger.error(f"YANG validation error: {e}")
+            return False, VALIDATION_ERROR
+
+
+class ShapePlan:
+    """Work that only depends on the shape of a notification, cached per shape."""
+
+    def __init__(self, context: PipelineContext, tree: Any) -> None:
+        """
+        Args:
+            context: Context of the pipeline
+            tree: Decoded notification tree of the shape (before normalization)
+        """
+        # Value checks of the compiled validator; None when yangson has to decide
+        self.validation: Optional[ValidationPlan] = (
+            context.compiled_validator.compile_plan(tree) if context.compiled_validator else None)
+        # Objects whose member names carry namespace prefixes
+        self.renames = prefixed_member_paths(tree)
+
+
+# =============================================================================
+# NOTIFICATION PIPELINE
+# =============================================================================
+
+class NotificationPipeline:
+    """
+    A single notification on its way from the request body to Kafka.
+
+    The body is decoded exactly once; the parsed tree is then carried through
+    validation, normalization and serialization.
+    """
+
+    def __init__(self, context: PipelineContext, data_string: Optional[bytes], content_type: str) -> None:
+        """
+        Args:
+            context: Context of the pipeline
+            data_string: Raw request data as bytes
+            content_type: Content type of the request
+        """
+        self.context = context
+        self.data_string = data_string
+        self.content_type = content_type
+        self.encoding = ENCODING_LABELS.get(content_type, ENCODING_LABEL_NONE)
+        self.tree: Optional[Dict[str, Any]] = None
+        self.shape: Any = None
+        self.values: List[Any] = []
+        self.shape_plan: Optional[ShapePlan] = None
+        self._normalized = False
+
+    @classmethod
+    def from_tree(cls, context: PipelineContext, tree: Any, content_type: str,
+                  data_string: Optional[bytes] = None) -> 'NotificationPipeline':
+        """
+        Create the pipeline of a notification already decoded from a batch.
+
+        Args:
+            context: Context of the pipeline
+            tree: Decoded notification tree
+            content_type: Encoding of the single notification
+            data_string: Raw bytes of the notification, if they can be forwarded as-is
+
+        Returns:
+            The pipeline, ready for validation
+        """
+        pipeline = cls(context, data_string, content_type)
+        pipeline.tree = tree
+        pipeline.analyze()
+        return pipeline
+
+    def decode(self, analyze: bool = True) -> Tuple[bool, Optional[str]]:
+        """
+        Parse the raw body into a JSON-compatible tree.
+
+        Args:
+            analyze: Look up the shape plan of the tree; deltas are only analyzed once merged
+
+        Returns:
+            Tuple of (is_decoded: bool, error_message: Optional[str])
+        """
+        with self.context.metrics.stage(STAGE_DECODE, self.encoding):
+            return self._decode(analyze)
+
+    def _decode(self, analyze: bool) -> Tuple[bool, Optional[str]]:
+        logger = self.context.logger
+        try:
+            if self.content_type == MIME_APPLICATION_JSON:
+                self.tree = json.loads(self.data_string.decode('utf-8'))
+
+            elif self.content_type == MIME_APPLICATION_XML:
+                self.tree = self.context.xml_decoder.decode(self.data_string)
+
+            elif self.content_type == MIME_APPLICATION_CBOR:
+                # CBOR carries native numbers for 64-bit integers and enumerations
+                self.tree = self.context.coercion_table.apply(cbor2.loads(self.data_string))
+
+            else:
+                return False, INVALID_CONTENT_TYPE_ERROR
+
+        except (json.JSONDecodeError, UnicodeDecodeError, cbor2.CBORDecodeError, ExpatError) as e:
+            logger.error(f"Parsing error for {self.content_type}: {e}")
+            return False, "Parsing error: invalid data format"
+        except Exception as e:
+            logger.error(f"Unexpected parsing error: {e}")
+            return False, "Parsing error: unexpected format issue"
+
+        if analyze:
+            self.analyze()
+        return True, None
+
+    def analyze(self) -> None:
+        """Split the decoded tree into shape and values and look up the shape plan."""
+        context = self.context
+        self.shape, self.values = split_structure(self.tree)
+        tree = self.tree
+        self.shape_plan, was_hit = context.shape_cache.get(self.shape, lambda: ShapePlan(context, tree))
+        context.metrics.shape_lookup(was_hit, context.shape_cache)
+
+    def merge_delta(self, base: Any) -> None:
+        """
+        Replace the decoded delta by the full tree obtained by applying it to the previous state.
+
+        Args:
+            base: Full tree of the previous notification of the publisher
+        """
+        with self.context.metrics.stage(STAGE_DELTA_MERGE, self.encoding):
+            self.tree = merge_tree(base, self.tree, self.context.list_keys)
+        # The raw body only holds the delta: forward the merged tree instead
+        self.data_string = None
+        self.analyze()
+
+    def detach(self) -> None:
+        """Copy the parts of the tree that normalize() renames, once the tree is kept as delta state."""
+        self.tree = copy_paths(self.tree, self.shape_plan.renames)
+
+    def validate(self, publisher_id: str) -> Tuple[bool, Optional[str]]:
+        """
+        Validate the decoded tree against the YANG model, as far as the
+        validation policy requires for this publisher.
+
+        Args:
+            publisher_id: Identity of the sending publisher
+
+        Returns:
+            Tuple of (is_valid: bool, error_message: Optional[str])
+        """
+        context = self.context
+        with context.metrics.stage(STAGE_VALIDATION, self.encoding):
+            if context.validation_policy is None:
+                is_valid, error_message = context.validate(self.tree, self.shape_plan, self.values)
+                outcome = OUTCOME_VALIDATED if is_valid else OUTCOME_FAILED
+            else:
+                is_valid, error_message, outcome = context.validation_policy.check(
+                    publisher_id, self.tree,
+                    lambda tree: context.validate(tree, self.shape_plan, self.values),
+                    fingerprint=hash(self.shape))
+        context.metrics.validation_outcome(outcome)
+        return is_valid, error_message
+
+    def normalize(self) -> Dict[str, Any]:
+        """
+        Bring the decoded tree into the shape forwarded to Kafka.
+
+        Returns:
+            The tree with XML namespace prefixes removed
+        """
+        if self.content_type == MIME_APPLICATION_XML and not self._normalized:
+            # Member names are renamed in place, at the paths cached for the shape
+            with self.context.metrics.stage(STAGE_NAMESPACE_STRIP, self.encoding):
+                strip_prefixes_at(self.tree, self.shape_plan.renames)
+            self._normalized = True
+        return self.tree
+
+    def serialize(self) -> str:
+        """
+        Serialize the normalized tree for Kafka.
+
+        Returns:
+            JSON string representation of the notification
+        """
+        return json.dumps(self.normalize())
+
+    def kafka_payload(self, forward_raw: bool) -> Tuple[Union[str, bytes], str]:
+        """
+        Select the bytes forwarded to Kafka.
+
+        With forward_raw, JSON and CBOR bodies are forwarded exactly as
+        received; XML, and JSON notifications taken out of a batch array, are
+        always normalized and re-encoded as JSON.
+
+        Args:
+            forward_raw: Raw forwarding mode of the collector
+
+        Returns:
+            Tuple of (message_value, content_type)
+        """
+        if (forward_raw and self.data_string is not None and
+                self.content_type in (MIME_APPLICATION_JSON, MIME_APPLICATION_CBOR)):
+            return self.data_string, self.content_type
+        return self.serialize(), MIME_APPLICATION_JSON
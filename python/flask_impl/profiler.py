@@ -0,0 +1,211 @@
+"""
+Statistical Stack Sampler
+
+Low-overhead profiler for a live collector process: a single thread wakes up
+at a fixed interval, takes the current stack of every other thread through
+sys._current_frames() and counts identical stacks. Nothing is instrumented,
+so the request threads run at full speed; the cost is one stack walk per
+thread per interval, on the sampling thread.
+
+Threads that are blocked waiting (in select, on a socket read, on a lock or
+condition) are not counted: on a mostly idle collector they would make up
+nearly every sample. The number of such idle samples is reported instead.
+
+The result is available as collapsed stacks (one "root;...;leaf count" line
+per distinct stack, the input format of flamegraph.pl and speedscope) and as
+a table of the hottest functions.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+
+# =============================================================================
+# TYPES
+# =============================================================================
+
+# Stack of frame labels, from the outermost frame to the innermost one
+Stack = Tuple[str, ...]
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+# Innermost frames (file name, function) of a thread blocked in a C call while
+# waiting: the selector loop of socketserver, accept() and reads of sockets and
+# TLS connections (e.g. keep-alive connections between two requests), and
+# Event/Condition waits and thread joins. A bare time.sleep() leaves no such
+# frame; threads that sleep in their own loop are excluded by name instead.
+IDLE_FRAMES = frozenset([
+    ('selectors.py', 'select'),
+    ('socket.py', 'accept'),
+    ('socket.py', 'readinto'),
+    ('ssl.py', 'read'),
+    ('ssl.py', 'recv_into'),
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+])
+
+
+class FunctionStats(NamedTuple):
+    """Samples of one function in a profile."""
+
+    function: str
+    self_samples: int       # samples with the function as innermost frame
+    total_samples: int      # samples with the function anywhere in the stack
+
+
+# =============================================================================
+# PROFILE
+# =============================================================================
+
+class Profile:
+    """Stacks counted by a sampling run."""
+
+    def __init__(self, stacks: Counter, samples: int, duration: float, interval: float,
+                 idle_samples: int = 0) -> None:
+        """
+        Args:
+            stacks: Number of occurrences of every distinct stack
+            samples: Number of sampling rounds
+            duration: Seconds the sampling ran
+            interval: Seconds between two rounds
+            idle_samples: Thread stacks left out because the thread was waiting
+        """
+        self.stacks = stacks
+        self.samples = samples
+        self.duration = duration
+        self.interval = interval
+        self.idle_samples = idle_samples
+
+    def collapsed(self) -> str:
+        """
+        Render the stacks in the collapsed format.
+
+        Returns:
+            One "frame;frame;frame count" line per distinct stack, most frequent first
+        """
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, limit: int) -> List[FunctionStats]:
+        """
+        Rank the functions by the number of samples spent in them.
+
+        Args:
+            limit: Maximum number of functions returned
+
+        Returns:
+            Functions by decreasing self samples, then total samples
+        """
+        self_samples: Counter = Counter()
+        total_samples: Counter = Counter()
+        for stack, count in self.stacks.items():
+            self_samples[stack[-1]] += count
+            # Recursive functions count once per stack
+            for function in set(stack):
+                total_samples[function] += count
+        ranked = sorted(total_samples, key=lambda function: (self_samples[function], total_samples[function]),
+                        reverse=True)
+        return [FunctionStats(function, self_samples[function], total_samples[function])
+                for function in ranked[:limit]]
+
+
+# =============================================================================
+# SAMPLER
+# =============================================================================
+
+class StackSampler:
+    """Samples the stacks of all threads of the process; one run at a time."""
+
+    def __init__(self, interval: float, max_depth: int,
+                 ignored_threads: FrozenSet[str] = frozenset(),
+                 idle_frames: FrozenSet[Tuple[str, str]] = IDLE_FRAMES) -> None:
+        """
+        Args:
+            interval: Seconds between two samples
+            max_depth: Innermost frames kept per stack; deeper stacks are truncated
+            ignored_threads: Names of background threads that are not sampled
+            idle_frames: (file name, function) of innermost frames that mean the thread is waiting
+        """
+        self.interval = interval
+        self.max_depth = max_depth
+        self.ignored_threads = ignored_threads
+        self.idle_frames = idle_frames
+        self._running = threading.Lock()
+        # Frame label of every code object seen, so each is formatted once
+        self._labels: Dict[object, str] = {}
+        # Whether a code object is an idle frame, for every innermost code object seen
+        self._idle: Dict[object, bool] = {}
+
+    def sample(self, seconds: float) -> Optional[Profile]:
+        """
+        Sample every thread except the calling and the ignored ones for the given duration.
+
+        Args:
+            seconds: Duration of the run
+
+        Returns:
+            The profile, or None if another run is in progress
+        """
+        if not self._running.acquire(blocking=False):
+            return None
+        try:
+            return self._sample(seconds)
+        finally:
+            self._running.release()
+
+    def _sample(self, seconds: float) -> Profile:
+        own_thread = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = 0
+        idle_samples = 0
+        start = time.monotonic()
+        deadline = start + seconds
+        next_sample = start
+        while True:
+            # Looked up every round: ignored threads may start during the run (e.g. drain)
+            skipped = {thread.ident for thread in threading.enumerate() if thread.name in self.ignored_threads}
+            skipped.add(own_thread)
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id in skipped:
+                    continue
+                if self._is_idle(frame.f_code):
+                    idle_samples += 1
+                else:
+                    stacks[self._stack(frame)] += 1
+            samples += 1
+            # Fixed schedule; rounds missed under load are skipped, not caught up,
+            # so the sampler never takes more than one round per interval
+            now = time.monotonic()
+            next_sample = max(next_sample + self.interval, now)
+            if next_sample >= deadline:
+                break
+            time.sleep(next_sample - now)
+        return Profile(stacks, samples, time.monotonic() - start, self.interval, idle_samples)
+
+    def _is_idle(self, code) -> bool:
+        idle = self._idle.get(code)
+        if idle is None:
+            idle = (os.path.basename(code.co_filename), code.co_name) in self.idle_frames
+            self._idle[code] = idle
+        return idle
+
+    def _stack(self, frame) -> Stack:
+        labels = []
+        while frame is not None and len(labels) < self.max_depth:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                # ';' and ' ' separate frames and counts in the collapsed format
+                label = f"{code.co_name}({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                label = label.replace(';', ':').replace(' ', '_')
+                self._labels[code] = label
+            labels.append(label)
+            frame = frame.f_back
+        labels.reverse()
+        return tuple(labels)
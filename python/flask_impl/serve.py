@@ -0,0 +1,307 @@
+"""
+Multi-process Collector Server
+
+Pre-fork server for the Flask collector: the master process binds the
+listening socket once and forks SERVER_WORKERS worker processes that accept
+connections on it. YANG validation is CPU-bound and holds the GIL, so one
+process per core lets throughput scale with the number of cores.
+
+Every worker imports app.py only after the fork, so each worker loads the
+YANG data model once and owns its Kafka producer and poll thread; librdkafka
+threads are never forked. On SIGTERM or SIGINT the master forwards the signal
+to the workers, which stop accepting connections, finish the requests in
+progress, flush their Kafka producer and exit. Workers that die unexpectedly
+are replaced.
+
+The workers share their Prometheus metrics through mmap-backed files in
+PROMETHEUS_MULTIPROC_DIR, which /metrics aggregates at scrape time.
+
+Usage (from python/flask_impl):
+    python3 serve.py [--workers N] [--host HOST] [--port PORT] [--cert FILE --key FILE] [--client-ca FILE]
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import signal
+import socket
+import ssl
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler, make_server
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+# Server Configuration
+SERVER_HOST = os.getenv('SERVER_HOST', '0.0.0.0')
+SERVER_PORT = int(os.getenv('SERVER_PORT', '8080'))
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', str(os.cpu_count() or 1)))
+SERVER_BACKLOG = int(os.getenv('SERVER_BACKLOG', '1024'))
+SERVER_CERT_FILE = os.getenv('SERVER_CERT_FILE', '../../certs/server.crt')
+SERVER_KEY_FILE = os.getenv('SERVER_KEY_FILE', '../../certs/server.key')
+# CA certificates of the publishers' client certificates; when set, publishers
+# may present one, and it identifies them (e.g. for delta notifications)
+SERVER_CLIENT_CA_FILE = os.getenv('SERVER_CLIENT_CA_FILE', '')
+
+# Graceful Shutdown Configuration
+# - SERVER_DRAIN_TIMEOUT: seconds the workers get to finish their requests and
+#   flush Kafka after SIGTERM before they are killed
+# - SERVER_KEEPALIVE_TIMEOUT: seconds an idle keep-alive connection stays open,
+#   which also bounds how long it can delay the drain
+SERVER_DRAIN_TIMEOUT = float(os.getenv('SERVER_DRAIN_TIMEOUT', '30'))
+SERVER_KEEPALIVE_TIMEOUT = float(os.getenv('SERVER_KEEPALIVE_TIMEOUT', '5'))
+
+# Directory of the multi-process Prometheus metric files; a temporary
+# directory is used when it is not set
+PROMETHEUS_MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+# Seconds between checks of the master for exited workers, and of the workers for their master
+WORKER_POLL_INTERVAL = 0.5
+
+# Seconds to wait before replacing a worker that exited unexpectedly
+WORKER_RESPAWN_DELAY = 1.0
+
+
+# =============================================================================
+# WORKER PROCESS
+# =============================================================================
+
+class DrainingRequestHandler(WSGIRequestHandler):
+    """Request handler that closes keep-alive connections once the server drains."""
+
+    timeout = SERVER_KEEPALIVE_TIMEOUT
+
+    def handle_one_request(self) -> None:
+        super().handle_one_request()
+        if getattr(self.server, 'draining', False):
+            self.close_connection = True
+
+
+def run_worker(listener: socket.socket, ssl_context: Optional[ssl.SSLContext]) -> int:
+    """
+    Serve the collector on an inherited listening socket until SIGTERM.
+
+    Args:
+        listener: Listening socket bound by the master process
+        ssl_context: TLS context, or None for plain HTTP
+
+    Returns:
+        Process exit code
+    """
+    # Imported here so that the data model and the Kafka producer are created
+    # in the worker, after the fork
+    import app as collector
+
+    server: BaseWSGIServer = make_server(
+        listener.getsockname()[0], listener.getsockname()[1], collector.app,
+        threaded=True, request_handler=DrainingRequestHandler,
+        ssl_context=ssl_context, fd=listener.fileno())
+    # Track request threads so that server_close() waits for them
+    server.daemon_threads = False
+    server.draining = False
+
+    def drain(signum, frame) -> None:
+        server.draining = True
+        # shutdown() blocks until serve_forever() returns: call it off the serving thread
+        threading.Thread(target=server.shutdown, name='drain', daemon=True).start()
+
+    signal.signal(signal.SIGTERM, drain)
+
+    def watch_master(master_pid: int) -> None:
+        # A master killed with SIGKILL cannot forward SIGTERM: drain on our own
+        while os.getppid() == master_pid:
+            time.sleep(WORKER_POLL_INTERVAL)
+        drain(signal.SIGTERM, None)
+
+    threading.Thread(target=watch_master, args=(os.getppid(),), name='watch-master', daemon=True).start()
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        collector.shutdown_kafka_producer()
+    return 0
+
+
+def spawn_worker(listener: socket.socket, ssl_context: Optional[ssl.SSLContext]) -> int:
+    """
+    Fork a worker process.
+
+    Returns:
+        PID of the worker
+    """
+    pid = os.fork()
+    if pid == 0:
+        # Until the server is up, SIGTERM simply ends the worker
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        code = 1
+        try:
+            code = run_worker(listener, ssl_context)
+        except Exception as e:
+            print(f"Worker {os.getpid()} failed: {e}", file=sys.stderr)
+        finally:
+            # Skip the master's interpreter shutdown: the worker already flushed Kafka
+            os._exit(code)
+    return pid
+
+
+# =============================================================================
+# MASTER PROCESS
+# =============================================================================
+
+def prepare_metrics_dir() -> Tuple[str, bool]:
+    """
+    Provide an empty directory for the multi-process metric files.
+
+    Must run before prometheus_client is imported: the library selects its
+    mmap-backed values at import time, and the workers inherit the choice.
+
+    Returns:
+        Tuple of (directory, created: bool); created directories are removed at shutdown
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+        # Files of a previous run would be aggregated with the new workers
+        for path in glob.glob(os.path.join(PROMETHEUS_MULTIPROC_DIR, '*.db')):
+            os.remove(path)
+        return PROMETHEUS_MULTIPROC_DIR, False
+    metrics_dir = tempfile.mkdtemp(prefix='collector-metrics-')
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = metrics_dir
+    return metrics_dir, True
+
+
+def mark_worker_dead(pid: int, metrics_dir: str) -> None:
+    """Drop the live-gauge files of an exited worker from the aggregated metrics."""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(pid, metrics_dir)
+
+
+def bind_listener(host: str, port: int) -> socket.socket:
+    """Bind the listening socket shared by all workers."""
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    listener = socket.socket(family, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(SERVER_BACKLOG)
+    listener.set_inheritable(True)
+    return listener
+
+
+def make_ssl_context(cert_file: str, key_file: str, client_ca_file: str) -> ssl.SSLContext:
+    """
+    Build the TLS context of the workers.
+
+    Args:
+        cert_file: Server certificate file
+        key_file: Server private key file
+        client_ca_file: CA certificates of the client certificates, or '' not to request any
+
+    Returns:
+        Server-side TLS context
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_file, key_file)
+    if client_ca_file:
+        # Optional: publishers without a certificate are still served, they are only not identified by one.
+        # Werkzeug passes a verified certificate to the application as SSL_CLIENT_CERT
+        context.verify_mode = ssl.CERT_OPTIONAL
+        context.load_verify_locations(client_ca_file)
+    return context
+
+
+def serve(host: str, port: int, workers: int, ssl_context: Optional[ssl.SSLContext]) -> int:
+    """
+    Run the master process: start the workers, replace crashed ones and drain on SIGTERM.
+
+    Args:
+        host: Address to listen on
+        port: Port to listen on
+        workers: Number of worker processes
+        ssl_context: TLS context, or None for plain HTTP
+
+    Returns:
+        Process exit code
+    """
+    metrics_dir, created_metrics_dir = prepare_metrics_dir()
+    # Inherited by the workers: app.py leaves out what needs a single process, such as delta state
+    os.environ['COLLECTOR_WORKERS'] = str(workers)
+    listener = bind_listener(host, port)
+    stopping = threading.Event()
+
+    def stop(signum, frame) -> None:
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    children: Dict[int, int] = {}
+    for slot in range(workers):
+        children[spawn_worker(listener, ssl_context)] = slot
+    scheme = 'https' if ssl_context else 'http'
+    print(f"Serving on {scheme}://{host}:{port} with {workers} worker(s)", file=sys.stderr)
+
+    while not stopping.is_set():
+        # Poll rather than block in waitpid(), which resumes after the signal handler
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if not pid:
+            stopping.wait(WORKER_POLL_INTERVAL)
+            continue
+        slot = children.pop(pid, None)
+        mark_worker_dead(pid, metrics_dir)
+        if slot is None or stopping.is_set():
+            continue
+        print(f"Worker {pid} exited with status {status}, restarting it", file=sys.stderr)
+        time.sleep(WORKER_RESPAWN_DELAY)
+        children[spawn_worker(listener, ssl_context)] = slot
+
+    # The workers keep the listening socket open until they have drained
+    listener.close()
+    for pid in children:
+        os.kill(pid, signal.SIGTERM)
+
+    deadline = time.monotonic() + SERVER_DRAIN_TIMEOUT
+    while children and time.monotonic() < deadline:
+        pid, _ = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            children.pop(pid, None)
+        else:
+            time.sleep(WORKER_POLL_INTERVAL)
+    for pid in children:
+        print(f"Worker {pid} did not drain within {SERVER_DRAIN_TIMEOUT}s, killing it", file=sys.stderr)
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+    if created_metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Multi-process HTTPS notification collector")
+    parser.add_argument('--host', default=SERVER_HOST, help="Address to listen on")
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help="Port to listen on")
+    parser.add_argument('-w', '--workers', type=int, default=SERVER_WORKERS,
+                        help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument('--cert', default=SERVER_CERT_FILE, help="TLS certificate file")
+    parser.add_argument('--key', default=SERVER_KEY_FILE, help="TLS private key file")
+    parser.add_argument('--client-ca', default=SERVER_CLIENT_CA_FILE,
+                        help="CA certificates of the publishers' client certificates (default: none requested)")
+    parser.add_argument('--no-tls', action='store_true', help="Serve plain HTTP")
+    args = parser.parse_args()
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    ssl_context = None if args.no_tls else make_ssl_context(args.cert, args.key, args.client_ca)
+    sys.exit(serve(args.host, args.port, args.workers, ssl_context))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Notification Shape Cache
+
+Publishers send notifications of the same structure over and over; only the
+scalar values change between two intervals. A decoded tree is therefore split
+into its shape (member names, list lengths, scalar types) and the flat list of
+its scalar values. Work that only depends on the shape is done once per shape
+and kept in a bounded LRU cache.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, List, Tuple, TypeVar
+
+
+# =============================================================================
+# TYPES
+# =============================================================================
+
+T = TypeVar('T')
+
+# Path from the root of a tree to a nested value: member names and list indexes
+TreePath = Tuple[Any, ...]
+
+
+# =============================================================================
+# STRUCTURE SPLITTING
+# =============================================================================
+
+def split_structure(data: Any) -> Tuple[Any, List[Any]]:
+    """
+    Split a decoded tree into its shape and its scalar values in a single pass.
+
+    Scalars are collected depth-first, in member and list order.
+
+    Args:
+        data: Decoded notification tree
+
+    Returns:
+        Tuple of (shape, values); the shape is a hashable nested tuple
+    """
+    values: List[Any] = []
+    return _shape(data, values), values
+
+
+def _shape(data: Any, values: List[Any]) -> Any:
+    """Recursive helper of split_structure()."""
+    if isinstance(data, dict):
+        return ('{',) + tuple((key, _shape(value, values)) for key, value in data.items())
+    if isinstance(data, list):
+        return ('[',) + tuple(_shape(item, values) for item in data)
+    values.append(data)
+    return type(data)
+
+
+def structural_fingerprint(data: Any) -> int:
+    """
+    Hash of the shape of a tree; equal for notifications that only differ in values.
+
+    Args:
+        data: Decoded notification tree
+
+    Returns:
+        Integer fingerprint
+    """
+    return hash(split_structure(data)[0])
+
+
+# =============================================================================
+# NAMESPACE RENAMING
+# =============================================================================
+
+def prefixed_member_paths(data: Any, path: TreePath = ()) -> List[TreePath]:
+    """
+    Find the objects of a tree that have namespace-prefixed member names.
+
+    Args:
+        data: Decoded notification tree
+        path: Path of `data` inside the whole tree
+
+    Returns:
+        Paths of the objects whose member names contain a ':'
+    """
+    found = []
+    if isinstance(data, dict):
+        if any(':' in key for key in data):
+            found.append(path)
+        for key, value in data.items():
+            found.extend(prefixed_member_paths(value, path + (key,)))
+    elif isinstance(data, list):
+        for index, item in enumerate(data):
+            found.extend(prefixed_member_paths(item, path + (index,)))
+    return found
+
+
+def strip_prefixes_at(data: Any, paths: List[TreePath]) -> Any:
+    """
+    Remove namespace prefixes from the member names of the given objects, in place.
+
+    Paths must be given parents first, as returned by prefixed_member_paths().
+    Only member names change, so paths below a renamed object use the old names;
+    objects are therefore renamed deepest first.
+
+    Args:
+        data: Decoded notification tree
+        paths: Paths of the objects to rename
+
+    Returns:
+        The same tree object, with stripped member names
+    """
+    for path in reversed(paths):
+        obj = data
+        for step in path:
+            obj = obj[step]
+        items = list(obj.items())
+        obj.clear()
+        for key, value in items:
+            obj[key.split(':')[-1]] = value
+    return data
+
+
+# =============================================================================
+# SHAPE CACHE
+# =============================================================================
+
+class ShapeCache(Generic[T]):
+    """Thread-safe LRU cache of per-shape results with hit/miss/eviction counters."""
+
+    def __init__(self, max_size: int = 128) -> None:
+        """
+        Args:
+            max_size: Maximum number of shapes kept in the cache
+        """
+        self.max_size = max(1, max_size)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[Any, T]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, shape: Any, build: Callable[[], T]) -> Tuple[T, bool]:
+        """
+        Return the cached result for a shape, building it on a miss.
+
+        Args:
+            shape: Shape returned by split_structure()
+            build: Function computing the result for this shape
+
+        Returns:
+            Tuple of (result, was_hit: bool)
+        """
+        with self._lock:
+            entry = self._entries.get(shape)
+            if entry is not None:
+                self._entries.move_to_end(shape)
+                self.hits += 1
+                return entry, True
+            self.misses += 1
+
+        # Built outside the lock: concurrent misses on one shape build it twice
+        entry = build()
+        with self._lock:
+            self._entries[shape] = entry
+            self._entries.move_to_end(shape)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry, False
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dictionary with the size, hits, misses and evictions of the cache
+        """
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,199 @@
+"""
+Schema-driven Type Coercion
+
+Generates, once at startup, a table mapping the schema path of every leaf and
+leaf-list of the data model to a coercer that converts a decoded value into
+its RFC 7951 JSON representation:
+
+- integers of up to 32 bits (counter32, gauge32, int32, ...) become numbers
+- 64-bit integers (counter64, gauge64, ...) and decimal64 become strings
+- booleans become true/false, enumerations their name
+- date-and-time values become RFC 3339 strings
+
+XML delivers every leaf as text, while CBOR (RFC 9254) carries native numbers
+for 64-bit integers, enumeration values and tagged date/time items. Values
+that cannot be converted are returned unchanged, so that validation reports
+them.
+"""
+
+import datetime
+from typing import Any, Callable, Dict, FrozenSet, Set, Tuple
+
+from yangson import DataModel
+from yangson.datatype import (
+    BooleanType, DataType, Decimal64Type, EmptyType, EnumerationType, Int64Type,
+    IntegralType, LeafrefType, Uint64Type,
+)
+from yangson.schemanode import InternalNode, LeafListNode, TerminalNode
+
+
+# =============================================================================
+# TYPES
+# =============================================================================
+
+# Path of a data node: local names from the top-level node down
+SchemaPath = Tuple[str, ...]
+
+# Converter of a decoded leaf value into its RFC 7951 JSON value
+Coercer = Callable[[Any], Any]
+
+# Name of the ietf-yang-types typedef for timestamps
+DATE_AND_TIME = 'date-and-time'
+
+
+# =============================================================================
+# COERCION TABLE
+# =============================================================================
+
+class CoercionTable:
+    """Path to coercer table of all leaves and leaf-lists of a data model."""
+
+    def __init__(self, coercers: Dict[SchemaPath, Coercer], leaf_lists: FrozenSet[SchemaPath]) -> None:
+        """
+        Args:
+            coercers: Coercer of every leaf and leaf-list, keyed by schema path
+            leaf_lists: Paths of the leaf-lists, whose values are arrays of entries
+        """
+        self.coercers = coercers
+        self.leaf_lists = leaf_lists
+        # Paths of the containers and lists that have coerced leaves below them
+        self.internal: FrozenSet[SchemaPath] = frozenset(
+            path[:depth] for path in coercers for depth in range(1, len(path)))
+
+    def apply(self, tree: Any) -> Any:
+        """
+        Coerce all leaves of a decoded tree in place, in one pass.
+
+        Member names may be module-qualified; only their local part is used.
+
+        Args:
+            tree: Decoded notification tree
+
+        Returns:
+            The same tree object, with coerced leaf values
+        """
+        if isinstance(tree, dict):
+            self._apply_object(tree, ())
+        return tree
+
+    def _apply_object(self, obj: Dict[str, Any], path: SchemaPath) -> None:
+        """Coerce the members of one container or list entry."""
+        for key, value in obj.items():
+            child = path + (key.rpartition(':')[2],)
+            coerce = self.coercers.get(child)
+            if coerce is not None:
+                if child in self.leaf_lists and isinstance(value, list):
+                    obj[key] = [coerce(item) for item in value]
+                else:
+                    obj[key] = coerce(value)
+            elif child in self.internal:
+                for entry in (value if isinstance(value, list) else (value,)):
+                    if isinstance(entry, dict):
+                        self._apply_object(entry, child)
+
+
+def build_coercion_table(data_model: DataModel) -> CoercionTable:
+    """
+    Generate the coercion table of every leaf and leaf-list of a data model.
+
+    Args:
+        data_model: The yangson data model
+
+    Returns:
+        The coercion table
+    """
+    coercers: Dict[SchemaPath, Coercer] = {}
+    leaf_lists: Set[SchemaPath] = set()
+    _collect(data_model.schema, (), coercers, leaf_lists)
+    return CoercionTable(coercers, frozenset(leaf_lists))
+
+
+def _collect(node: InternalNode, path: SchemaPath, coercers: Dict[SchemaPath, Coercer],
+             leaf_lists: Set[SchemaPath]) -> None:
+    """Recursive helper of build_coercion_table()."""
+    for child in node.data_children():
+        child_path = path + (child.name,)
+        if isinstance(child, TerminalNode):
+            coercers[child_path] = coercer_for(child.type)
+            if isinstance(child, LeafListNode):
+                leaf_lists.add(child_path)
+        elif isinstance(child, InternalNode):
+            _collect(child, child_path, coercers, leaf_lists)
+
+
+def coercer_for(dtype: DataType) -> Coercer:
+    """
+    Select the coercer of a YANG type.
+
+    Args:
+        dtype: yangson type of the leaf
+
+    Returns:
+        Coercer producing the RFC 7951 JSON value
+    """
+    if isinstance(dtype, LeafrefType):
+        return coercer_for(dtype.ref_type)
+    if isinstance(dtype, BooleanType):
+        return _coerce_boolean
+    if isinstance(dtype, EmptyType):
+        return _coerce_empty
+    if isinstance(dtype, (Int64Type, Uint64Type, Decimal64Type)):
+        return _coerce_string_number
+    if isinstance(dtype, IntegralType):
+        return _coerce_integer
+    if isinstance(dtype, EnumerationType):
+        names = {value: name for name, value in dtype.enum.items()}
+
+        def coerce_enumeration(value: Any) -> Any:
+            if isinstance(value, int) and not isinstance(value, bool):
+                return names.get(value, value)
+            return value
+        return coerce_enumeration
+    if getattr(dtype, 'name', None) == DATE_AND_TIME:
+        return _coerce_date_and_time
+    return _coerce_identity
+
+
+# =============================================================================
+# COERCERS
+# =============================================================================
+
+def _coerce_identity(value: Any) -> Any:
+    return value
+
+
+def _coerce_integer(value: Any) -> Any:
+    # int() also accepts digit separators, which YANG integers do not
+    if isinstance(value, str) and '_' not in value:
+        try:
+            return int(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _coerce_string_number(value: Any) -> Any:
+    if isinstance(value, int) and not isinstance(value, bool):
+        return str(value)
+    return value
+
+
+def _coerce_boolean(value: Any) -> Any:
+    if value == 'true':
+        return True
+    if value == 'false':
+        return False
+    return value
+
+
+def _coerce_empty(value: Any) -> Any:
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return [None]
+    return value
+
+
+def _coerce_date_and_time(value: Any) -> Any:
+    if isinstance(value, datetime.datetime) and value.tzinfo is not None:
+        text = value.isoformat()
+        return text[:-6] + 'Z' if text.endswith('+00:00') else text
+    return value
@@ -0,0 +1,128 @@
+"""
+Notification Validation Policy
+
+Decides, per notification, whether the full YANG validation has to run.
+Publishers that keep sending conforming notifications of the same shape can
+be validated on a sample basis, or trusted after a number of successful
+validations as long as the structure of their notifications does not change.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+from shape_cache import structural_fingerprint
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+# Validation Policies
+POLICY_ALL = 'all'
+POLICY_SAMPLE = 'sample'
+POLICY_TRUSTED = 'trusted'
+
+# Validation Outcomes
+OUTCOME_VALIDATED = 'validated'
+OUTCOME_SKIPPED = 'skipped'
+OUTCOME_FAILED = 'failed'
+
+
+# =============================================================================
+# VALIDATION POLICY
+# =============================================================================
+
+class ValidationPolicy:
+    """
+    Per-publisher bookkeeping that decides when full validation can be skipped.
+
+    - all: every notification is validated
+    - sample: one notification out of every sample_rate per publisher is validated,
+      and every notification of a shape not yet validated for the publisher
+    - trusted: the first trust_threshold notifications of each (publisher, shape)
+      are validated; later notifications with the same fingerprint are accepted,
+      any other shape goes through full validation again
+    """
+
+    def __init__(self, policy: str = POLICY_ALL, sample_rate: int = 1,
+                 trust_threshold: int = 1, max_publishers: int = 10000) -> None:
+        """
+        Args:
+            policy: One of POLICY_ALL, POLICY_SAMPLE, POLICY_TRUSTED
+            sample_rate: N of the 1-in-N sampling policy
+            trust_threshold: Successful validations needed before a shape is trusted
+            max_publishers: Bound on the tracked (publisher, shape) entries
+        """
+        if policy not in (POLICY_ALL, POLICY_SAMPLE, POLICY_TRUSTED):
+            raise ValueError(f"Unknown validation policy: {policy}")
+        self.policy = policy
+        self.sample_rate = max(1, sample_rate)
+        self.trust_threshold = max(1, trust_threshold)
+        self.max_publishers = max_publishers
+        self._state: 'OrderedDict[Any, int]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, publisher_id: str, tree: Any,
+              validate: Callable[[Any], Tuple[bool, Optional[str]]],
+              fingerprint: Optional[int] = None) -> Tuple[bool, Optional[str], str]:
+        """
+        Validate a notification according to the policy.
+
+        Args:
+            publisher_id: Identity of the sending publisher
+            tree: Decoded notification tree
+            validate: Full validation function
+            fingerprint: Structural fingerprint of the tree, if already computed
+
+        Returns:
+            Tuple of (is_valid: bool, error_message: Optional[str], outcome: str)
+        """
+        if self.policy == POLICY_ALL:
+            return self._run(validate, tree)
+
+        if fingerprint is None:
+            fingerprint = structural_fingerprint(tree)
+        key = (publisher_id, fingerprint)
+
+        if self.policy == POLICY_SAMPLE:
+            with self._lock:
+                seen = self._touch(publisher_id)
+                self._state[publisher_id] = seen + 1
+                validated = self._touch(key)
+            # The cadence only applies to shapes already validated for the publisher
+            if validated and seen % self.sample_rate:
+                return True, None, OUTCOME_SKIPPED
+            is_valid, error_message, outcome = self._run(validate, tree)
+            with self._lock:
+                self._state[key] = 1 if is_valid else 0
+            return is_valid, error_message, outcome
+
+        with self._lock:
+            validated = self._touch(key)
+        if validated >= self.trust_threshold:
+            return True, None, OUTCOME_SKIPPED
+
+        is_valid, error_message, outcome = self._run(validate, tree)
+        with self._lock:
+            # A failure on a shape withdraws whatever trust it had gained
+            self._state[key] = (self._state.get(key, 0) + 1) if is_valid else 0
+        return is_valid, error_message, outcome
+
+    def _touch(self, key: Any) -> int:
+        """Return the counter of a key and mark it as recently used; caller holds the lock."""
+        count = self._state.get(key)
+        if count is None:
+            self._state[key] = 0
+            if len(self._state) > self.max_publishers:
+                self._state.popitem(last=False)
+            return 0
+        self._state.move_to_end(key)
+        return count
+
+    @staticmethod
+    def _run(validate: Callable[[Any], Tuple[bool, Optional[str]]],
+             tree: Any) -> Tuple[bool, Optional[str], str]:
+        """Run the full validation and classify its outcome."""
+        is_valid, error_message = validate(tree)
+        return is_valid, error_message, OUTCOME_VALIDATED if is_valid else OUTCOME_FAILED
@@ -0,0 +1,227 @@
+"""
+Streaming XML Notification Decoder
+
+Decodes an XML notification into the JSON-compatible tree used by the rest of
+the pipeline in a single pass over the parser events. While the tree is built,
+element names lose their namespace prefixes, YANG lists and leaf-lists always
+become arrays, and leaf texts are converted into their RFC 7951 JSON
+representation by the coercer of the leaf in the type coercion table.
+
+Only the top-level member keeps its module-qualified name, as required for
+validation; NotificationPipeline.normalize() removes it before forwarding.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Set
+from xml.parsers import expat
+
+from yangson import DataModel
+from yangson.schemanode import InternalNode, LeafListNode, ListNode, TerminalNode
+
+from type_coercion import Coercer, CoercionTable, SchemaPath
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+# Enclosing element of concatenated documents and their XML declarations
+SEQUENCE_START = b'<notifications>'
+SEQUENCE_END = b'</notifications>'
+XML_DECLARATION = re.compile(rb'<\?xml[^>]*\?>')
+
+
+# =============================================================================
+# ELEMENT SCHEMA
+# =============================================================================
+
+class ElementSchema:
+    """What the decoder needs to know about one YANG data node."""
+
+    __slots__ = ('key', 'children', 'is_array', 'coerce')
+
+    def __init__(self, key: str, is_array: bool = False,
+                 coerce: Optional[Coercer] = None) -> None:
+        """
+        Args:
+            key: Member name in the decoded tree
+            is_array: True for lists and leaf-lists
+            coerce: Text converter for leaves and leaf-lists, None for containers and lists
+        """
+        self.key = key
+        self.children: Dict[str, 'ElementSchema'] = {}
+        self.is_array = is_array
+        self.coerce = coerce
+
+
+def build_element_schema(data_model: DataModel, coercions: CoercionTable) -> ElementSchema:
+    """
+    Compile the schema tree of a data model into element schemas keyed by local name.
+
+    Args:
+        data_model: The yangson data model
+        coercions: Coercion table of the same data model
+
+    Returns:
+        Element schema of the document root
+    """
+    root = ElementSchema('')
+    for child in data_model.schema.data_children():
+        element = _element_schema(child, (child.name,), coercions)
+        # Top-level members are module-qualified in RFC 7951 JSON
+        element.key = f"{child.ns}:{child.name}"
+        root.children[child.name] = element
+    return root
+
+
+def _element_schema(node: Any, path: SchemaPath, coercions: CoercionTable) -> ElementSchema:
+    """Recursive helper of build_element_schema()."""
+    is_array = isinstance(node, (ListNode, LeafListNode))
+    if isinstance(node, TerminalNode):
+        return ElementSchema(node.name, is_array, coercions.coercers[path])
+
+    element = ElementSchema(node.name, is_array)
+    if isinstance(node, InternalNode):
+        for child in node.data_children():
+            element.children[child.name] = _element_schema(child, path + (child.name,), coercions)
+    return element
+
+
+# =============================================================================
+# DECODER
+# =============================================================================
+
+class SequenceTooLong(ValueError):
+    """A sequence holds more documents than accepted."""
+
+
+class _Frame:
+    """An open element while parsing."""
+
+    __slots__ = ('schema', 'name', 'members', 'repeated', 'items', 'max_items', 'text')
+
+    def __init__(self, schema: Optional[ElementSchema], name: str) -> None:
+        self.schema = schema
+        self.name = name
+        self.members: Optional[Dict[str, Any]] = None
+        self.repeated: Optional[Set[str]] = None
+        # Set on the document frame of a sequence: one tree per top-level element
+        self.items: Optional[List[Dict[str, Any]]] = None
+        self.max_items: Optional[int] = None
+        self.text: List[str] = []
+
+
+class XmlNotificationDecoder:
+    """Single-pass XML decoder driven by the element schema of a data model."""
+
+    def __init__(self, root: ElementSchema) -> None:
+        """
+        Args:
+            root: Element schema returned by build_element_schema()
+        """
+        self.root = root
+
+    def decode(self, data: bytes) -> Dict[str, Any]:
+        """
+        Decode an XML document into a JSON-compatible tree.
+
+        Elements that are not in the schema are decoded as text or objects,
+        and repeated ones become arrays, so that validation can report them.
+
+        Args:
+            data: Raw XML document
+
+        Returns:
+            The decoded tree
+
+        Raises:
+            expat.ExpatError: If the document is not well-formed XML
+        """
+        document = _Frame(self.root, '')
+        self._parse(document, data, sequence=False)
+        return document.members or {}
+
+    def decode_sequence(self, data: bytes, max_items: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Decode concatenated XML documents, each holding one notification.
+
+        Args:
+            data: Raw XML documents, optionally with their own XML declarations
+            max_items: Largest number of documents accepted; parsing stops at the next one
+
+        Returns:
+            One decoded tree per document, in order
+
+        Raises:
+            expat.ExpatError: If the documents are not well-formed XML
+            SequenceTooLong: If there are more than max_items documents
+        """
+        document = _Frame(self.root, '')
+        document.items = []
+        document.max_items = max_items
+        self._parse(document, XML_DECLARATION.sub(b'', data), sequence=True)
+        return document.items
+
+    def _parse(self, document: _Frame, data: bytes, sequence: bool) -> None:
+        """Run expat over the data, building the decoded tree(s) into the document frame."""
+        stack = [document]
+
+        def start_element(name: str, attrs: Dict[str, str]) -> None:
+            parent = stack[-1]
+            local = name.rpartition(':')[2]
+            schema = parent.schema.children.get(local) if parent.schema else None
+            stack.append(_Frame(schema, local))
+
+        def end_element(name: str) -> None:
+            frame = stack.pop()
+            schema = frame.schema
+            if frame.members is not None:
+                value: Any = frame.members
+            elif schema is not None and schema.coerce is not None:
+                value = schema.coerce(''.join(frame.text))
+            elif schema is not None:
+                value = {}
+            else:
+                value = ''.join(frame.text) or None
+
+            parent = stack[-1]
+            key = schema.key if schema is not None else frame.name
+            if parent.items is not None:
+                if parent.max_items is not None and len(parent.items) >= parent.max_items:
+                    raise SequenceTooLong(f"More than {parent.max_items} documents")
+                parent.items.append({key: value})
+                return
+            if parent.members is None:
+                parent.members = {}
+            if schema is not None and schema.is_array:
+                parent.members.setdefault(key, []).append(value)
+            elif key in parent.members:
+                # Repeated element of a non-list node: keep all occurrences
+                if parent.repeated is None:
+                    parent.repeated = set()
+                if key in parent.repeated:
+                    parent.members[key].append(value)
+                else:
+                    parent.members[key] = [parent.members[key], value]
+                    parent.repeated.add(key)
+            else:
+                parent.members[key] = value
+
+        def character_data(text: str) -> None:
+            stack[-1].text.append(text)
+
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        if sequence:
+            # A single enclosing element makes the concatenation well-formed;
+            # it is parsed before and after the handlers are installed
+            parser.Parse(SEQUENCE_START, False)
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        parser.CharacterDataHandler = character_data
+        parser.Parse(data, not sequence)
+        if sequence:
+            parser.StartElementHandler = None
+            parser.EndElementHandler = None
+            parser.CharacterDataHandler = None
+            parser.Parse(SEQUENCE_END, True)
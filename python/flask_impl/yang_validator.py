@@ -0,0 +1,490 @@
+"""
+Compiled YANG Validator
+
+Pre-compiles the schema tree of a yangson DataModel into plain Python node
+checkers, so that a notification can be validated without building yangson
+instance nodes. Checking a tree happens in two steps: the structure of the
+tree (member names, mandatory members, list lengths) is checked once per
+notification shape and yields a ValidationPlan, which then only checks the
+scalar values of every notification with that shape.
+
+The checkers are conservative: they only ever answer "valid" for data that
+yangson would accept, and answer "not valid" for anything they do not fully
+understand (unsupported types, XPath constraints, annotations). Callers are
+expected to fall back to yangson whenever the fast path rejects.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from yangson import DataModel
+from yangson.datatype import (
+    BooleanType, DataType, EnumerationType, Int64Type, IntegralType,
+    LeafrefType, StringType, Uint64Type,
+)
+from yangson.enumerations import Axis, ContentType
+from yangson.schemanode import (
+    ContainerNode, InternalNode, LeafListNode, LeafNode, ListNode,
+)
+from yangson.xpathast import LocationPath, Root, Step
+
+from shape_cache import split_structure
+
+
+# =============================================================================
+# TYPES
+# =============================================================================
+
+# Qualified YANG name: (name, module)
+QualName = Tuple[str, str]
+
+# Schema path from the root: sequence of qualified names
+SchemaPath = Tuple[QualName, ...]
+
+# Checker for a raw scalar value
+ScalarChecker = Callable[[Any], bool]
+
+# Converter of a raw scalar value into its cooked (comparable) value
+Cooker = Callable[[Any], Any]
+
+
+# =============================================================================
+# VALIDATION PLAN
+# =============================================================================
+
+class ValidationPlan:
+    """
+    Value checks for all notifications sharing one shape.
+
+    The plan holds one scalar checker per value returned by
+    shape_cache.split_structure(), in the same order, plus the list key
+    uniqueness and leafref checks that depend on values.
+    """
+
+    def __init__(self) -> None:
+        self.checkers: List[ScalarChecker] = []
+        self.unique: List[Tuple[List[Cooker], List[Tuple[int, ...]]]] = []
+        self.leafrefs: List[Tuple[int, SchemaPath, Cooker]] = []
+        self.targets: Dict[SchemaPath, List[int]] = {}
+
+    def check(self, values: List[Any]) -> bool:
+        """
+        Check the scalar values of a notification with the planned shape.
+
+        Args:
+            values: Scalar values as returned by shape_cache.split_structure()
+
+        Returns:
+            True if the notification is valid
+        """
+        for check, value in zip(self.checkers, values):
+            if not check(value):
+                return False
+
+        for cookers, groups in self.unique:
+            seen = set()
+            for group in groups:
+                key = tuple(cook(values[index]) for cook, index in zip(cookers, group))
+                if key in seen:
+                    return False
+                seen.add(key)
+
+        targets: Dict[SchemaPath, frozenset] = {}
+        for index, path, cook in self.leafrefs:
+            if path not in targets:
+                targets[path] = frozenset(cook(values[i]) for i in self.targets.get(path, ()))
+            if cook(values[index]) not in targets[path]:
+                return False
+        return True
+
+    # -------------------------------------------------------------------------
+    # Plan building (used by the node checkers)
+    # -------------------------------------------------------------------------
+
+    def add_scalar(self, checker: ScalarChecker, path: SchemaPath) -> int:
+        """Register the checker of the next scalar value and return its index."""
+        self.checkers.append(checker)
+        index = len(self.checkers) - 1
+        self.targets.setdefault(path, []).append(index)
+        return index
+
+    def finish(self) -> 'ValidationPlan':
+        """Drop the scalar positions that no leafref refers to."""
+        referenced = {path for _, path, _ in self.leafrefs}
+        self.targets = {path: indexes for path, indexes in self.targets.items()
+                        if path in referenced}
+        return self
+
+
+# =============================================================================
+# NODE CHECKERS
+# =============================================================================
+
+class _NodeChecker:
+    """Compiled schema node; plan() checks the structure of a raw value."""
+
+    def plan(self, value: Any, plan: ValidationPlan) -> bool:
+        """
+        Check the structure of a raw value and register its value checks.
+
+        Args:
+            value: Raw value at this schema node
+            plan: Plan under construction
+
+        Returns:
+            True if the structure is valid
+        """
+        return False
+
+
+class _Deferred(_NodeChecker):
+    """Schema constructs that are left to yangson."""
+
+
+class _Leaf(_NodeChecker):
+    """YANG leaf, or one entry of a leaf-list."""
+
+    def __init__(self, checker: ScalarChecker, path: SchemaPath,
+                 leafref: Optional[Tuple[SchemaPath, Cooker]] = None) -> None:
+        self.checker = checker
+        self.path = path
+        self.leafref = leafref
+
+    def plan(self, value: Any, plan: ValidationPlan) -> bool:
+        if isinstance(value, (dict, list)):
+            return False
+        index = plan.add_scalar(self.checker, self.path)
+        if self.leafref:
+            plan.leafrefs.append((index, *self.leafref))
+        return True
+
+
+class _Object(_NodeChecker):
+    """YANG container, list entry or the schema root."""
+
+    def __init__(self, members: Dict[str, Tuple[int, _NodeChecker]],
+                 mandatory: frozenset, keys: Tuple[int, ...] = ()) -> None:
+        self.members = members
+        self.mandatory = mandatory
+        self.keys = keys
+
+    def plan(self, value: Any, plan: ValidationPlan) -> bool:
+        return self.plan_entry(value, plan) is not None
+
+    def plan_entry(self, value: Any, plan: ValidationPlan) -> Optional[Tuple[int, ...]]:
+        """
+        Plan an object and return the value indexes of its key members.
+
+        Returns:
+            Tuple of key value indexes, or None if the structure is invalid
+        """
+        if not isinstance(value, dict):
+            return None
+        seen: Dict[int, int] = {}
+        for name, member in value.items():
+            entry = self.members.get(name)
+            if entry is None or entry[0] in seen:
+                return None
+            seen[entry[0]] = len(plan.checkers)
+            if not entry[1].plan(member, plan):
+                return None
+        if not self.mandatory <= seen.keys():
+            return None
+        return tuple(seen[key] for key in self.keys)
+
+
+class _List(_NodeChecker):
+    """YANG list: array of entries with unique keys."""
+
+    def __init__(self, entry: _Object, low: int, high: Optional[int],
+                 key_cookers: List[Cooker]) -> None:
+        self.entry = entry
+        self.low = low
+        self.high = high
+        self.key_cookers = key_cookers
+
+    def plan(self, value: Any, plan: ValidationPlan) -> bool:
+        if not isinstance(value, list) or not _cardinality_ok(value, self.low, self.high):
+            return False
+        groups = []
+        for item in value:
+            keys = self.entry.plan_entry(item, plan)
+            if keys is None:
+                return False
+            groups.append(keys)
+        if self.key_cookers:
+            plan.unique.append((self.key_cookers, groups))
+        return True
+
+
+class _LeafList(_NodeChecker):
+    """YANG leaf-list: array of scalars of the same type."""
+
+    def __init__(self, item: _Leaf, low: int, high: Optional[int],
+                 unique_cooker: Optional[Cooker]) -> None:
+        self.item = item
+        self.low = low
+        self.high = high
+        self.unique_cooker = unique_cooker
+
+    def plan(self, value: Any, plan: ValidationPlan) -> bool:
+        if not isinstance(value, list) or not _cardinality_ok(value, self.low, self.high):
+            return False
+        first = len(plan.checkers)
+        for item in value:
+            if not self.item.plan(item, plan):
+                return False
+        if self.unique_cooker:
+            plan.unique.append(([self.unique_cooker],
+                                [(index,) for index in range(first, len(plan.checkers))]))
+        return True
+
+
+def _cardinality_ok(value: list, low: int, high: Optional[int]) -> bool:
+    """Check min-elements/max-elements of a list or leaf-list."""
+    return len(value) >= low and (high is None or len(value) <= high)
+
+
+# =============================================================================
+# COMPILED VALIDATOR
+# =============================================================================
+
+class CompiledValidator:
+    """
+    Fast validator compiled once from a yangson DataModel.
+
+    check() returns True only for data that conforms to the schema; a False
+    answer means "not proven valid" and should be confirmed by yangson.
+    """
+
+    def __init__(self, data_model: DataModel) -> None:
+        """
+        Args:
+            data_model: The yangson data model to compile
+        """
+        self._root = self._compile_object(data_model.schema, ())
+
+    def compile_plan(self, raw: Any) -> Optional[ValidationPlan]:
+        """
+        Check the structure of a raw instance and compile its value checks.
+
+        The result only depends on the shape of `raw`, so it can be reused for
+        every instance with the same shape_cache.split_structure() shape.
+
+        Args:
+            raw: Decoded notification tree
+
+        Returns:
+            The validation plan, or None if the structure is not valid
+        """
+        plan = ValidationPlan()
+        if not self._root.plan(raw, plan):
+            return None
+        return plan.finish()
+
+    def check(self, raw: Any) -> bool:
+        """
+        Check a raw (RFC 7951 JSON) instance against the compiled schema.
+
+        Args:
+            raw: Decoded notification tree
+
+        Returns:
+            True if the instance is valid, False if it must be confirmed by yangson
+        """
+        plan = self.compile_plan(raw)
+        return plan is not None and plan.check(split_structure(raw)[1])
+
+    # -------------------------------------------------------------------------
+    # Schema compilation
+    # -------------------------------------------------------------------------
+
+    def _compile_node(self, node: Any, path: SchemaPath) -> _NodeChecker:
+        """Dispatch compilation on the kind of schema node."""
+        if getattr(node, 'must', None) or getattr(node, 'when', None):
+            return _Deferred()
+        if isinstance(node, ListNode):
+            return self._compile_list(node, path)
+        if isinstance(node, LeafListNode):
+            return self._compile_leaf_list(node, path)
+        if isinstance(node, LeafNode):
+            return self._compile_leaf(node, path)
+        if isinstance(node, ContainerNode):
+            return self._compile_object(node, path)
+        return _Deferred()
+
+    def _compile_object(self, node: InternalNode, path: SchemaPath,
+                        keys: Tuple[QualName, ...] = ()) -> _NodeChecker:
+        """Compile a container, list entry or the schema root."""
+        if node.when or any(not isinstance(c, (LeafNode, LeafListNode, ListNode, ContainerNode))
+                            for c in node.children):
+            return _Deferred()
+
+        members: Dict[str, Tuple[int, _NodeChecker]] = {}
+        mandatory = set()
+        key_positions = []
+        for position, child in enumerate(node.children):
+            checker = self._compile_node(child, path + (child.qual_name,))
+            members[f"{child.ns}:{child.name}"] = (position, checker)
+            # Unqualified member names refer to the parent's module
+            if node.ns is not None and child.ns == node.ns:
+                members[child.name] = (position, checker)
+            if child.mandatory:
+                mandatory.add(position)
+            if child.qual_name in keys:
+                key_positions.append(position)
+        return _Object(members, frozenset(mandatory), tuple(key_positions))
+
+    def _compile_list(self, node: ListNode, path: SchemaPath) -> _NodeChecker:
+        """Compile a YANG list."""
+        if node.unique:
+            return _Deferred()
+        for key in node.keys:
+            key_node = node.get_data_child(*key)
+            if not isinstance(key_node, LeafNode) or not key_node.mandatory:
+                return _Deferred()
+        # Key positions are collected in schema order; cookers must follow it
+        ordered_keys = tuple(c.qual_name for c in node.children if c.qual_name in node.keys)
+        key_cookers = [node.get_data_child(*key).type.from_raw for key in ordered_keys]
+
+        entry = self._compile_object(node, path, ordered_keys)
+        if not isinstance(entry, _Object):
+            return _Deferred()
+        return _List(entry, node.min_elements, node.max_elements, key_cookers)
+
+    def _compile_leaf_list(self, node: LeafListNode, path: SchemaPath) -> _NodeChecker:
+        """Compile a YANG leaf-list."""
+        item = self._compile_leaf(node, path)
+        if not isinstance(item, _Leaf):
+            return _Deferred()
+        # Repeated values are only an error in configuration data
+        unique_cooker = node.type.from_raw if node.content_type() == ContentType.config else None
+        return _LeafList(item, node.min_elements, node.max_elements, unique_cooker)
+
+    def _compile_leaf(self, node: Any, path: SchemaPath) -> _NodeChecker:
+        """Compile the type of a leaf or leaf-list entry."""
+        dtype = node.type
+        if not isinstance(dtype, LeafrefType):
+            check_type = compile_type(dtype)
+            return _Leaf(check_type, path) if check_type else _Deferred()
+
+        # Leafref whose path is a plain absolute location path
+        check_type = compile_type(dtype.ref_type)
+        target = _absolute_path(dtype.path)
+        if check_type is None or target is None:
+            return _Deferred()
+        if not dtype.require_instance:
+            return _Leaf(check_type, path)
+        return _Leaf(check_type, path, (target, dtype.ref_type.from_raw))
+
+
+# =============================================================================
+# SCALAR TYPE CHECKERS
+# =============================================================================
+
+def compile_type(dtype: DataType) -> Optional[ScalarChecker]:
+    """
+    Compile a yangson scalar type into a checker of raw JSON values.
+
+    The checker mirrors DataType.from_raw() followed by the type's
+    membership test (range, length, patterns, enum values).
+
+    Args:
+        dtype: yangson data type
+
+    Returns:
+        A checker, or None if the type is not supported by the fast path
+    """
+    if isinstance(dtype, BooleanType):
+        return lambda value: isinstance(value, bool)
+
+    if isinstance(dtype, EnumerationType):
+        names = frozenset(dtype.enum)
+        return lambda value: isinstance(value, str) and value in names
+
+    if isinstance(dtype, StringType):
+        return _compile_string(dtype)
+
+    if isinstance(dtype, (Int64Type, Uint64Type)):
+        in_range = _compile_range(dtype)
+
+        # RFC 7951 encodes 64-bit integers as JSON strings
+        def check_int64(value: Any) -> bool:
+            if not isinstance(value, str):
+                return False
+            try:
+                return in_range(int(value))
+            except ValueError:
+                return False
+
+        return check_int64
+
+    if isinstance(dtype, IntegralType):
+        in_range = _compile_range(dtype)
+        return lambda value: (isinstance(value, int) and not isinstance(value, bool)
+                              and in_range(value))
+
+    return None
+
+
+def _compile_string(dtype: StringType) -> ScalarChecker:
+    """Compile a string type with optional length and pattern restrictions."""
+    lengths = dtype.length.intervals if dtype.length else None
+    patterns = [(p.regex, p.invert_match) for p in dtype.patterns]
+
+    if lengths is None and not patterns:
+        return lambda value: isinstance(value, str)
+
+    def check_string(value: Any) -> bool:
+        if not isinstance(value, str):
+            return False
+        if lengths is not None and not _in_intervals(len(value), lengths):
+            return False
+        for regex, invert_match in patterns:
+            if (regex.match(value) is not None) == invert_match:
+                return False
+        return True
+
+    return check_string
+
+
+def _compile_range(dtype: IntegralType) -> Callable[[int], bool]:
+    """Compile the range restriction (or the built-in range) of an integer type."""
+    if dtype.range is None:
+        low, high = dtype._range
+        return lambda value: low <= value <= high
+    intervals = dtype.range.intervals
+    return lambda value: _in_intervals(value, intervals)
+
+
+def _in_intervals(value: Any, intervals: List[List[Any]]) -> bool:
+    """Same semantics as yangson.constraint.Intervals.__contains__."""
+    for interval in intervals:
+        if len(interval) == 1:
+            if interval[0] == value:
+                return True
+        elif interval[0] <= value <= interval[1]:
+            return True
+    return False
+
+
+# =============================================================================
+# HELPERS
+# =============================================================================
+
+def _absolute_path(expr: Any) -> Optional[Tuple[QualName, ...]]:
+    """
+    Flatten an absolute XPath location path made of plain child steps.
+
+    Returns:
+        Tuple of qualified names, or None for any other XPath expression
+    """
+    steps = []
+    while isinstance(expr, LocationPath):
+        step = expr.right
+        if not isinstance(step, Step) or step.axis != Axis.child or step.predicates:
+            return None
+        steps.append(step.qname)
+        expr = expr.left
+    if not isinstance(expr, Root):
+        return None
+    return tuple(reversed(steps))
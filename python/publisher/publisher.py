@@ -1,9 +1,11 @@
 import re
 import argparse
-import time
+import asyncio
+import random
 import socket
 import os
 import requests
+from requests.adapters import HTTPAdapter
 import datetime
 import json
 import dicttoxml
@@ -11,14 +13,34 @@ import cbor2
 from pyroute2 import IPRoute
 import sys
 import xmltodict
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from spool import Spool
+from retry_scheduler import CLOSED, HALF_OPEN, OPEN, RetryScheduler
+from template_encoder import TemplateEncoder
+import email.utils
+import gzip
+import zlib
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
-def fetch_data_new():
-    interfaces = os.listdir("/sys/class/net/")
+# Largest number of spooled notifications replayed in one request
+REPLAY_BATCH_MAX = 100
+# Encodings of full notifications spliced into a template; json.dumps is faster than splicing
+TEMPLATE_ENCODINGS = ("cbor", "xml")
+# Content codings in order of preference, and the smallest body worth compressing
+CONTENT_CODINGS = ["zstd", "gzip", "deflate"] if zstandard is not None else ["gzip", "deflate"]
+COMPRESSION_MIN_BYTES = 256
+
+def fetch_data_new(ipr):
+    # One netlink dump per collection cycle, on the IPRoute socket reused across cycles
     interfaces_info = []
-    
-    for iface in interfaces:
+    for link in ipr.link("dump"):
+        iface = link.get_attr("IFLA_IFNAME")
         try:
-            interfaces_info.append(get_interface_info(iface))
+            interfaces_info.append(get_interface_info(link))
         except:
             raise AssertionError(f"Error while reading interface information for interface : {iface}")
     return interfaces_info
@@ -27,62 +49,65 @@ def read_file(path):
     try :
         with open(path, 'r') as f:
             return f.read().strip()
-    except:
+    except OSError:
         return ""               #Exceptions raised due to files being in an unreadable state is because the interface itself is
-    finally:                    #not up or not configured. Hence an empty string is returned. This is not an error condition.
-        f.close()                             
-
-def get_interface_info(iface):
-    iface_path = f"/sys/class/net/{iface}/"
-    stats_path = f"{iface_path}statistics/"
-
-    #####
-    ipr = IPRoute()
-    links = ipr.link("dump")
-    if_data_name = links[0].get_attr("IFLA_IFNAME")
-    if_data_operstate = None
-    for link in links:
-        if link.get_attr("IFLA_IFNAME") == iface:
-            if_data_operstate = str(link.get_attr("IFLA_OPERSTATE")).lower()
-            # print(f"inside loop {if_data_operstate}")
-            if_data_operstate = "testing" if (if_data_operstate == "unknown") else if_data_operstate
-            break
+                                #not up or not configured. Hence an empty string is returned. This is not an error condition.
+
+IFF_UP = 0x1
+
+# Time an interface was first seen, per interface index: its counters have been continuous since then.
+# A timestamp taken every cycle would make every notification differ in one leaf per interface.
+discontinuity_times = {}
+
+def get_link_statistics(link, iface):
+    # 64-bit counters of the netlink dump; sysfs only for kernels that do not send IFLA_STATS64
+    stats = link.get_attr("IFLA_STATS64")
+    if stats is not None:
+        return {name: stats[name] for name in ("rx_bytes", "rx_packets", "multicast", "rx_dropped", "rx_errors",
+                                               "tx_bytes", "tx_packets", "tx_dropped", "tx_errors")}
+    stats_path = f"/sys/class/net/{iface}/statistics/"
+    return {name: read_file(stats_path + name) for name in ("rx_bytes", "rx_packets", "multicast", "rx_dropped", "rx_errors",
+                                                            "tx_bytes", "tx_packets", "tx_dropped", "tx_errors")}
+
+def get_interface_info(link):
+    iface = link.get_attr("IFLA_IFNAME")
+
+    if_data_operstate = str(link.get_attr("IFLA_OPERSTATE")).lower()
+    oper_status = if_data_operstate
+    if_data_operstate = "testing" if (if_data_operstate == "unknown") else if_data_operstate
 
-    #####
     speed_val = "0"
-    speed_file_value = read_file(iface_path + "speed")
-    if(speed_file_value.strip() == "" or int(speed_file_value) < 0):
-        speed_val = "0"
+    statistics = get_link_statistics(link, iface)
 
     try :
         interface = {
             "name": iface,
             # "description": "",                                                      #? Unsure where to find this information
-            "type": read_file(iface_path + "type"),
-            "enabled": read_file(iface_path + "carrier") == "1",                    
+            "type": str(link["ifi_type"]),
+            "enabled": bool(link["flags"] & IFF_UP) and link.get_attr("IFLA_CARRIER") == 1,   # sysfs carrier is only readable while up
             "admin-status" : if_data_operstate,
-            "oper-status" : read_file(iface_path + "operstate"),                                
+            "oper-status" : oper_status,
             # "last-change": "",                                                      #Not directly available on *nix systems. This leaf is optional
-            "if-index": int(read_file(iface_path + "ifindex")),
-            "phys-address": read_file(iface_path + "address"),
+            "if-index": link["index"],
+            "phys-address": link.get_attr("IFLA_ADDRESS") or "",
             "higher-layer-if": [],                                                  # check ifStackTable, not directly available. This leaf is optional
             "lower-layer-if": [],                                                   # check ifStackTable, not directly available. This leaf is optional
             "speed" : speed_val, 
             "statistics": {
-                "discontinuity-time":   datetime.datetime.now().isoformat() + 'Z',                                         # TODO
-                "in-octets": read_file(stats_path + "rx_bytes"),                    #Indicates the number of bytes received by this network device
-                "in-unicast-pkts": read_file(stats_path + "rx_packets"),            #Indicates the total number of good packets received
+                "discontinuity-time":   discontinuity_times.setdefault(link["index"], datetime.datetime.now().isoformat() + 'Z'),
+                "in-octets": str(statistics["rx_bytes"]),                           #Indicates the number of bytes received by this network device
+                "in-unicast-pkts": str(statistics["rx_packets"]),                   #Indicates the total number of good packets received
                 # "in-broadcast-pkts": None,                                        #Not directly available on *nix systems. This leaf is optional
-                "in-multicast-pkts": read_file(stats_path + "multicast"),           
-                "in-discards": int(read_file(stats_path + "rx_dropped")),
-                "in-errors": int(read_file(stats_path + "rx_errors")),
+                "in-multicast-pkts": str(statistics["multicast"]),
+                "in-discards": int(statistics["rx_dropped"]),
+                "in-errors": int(statistics["rx_errors"]),
                 # "in-unknown-protos": None,                                        #not directly available, what is this??
-                "out-octets": read_file(stats_path + "tx_bytes"),
-                "out-unicast-pkts": read_file(stats_path + "tx_packets"),
+                "out-octets": str(statistics["tx_bytes"]),
+                "out-unicast-pkts": str(statistics["tx_packets"]),
                 # "out-broadcast-pkts": read_file(stats_path + "tx_broadcast"),     #Not directly available on *nix systems. This leaf is optional
                 # "out-multicast-pkts": read_file(stats_path + "tx_multicast"),     #Not directly available on *nix systems. This leaf is optional
-                "out-discards": int(read_file(stats_path + "tx_dropped")),
-                "out-errors": int(read_file(stats_path + "tx_errors")),
+                "out-discards": int(statistics["tx_dropped"]),
+                "out-errors": int(statistics["tx_errors"]),
             }
         }
     except:
@@ -130,17 +155,59 @@ def cbor_capabilities_check(capabilities, args):
     except:
         raise AssertionError("Failed to parse capabilities recieved from collector in CBOR format.")
 
-def get_capabilities(url):
+def create_session(pool_size=1):
+    # Keep-alive connections are reused across notifications, so a TLS handshake is only paid when the
+    # collector closed the connection. urllib3 checks that a pooled connection is still open before reusing it.
+    session = requests.Session()
+    session.verify = False
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def connection_stats(session):
+    # (connections opened, requests sent) over all connection pools of the session
+    connections = 0
+    requests_sent = 0
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            connections += pool.num_connections
+            requests_sent += pool.num_requests
+    return connections, requests_sent
+
+def format_connection_stats(session):
+    connections, requests_sent = connection_stats(session)
+    reuse_ratio = 1 - connections / requests_sent if requests_sent else 0.0
+    return f"Connections opened (TLS handshakes): {connections}, requests: {requests_sent}, connection reuse ratio: {reuse_ratio:.1%}"
+
+def get_capabilities(url, session=None, timeout=None):
     try:
-        response = requests.get(url, verify=False, headers={'Accept': 'application/json, application/xml, application/cbor'})
+        response = (session or requests).get(url, verify=False, headers={'Accept': 'application/json, application/xml, application/cbor'}, timeout=timeout)
         response.raise_for_status()
         return response
     except requests.exceptions.RequestException as e:
         raise AssertionError(f"Failed to discover capabilities: {e}")
 
-def send_notification(url, payload, headers):
+def compress_body(body, content_coding):
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if content_coding == "gzip":
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    elif content_coding == "deflate":
+        return zlib.compress(body, 6)
+    elif content_coding == "zstd":
+        return zstandard.ZstdCompressor().compress(body)
+    raise AssertionError(f"Unsupported content coding: {content_coding}")
+
+def send_notification(url, payload, headers, session=None, timeout=None, content_coding=None):
+    # Bodies too small to gain from compression are sent as they are
+    if content_coding and len(payload) >= COMPRESSION_MIN_BYTES:
+        payload = compress_body(payload, content_coding)
+        headers = dict(headers, **{'Content-Encoding': content_coding})
     try:
-        response = requests.post(url, data=payload, headers=headers, verify=False)
+        response = (session or requests).post(url, data=payload, headers=headers, verify=False, timeout=timeout)
         # response.raise_for_status()
         return response
     except requests.exceptions.RequestException as e:
@@ -150,25 +217,136 @@ def publisher_print(message, verbose=False):
     if verbose:
         print(message)
 
-def parse_supported_encodings(capabilities_response):
+URN_BATCH = "urn:ietf:capability:https-notif-receiver:batch"
+URN_DELTA = "urn:ietf:capability:https-notif-receiver:delta"
+URN_ENCODING = "urn:ietf:capability:https-notif-receiver:encoding:"
+URN_CONTENT_ENCODING = "urn:ietf:capability:https-notif-receiver:content-encoding:"
+
+def parse_capabilities(capabilities_response):
     content_type = capabilities_response.headers.get('Content-Type', '')
-    encodings = []
+    caps = []
 
     if 'application/json' in content_type:
         data = capabilities_response.json()
         caps = data.get("receiver-capabilities", {}).get("receiver-capability", [])
-        encodings = [cap.split(":")[-1] for cap in caps if "encoding" in cap]
     elif 'application/xml' in content_type:
         data = xmltodict.parse(capabilities_response.text)
         caps = data.get("receiver-capabilities", {}).get("receiver-capability", [])
         if isinstance(caps, str):
             caps = [caps]
-        encodings = [cap.split(":")[-1] for cap in caps if "encoding" in cap]
     elif 'application/cbor' in content_type:
         data = cbor2.loads(capabilities_response.content)
         caps = data.get("receiver-capabilities", {}).get("receiver-capability", [])
-        encodings = [cap.split(":")[-1] for cap in caps if "encoding" in cap]
-    return encodings
+    return caps
+
+def parse_supported_encodings(capabilities_response):
+    caps = parse_capabilities(capabilities_response)
+    return [cap[len(URN_ENCODING):] for cap in caps if cap.startswith(URN_ENCODING)]
+
+def parse_content_codings(capabilities_response):
+    caps = parse_capabilities(capabilities_response)
+    return [cap[len(URN_CONTENT_ENCODING):] for cap in caps if cap.startswith(URN_CONTENT_ENCODING)]
+
+def supports_batch(capabilities_response):
+    return URN_BATCH in parse_capabilities(capabilities_response)
+
+def supports_delta(capabilities_response):
+    return URN_DELTA in parse_capabilities(capabilities_response)
+
+def build_payload(event_time, interface_data=None):
+    notification = {"eventTime": event_time}
+    if interface_data is not None:
+        notification["interface_data"] = {"interface": interface_data}
+    return {"ietf-https-notif:notification": notification}
+
+def diff_leaves(previous, current):
+    # Members of current that differ from previous: containers are compared recursively,
+    # leaves and leaf-lists are sent whole
+    changes = {}
+    for key, value in current.items():
+        old = previous.get(key)
+        if isinstance(value, dict) and isinstance(old, dict):
+            nested = diff_leaves(old, value)
+            if nested:
+                changes[key] = nested
+        elif key not in previous or value != old:
+            changes[key] = value
+    return changes
+
+def interface_delta(previous, current):
+    # Changed leaves of every interface, identified by its "name" key. None when interfaces or leaves
+    # appeared or disappeared: a delta cannot remove anything, so the receiver needs a keyframe
+    previous_by_name = {interface["name"]: interface for interface in previous}
+    if len(previous_by_name) != len(current):
+        return None
+    changed = []
+    for interface in current:
+        old = previous_by_name.get(interface["name"])
+        if old is None or old.keys() != interface.keys():
+            return None
+        changes = diff_leaves(old, interface)
+        if changes:
+            changed.append({"name": interface["name"], **changes})
+    return changed
+
+def encode_payload(payload, encoding):
+    if encoding == "json":
+        return json.dumps(payload), {'Content-Type': 'application/json'}
+    elif encoding == "xml":
+        return xmltodict.unparse(payload, full_document=False), {'Content-Type': 'application/xml'}
+    elif encoding == "cbor":
+        return cbor2.dumps(payload), {'Content-Type': 'application/cbor'}
+    raise AssertionError("Receiver does not support any valid encoding type!")
+
+def encode_batch(payloads, encoding):
+    # JSON array, concatenated XML documents or CBOR sequence (RFC 8742)
+    if encoding == "json":
+        return json.dumps(payloads), {'Content-Type': 'application/json'}
+    elif encoding == "xml":
+        return "".join(xmltodict.unparse(payload, full_document=False) for payload in payloads), {'Content-Type': 'application/xml'}
+    elif encoding == "cbor":
+        return b"".join(cbor2.dumps(payload) for payload in payloads), {'Content-Type': 'application/cbor-seq'}
+    raise AssertionError("Receiver does not support any valid encoding type!")
+
+def join_encoded(bodies, content_type):
+    # Batch body of notifications that were encoded one by one, without decoding them again
+    bodies = [body.encode("utf-8") if isinstance(body, str) else body for body in bodies]
+    if content_type == "application/json":
+        return b"[" + b",".join(bodies) + b"]", {'Content-Type': 'application/json'}
+    elif content_type == "application/xml":
+        return b"".join(bodies), {'Content-Type': 'application/xml'}
+    elif content_type == "application/cbor":
+        return b"".join(bodies), {'Content-Type': 'application/cbor-seq'}
+    return None
+
+def parse_retry_after(response):
+    # Seconds of a Retry-After header, given as delay-seconds or as an HTTP-date
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+def is_transient_status(status_code):
+    # The collector could not take the notification now, but will later: worth spooling and replaying
+    return status_code == 429 or status_code >= 500
+
+def count_batch_failures(batch_response):
+    # Per-notification statuses of /relay-notifications, in the order they were sent
+    if batch_response.status_code != 200:
+        return None
+    try:
+        results = batch_response.json().get("results", [])
+    except ValueError:
+        return None
+    return sum(1 for result in results if result.get("status") != 204)
 
 def choose_encoding(encodings):
     for preferred in ["cbor", "json", "xml"]:
@@ -176,109 +354,440 @@ def choose_encoding(encodings):
             return preferred
     return None
 
-def main():
-    try:
-        parser = argparse.ArgumentParser(
-                prog="publisher.py",
-                description="Sets up a HTTPS publisher, in accordance with RFC____",
-                epilog="-------------------------------")                             ## To be done : Add appropriate epilog
-        parser.add_argument("ip",type=str,help="IP Address to send YANG notification. Can be IPV4 or IPV6. IPv4 addresses follow dotted decimal format, as implemented in inet_pton(). IPv6 addresses also follow inet_pton() implementation standards. See RFC 2373 for further details on the representation of Ipv6 addresses")
-        mutually_exlusive_group = parser.add_mutually_exclusive_group()
-        mutually_exlusive_group.add_argument("-t","--time",type=float,help="Time interval between requests (in seconds)")
-        mutually_exlusive_group.add_argument("-r","--random",type=int,help="Sends notifications randomly, with the time interval being a random number between (0,argument)")
-        parser.add_argument("-p","--port",type=int,help="Port number to send YANG notification.")
-        parser.add_argument("-v","--verbose",action="store_true",help="Verbose mode for extra information.")
-        parser.add_argument("--num-retries", type=int, help="Number of retries in case of failure while sending a notification. The publisher will retry to obtain capabilities and continue sending notifications")
+def choose_content_coding(requested, content_codings):
+    # "auto" takes the preferred coding both sides support
+    candidates = CONTENT_CODINGS if requested == "auto" else [requested]
+    for content_coding in candidates:
+        if content_coding in content_codings:
+            return content_coding
+    return None
 
-        args = parser.parse_args()
+def parse_target(target):
+    # "host", "host:port", "[ipv6]:port" or a bare IPv6 literal; the port defaults to --port
+    if target.startswith("["):
+        host, _, port = target[1:].partition("]")
+        return host, int(port[1:]) if port.startswith(":") else None
+    if target.count(":") == 1:
+        host, port = target.split(":")
+        return host, int(port)
+    return target, None
 
-        time_interval = args.time if args.time else 2
-        
-        is_literal_ip = valid_ipv4_ipv6(args.ip)
-        if not is_literal_ip:
-            if any(c.isalpha() for c in args.ip):
-                publisher_print(f"Assuming '{args.ip}' is a hostname (e.g., Docker service name), skipping IP format validation.", args.verbose)
+def format_host(host):
+    return f"[{host}]" if ":" in host else host
+
+class Receiver:
+    # Delivery state of one collector: its session, negotiated encoding, pending batch and delta state.
+    # All methods except run() block on the network and are called from a worker thread.
+
+    def __init__(self, host, port, args):
+        self.name = f"{format_host(host)}:{port}" if port else format_host(host)
+        base_url = f"https://{self.name}"
+        self.capabilities_url = f"{base_url}/capabilities"
+        self.notification_url = f"{base_url}/relay-notification"
+        self.batch_url = f"{base_url}/relay-notifications"
+        self.verbose = args.verbose
+        self.session = create_session(max(1, args.pool_size))
+        if args.client_cert:
+            # Identifies the publisher to the collector, e.g. as key of its delta state
+            self.session.cert = (args.client_cert, args.client_key) if args.client_key else args.client_cert
+        self.retries = args.num_retries if args.num_retries else 3
+        self.requested_batch_size = args.batch_size if args.batch_size and args.batch_size > 1 else 1
+        self.requested_delta = args.delta
+        self.requested_compression = args.compression
+        self.content_coding = None
+        self.keyframe_interval = max(1, args.keyframe_interval)
+        self.encoding = None
+        self.batch_size = 1
+        self.pending_payloads = []
+        self.delta_mode = False
+        self.previous_interfaces = None     # last interface data the receiver accepted; None forces a keyframe
+        self.sent_since_keyframe = 0
+        self.sequence = 0
+        # Key of our delta state on the receiver, which may see several publishers behind one address
+        self.publisher_id = args.publisher_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.dropped = 0
+        self.batch_capable = False
+        self.templates = TemplateEncoder(encode_payload)
+        self.timeout = args.timeout
+        self.breaker = RetryScheduler(args.backoff_base, args.backoff_max, args.failure_threshold)
+        self.replay_rate = max(0.001, args.replay_rate)
+        self.spool = None
+        if args.spool_dir:
+            self.spool = Spool(os.path.join(args.spool_dir, re.sub(r"[^A-Za-z0-9.-]", "_", self.name)),
+                               args.spool_max_bytes, args.spool_max_age)
+
+    def log(self, message, verbose_only=False):
+        if self.verbose or not verbose_only:
+            # One write per line: receivers log from several threads
+            print(f"[{self.name}] {message}\n", end="")
+
+    def discover(self):
+        # Send GET request to /capabilities resource
+        capabilities_response = get_capabilities(self.capabilities_url, self.session, self.timeout)
+        self.log(capabilities_response.status_code)
+        self.log(f"Capabilities discovered through content-type header: {capabilities_response.headers.get('Content-Type')}")
+        self.log("Body of capabilities response:", True)
+        self.log(capabilities_response.text, True)
+
+        encodings = parse_supported_encodings(capabilities_response)
+        self.encoding = choose_encoding(encodings)
+        if not self.encoding:
+            raise AssertionError(f"Receiver {self.name} does not support any valid encoding type!")
+        self.log(f"Receiver supports: {encodings}, using: {self.encoding}")
+
+        if self.requested_compression != "none":
+            self.content_coding = choose_content_coding(self.requested_compression, parse_content_codings(capabilities_response))
+            if self.content_coding:
+                self.log(f"Compressing notifications with {self.content_coding}")
             else:
-                print(f"Invalid IP Address format for '{args.ip}'")
-                raise AssertionError("Invalid IPV4/IPV6 address format (expected literal IP or hostname).")
+                self.log("Receiver does not support the requested compression, sending uncompressed notifications")
+
+        self.batch_capable = supports_batch(capabilities_response)
+        self.batch_size = self.requested_batch_size
+        if self.batch_size > 1 and not self.batch_capable:
+            self.log("Receiver does not support batches, sending notifications one by one")
+            self.batch_size = 1
+
+        self.delta_mode = self.requested_delta and self.batch_size == 1
+        if self.requested_delta and not self.delta_mode:
+            self.log("Delta mode is not combined with batches, sending full notifications")
+        elif self.delta_mode and not supports_delta(capabilities_response):
+            self.log("Receiver does not support deltas, sending full notifications")
+            self.delta_mode = False
 
-        if(args.port):
-            capabilities_url = f"https://{args.ip}:{args.port}/capabilities"
-            notification_url = f"https://{args.ip}:{args.port}/relay-notification"
+    def deliver(self, event_time, interfaces):
+        payload = build_payload(event_time, interfaces)
+        if self.batch_size > 1:
+            self.pending_payloads.append(payload)
+            if len(self.pending_payloads) < self.batch_size:
+                return
+            payloads, self.pending_payloads = self.pending_payloads, []
         else:
-            capabilities_url = f"https://{args.ip}/capabilities"
-            notification_url = f"https://{args.ip}/relay-notification"
+            payloads = [payload]
+        if not self.ready():
+            self.hold(payloads)
+            return
 
-        
-        if(args.port):
-            capabilities_url = f"https://{args.ip}:{args.port}/capabilities"
-            notification_url = f"https://{args.ip}:{args.port}/relay-notification"
+        for attempt in (1, 2):
+            try:
+                if self.batch_size > 1:
+                    response = self.deliver_batch(payloads)
+                else:
+                    response = self.deliver_notification(event_time, interfaces)
+            except AssertionError as e:
+                self.log(e)
+                response = None
+            # The collector no longer takes our encoding, e.g. it was restarted with another configuration
+            if attempt == 1 and response is not None and response.status_code == 415:
+                self.log("Encoding rejected, re-negotiating capabilities")
+                if self.rediscover():
+                    continue
+            break
+
+        if response is not None and self.delivered(response):
+            self.breaker.record_success()
+            return
+        self.previous_interfaces = None
+        if response is None or is_transient_status(response.status_code):
+            self.record_unavailable(response)
+            self.hold(payloads)
+            return
+        # The collector is up but rejected the notification(s)
+        self.breaker.record_success()
+        self.log("Retrying...")
+        self.retries -= 1
+
+    def delivered(self, response):
+        if self.batch_size > 1:
+            return count_batch_failures(response) == 0
+        return response.status_code == 204
+
+    def ready(self):
+        # Whether a request may be sent now. The probe after an outage re-negotiates the capabilities first:
+        # the collector may have come back with other encodings
+        if not self.breaker.allow():
+            return False
+        if self.breaker.state == HALF_OPEN or self.encoding is None:
+            return self.rediscover()
+        return True
+
+    def rediscover(self):
+        try:
+            self.discover()
+        except AssertionError as e:
+            self.log(e)
+            self.record_unavailable(None)
+            return False
+        # A restarted collector does not know our delta state
+        self.previous_interfaces = None
+        return True
+
+    def record_unavailable(self, response):
+        delay = self.breaker.record_failure(parse_retry_after(response))
+        if self.breaker.state == OPEN:
+            self.log(f"Collector unavailable ({self.breaker.failures} consecutive failure(s)), next attempt in {delay:.1f}s")
+
+    def encode(self, payload):
+        # Full notifications keep their structure from one interval to the next; deltas do not
+        if self.encoding in TEMPLATE_ENCODINGS:
+            return self.templates.encode(payload, self.encoding)
+        return encode_payload(payload, self.encoding)
+
+    def hold(self, payloads):
+        # Notifications the collector cannot take now: kept in full for replay, or dropped without a spool
+        if self.spool is not None and self.encoding is not None:
+            for payload in payloads:
+                body, headers = self.encode(payload)
+                self.spool.append(headers['Content-Type'], body)
+            self.log(f"Spooled {len(payloads)} notification(s) for replay", self.breaker.state == OPEN)
         else:
-            capabilities_url = f"https://{args.ip}/capabilities"
-            notification_url = f"https://{args.ip}/relay-notification"
+            self.log(f"Dropped {len(payloads)} notification(s) while the collector is unavailable", self.breaker.state == OPEN)
 
-        # Send GET request to /capabilities resource
-        capabilities_response = get_capabilities(capabilities_url)
-        print(capabilities_response.status_code)
-        print("_"*20)
-        print(f"Capabilities discovered through content-type header: {capabilities_response.headers.get('Content-Type')}")
-        publisher_print("Body of capabilities response:",args.verbose)
-        publisher_print(capabilities_response.text,args.verbose)
-        print("_"*20)
+    def deliver_batch(self, payloads):
+        if self.encoding in TEMPLATE_ENCODINGS:
+            encoded = [self.encode(payload) for payload in payloads]
+            body, headers = join_encoded([body for body, _ in encoded], encoded[0][1]['Content-Type'])
+        else:
+            body, headers = encode_batch(payloads, self.encoding)
+        batch_response = send_notification(self.batch_url, body, headers, self.session, self.timeout, self.content_coding)
+        self.log(f"Batch of {len(payloads)} notifications sent, its status code is {batch_response.status_code}")
+        self.log(format_connection_stats(self.session), True)
 
-        encodings = parse_supported_encodings(capabilities_response)
-        encoding = choose_encoding(encodings)
-        if not encoding:
-            raise AssertionError("Receiver does not support any valid encoding type!")
-
-        print(f"Receiver supports: {encodings}, using: {encoding}")
-
-        retries = args.num_retries if args.num_retries else 3
-
-        while(True and retries >= 0):
-            time.sleep(time_interval)
-            interface_data_yang8343 = fetch_data_new()
-            payload = {
-                "ietf-https-notif:notification": {
-                    "eventTime": datetime.datetime.now().isoformat() + 'Z',
-                    "interface_data" : {
-                        "interface" : interface_data_yang8343
-                    }
-                }
-            }
-            headers = None
-            if encoding == "json":
-                payload = json.dumps(payload)
-                headers = {'Content-Type': 'application/json'}
-            elif encoding == "xml":
-                payload = xmltodict.unparse(payload, full_document=False)
-                headers = {'Content-Type': 'application/xml'}
-            elif encoding == "cbor":
-                payload = cbor2.dumps(payload)
-                headers = {'Content-Type': 'application/cbor'}
+        failures = count_batch_failures(batch_response)
+        if failures == 0:
+            self.log("Batch sent successfully!")
+        else:
+            self.log(f"{failures if failures is not None else 'All'} notification(s) of the batch failed.")
+        return batch_response
+
+    def deliver_notification(self, event_time, interfaces):
+        payload = build_payload(event_time, interfaces)
+        delta_kind = None
+        if self.delta_mode:
+            self.sequence += 1
+            changed = None
+            if self.previous_interfaces is not None and self.sent_since_keyframe < self.keyframe_interval:
+                changed = interface_delta(self.previous_interfaces, interfaces)
+            if changed is None:
+                delta_kind = "keyframe"
+                self.sent_since_keyframe = 0
             else:
-                raise AssertionError("Receiver does not support any valid encoding type!")
+                delta_kind = "delta"
+                # Interfaces without any change are left out, and interface_data with them when none changed
+                payload = build_payload(event_time, changed or None)
 
-            notification_response = send_notification(notification_url, payload, headers)
-            print("_"*20)
-            print("Notification sent, its status code is")
-            print(notification_response.status_code)
+        if delta_kind == "delta":
+            payload, headers = encode_payload(payload, self.encoding)
+        else:
+            payload, headers = self.encode(payload)
+        if delta_kind:
+            headers.update({'Notif-Delta': delta_kind, 'Notif-Sequence': str(self.sequence),
+                            'Notif-Publisher-Id': self.publisher_id})
+        notification_response = send_notification(self.notification_url, payload, headers, self.session, self.timeout, self.content_coding)
+        self.log(f"Notification sent, its status code is {notification_response.status_code}")
+        if delta_kind:
+            self.log(f"{delta_kind.capitalize()} #{self.sequence}: {len(payload)} bytes", True)
+        self.log(format_connection_stats(self.session), True)
 
-            if notification_response.status_code == 204:
-                print("Notification sent successfully!")
+        if notification_response.status_code == 204:
+            self.log("Notification sent successfully!")
+            if self.delta_mode:
+                self.previous_interfaces = interfaces
+                self.sent_since_keyframe += 1
+        elif notification_response.status_code == 409 and delta_kind == "delta":
+            # The receiver lost our previous state (restart, eviction, other worker): resend as keyframe
+            self.log("Receiver asked for a keyframe")
+            self.previous_interfaces = None
+            return self.deliver_notification(event_time, interfaces)
+        else:
+            self.log("Notification failed to send.")
+        return notification_response
+
+    def replay(self):
+        # Send the oldest spooled notifications, in one batch if the collector takes batches.
+        # Returns the number of notifications sent
+        limit = max(1, min(REPLAY_BATCH_MAX, int(self.replay_rate))) if self.batch_capable else 1
+        records, position = self.spool.read(limit)
+        if not records:
+            self.spool.commit(position)         # only expired records
+            return 0
+        batch = None
+        if self.batch_capable:
+            # One request carries notifications of a single encoding
+            records = list(itertools.takewhile(lambda record: record.content_type == records[0].content_type, records))
+            batch = join_encoded([record.body for record in records], records[0].content_type)
+        try:
+            if batch is not None:
+                body, headers = batch
+                response = send_notification(self.batch_url, body, headers, self.session, self.timeout, self.content_coding)
+                failures = count_batch_failures(response)
+                if failures is None and is_transient_status(response.status_code):
+                    self.record_unavailable(response)
+                    return 0
+                if failures:
+                    self.log(f"{failures} replayed notification(s) rejected by the collector, dropped")
+                elif failures is None:
+                    self.log(f"Replayed batch rejected with status {response.status_code}, dropped")
+                self.spool.commit(records[-1].end)
+                self.log(f"Replayed {len(records)} spooled notification(s)", True)
+                return len(records)
+            for sent, record in enumerate(records):
+                response = send_notification(self.notification_url, record.body,
+                                             {'Content-Type': record.content_type}, self.session, self.timeout,
+                                             self.content_coding)
+                if is_transient_status(response.status_code):
+                    self.record_unavailable(response)
+                    return sent
+                if response.status_code != 204:
+                    self.log(f"Replayed notification rejected with status {response.status_code}, dropped")
+                self.spool.commit(record.end)
+            self.spool.commit(position)
+            self.log(f"Replayed {len(records)} spooled notification(s)", True)
+            return len(records)
+        except AssertionError as e:
+            self.log(e)
+            self.record_unavailable(None)
+            return 0
+
+    def replay_wanted(self):
+        return self.spool is not None and self.breaker.state == CLOSED and self.spool.pending()
+
+    async def run(self, queue, executor):
+        # One request at a time per receiver, in a thread of the delivery executor; a slow receiver only
+        # delays its own queue. Spooled notifications are replayed while no new one waits, at most
+        # replay_rate per second
+        loop = asyncio.get_running_loop()
+        replay_due = 0.0
+        while self.retries >= 0:
+            if queue.empty() and self.replay_wanted():
+                delay = replay_due - loop.time()
+                if delay <= 0:
+                    sent = await loop.run_in_executor(executor, self.replay)
+                    replay_due = loop.time() + max(sent, 1) / self.replay_rate
+                    continue
+                try:
+                    event_time, interfaces = await asyncio.wait_for(queue.get(), delay)
+                except asyncio.TimeoutError:
+                    continue
             else:
-                print("Notification failed to send. Retrying...")
-                retries -= 1
+                event_time, interfaces = await queue.get()
+            await loop.run_in_executor(executor, self.deliver, event_time, interfaces)
+        self.log("Retries exhausted, no longer sending to this receiver")
+
+    def enqueue(self, queue, snapshot):
+        # The queue holds the most recent snapshots: when the receiver falls behind, the oldest one is dropped
+        if queue.full():
+            queue.get_nowait()
+            self.dropped += 1
+            self.log(f"Receiver is falling behind, dropped the oldest notification ({self.dropped} so far)")
+        queue.put_nowait(snapshot)
+
+def next_interval(args):
+    if args.random:
+        return random.uniform(0, args.random)
+    return args.time if args.time else 2
+
+async def collect(ipr, args, receivers, queues, tasks, executor):
+    # Collection follows its own schedule: a tick late because of a slow netlink dump is not caught up
+    loop = asyncio.get_running_loop()
+    next_tick = loop.time() + next_interval(args)
+    while any(not task.done() for task in tasks):
+        await asyncio.sleep(max(0, next_tick - loop.time()))
+        next_tick = max(next_tick + next_interval(args), loop.time())
+        event_time = datetime.datetime.now().isoformat() + 'Z'
+        interface_data_yang8343 = await loop.run_in_executor(executor, fetch_data_new, ipr)
+        for receiver, queue, task in zip(receivers, queues, tasks):
+            if not task.done():
+                receiver.enqueue(queue, (event_time, interface_data_yang8343))
 
-            #test scenario - where notifications are being sent, and suddenly kill the collector, the behaviour should be that it should continue to 
-            # try to send notifications? HTTPS is a stateless protocol. So should it continue to send notifications upto the retry limit? 
+async def run_publisher(ipr, args, receivers):
+    # Every receiver has a delivery thread of its own, so a blackholed receiver holds no other receiver's
+    # thread, and collection has a separate one: it never waits behind a delivery
+    loop = asyncio.get_running_loop()
+    delivery = ThreadPoolExecutor(max_workers=max(1, len(receivers)), thread_name_prefix="deliver")
+    collection = ThreadPoolExecutor(max_workers=1, thread_name_prefix="collect")
+    tasks = []
+    try:
+        # Capabilities are discovered concurrently; receivers that cannot be reached yet are retried with backoff
+        await asyncio.gather(*(loop.run_in_executor(delivery, receiver.rediscover) for receiver in receivers))
+        queues = [asyncio.Queue(maxsize=max(1, args.queue_size)) for _ in receivers]
+        tasks = [asyncio.create_task(receiver.run(queue, delivery)) for receiver, queue in zip(receivers, queues)]
+        await collect(ipr, args, receivers, queues, tasks, collection)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Threads still blocked on an unresponsive collector end with their request timeout
+        delivery.shutdown(wait=False, cancel_futures=True)
+        collection.shutdown(wait=False, cancel_futures=True)
+
+def main():
+    ipr = None
+    receivers = []
+    try:
+        parser = argparse.ArgumentParser(
+                prog="publisher.py",
+                description="Sets up a HTTPS publisher, in accordance with RFC____",
+                epilog="-------------------------------")                             ## To be done : Add appropriate epilog
+        parser.add_argument("ip",type=str,nargs="+",help="IP Address to send YANG notification. Can be IPV4 or IPV6. IPv4 addresses follow dotted decimal format, as implemented in inet_pton(). IPv6 addresses also follow inet_pton() implementation standards. See RFC 2373 for further details on the representation of Ipv6 addresses. Several receivers can be given, each as host, host:port or [ipv6]:port; notifications are sent to all of them")
+        mutually_exlusive_group = parser.add_mutually_exclusive_group()
+        mutually_exlusive_group.add_argument("-t","--time",type=float,help="Time interval between requests (in seconds)")
+        mutually_exlusive_group.add_argument("-r","--random",type=int,help="Sends notifications randomly, with the time interval being a random number between (0,argument)")
+        parser.add_argument("-p","--port",type=int,help="Port number to send YANG notification, for receivers given without a port.")
+        parser.add_argument("-v","--verbose",action="store_true",help="Verbose mode for extra information.")
+        parser.add_argument("--num-retries", type=int, help="Number of notifications a receiver may reject (e.g. failed validation) before the publisher stops sending to it. Default 3. An unreachable or overloaded receiver is retried with backoff instead")
+        parser.add_argument("-b","--batch-size", type=int, default=1, help="Number of notifications sent together in one POST to /relay-notifications, if the receiver advertises the batch capability. Default 1 (no batching)")
+        parser.add_argument("--pool-size", type=int, default=1, help="Maximum number of keep-alive connections kept open to the receiver. Default 1")
+        parser.add_argument("--delta", action="store_true", help="Only send the leaves that changed since the previous notification, if the receiver advertises the delta capability. Not combined with batches")
+        parser.add_argument("--keyframe-interval", type=int, default=10, help="In delta mode, every Nth notification is sent in full. Default 10")
+        parser.add_argument("--publisher-id", help="In delta mode, tells this publisher apart from others with the same client certificate (Notif-Publisher-Id header); the receiver keeps the state deltas are merged into per publisher. Default <hostname>-<pid>")
+        parser.add_argument("--client-cert", help="TLS client certificate presented to the receivers (PEM file, may include the key). Receivers key the delta state on it")
+        parser.add_argument("--client-key", help="Private key of --client-cert, if not in the same file")
+        parser.add_argument("--spool-dir", help="Directory where notifications that cannot be delivered (collector unreachable, 5xx, 429) are kept, one subdirectory per receiver, and replayed once the receiver accepts notifications again. Without it they are dropped and count against the retries")
+        parser.add_argument("--spool-max-bytes", type=int, default=64 * 1024 * 1024, help="Size limit of the spool of each receiver; the oldest notifications are dropped beyond it. Default 64 MiB")
+        parser.add_argument("--spool-max-age", type=float, default=86400, help="Spooled notifications older than this many seconds are dropped. Default 86400")
+        parser.add_argument("--replay-rate", type=float, default=50, help="Maximum number of spooled notifications replayed per second and receiver. Default 50")
+        parser.add_argument("--timeout", type=float, default=10, help="Seconds to wait for the collector to accept a connection or answer a request. Default 10")
+        parser.add_argument("--backoff-base", type=float, default=1, help="Upper bound, in seconds, of the wait after the first failure to reach a collector; it doubles with every consecutive failure. Default 1")
+        parser.add_argument("--backoff-max", type=float, default=60, help="Largest wait, in seconds, between attempts to reach a collector. Default 60")
+        parser.add_argument("--failure-threshold", type=int, default=3, help="Consecutive failures after which no notification is sent to a collector until the backoff wait is over. Default 3")
+        parser.add_argument("--compression", choices=["none", "auto"] + CONTENT_CODINGS, default="none", help="Content-Encoding of the notifications, if the receiver advertises it; auto takes the first of " + ", ".join(CONTENT_CODINGS) + " that the receiver supports. Default none")
+        parser.add_argument("--queue-size", type=int, default=10, help="Notifications kept per receiver while it is busy; the oldest is dropped when a slow receiver falls further behind. Default 10")
+
+        args = parser.parse_intermixed_args()
+
+        for target in args.ip:
+            host, port = parse_target(target)
+            is_literal_ip = valid_ipv4_ipv6(host)
+            if not is_literal_ip:
+                if any(c.isalpha() for c in host):
+                    publisher_print(f"Assuming '{host}' is a hostname (e.g., Docker service name), skipping IP format validation.", args.verbose)
+                else:
+                    print(f"Invalid IP Address format for '{host}'")
+                    raise AssertionError("Invalid IPV4/IPV6 address format (expected literal IP or hostname).")
+            receivers.append(Receiver(host, port or args.port, args))
+
+        ipr = IPRoute()
+        asyncio.run(run_publisher(ipr, args, receivers))
+
+        #test scenario - where notifications are being sent, and suddenly kill the collector, the behaviour should be that it should continue to 
+        # try to send notifications? HTTPS is a stateless protocol. So should it continue to send notifications upto the retry limit? 
             
     except requests.exceptions.RequestException as e:
         print(f"Failed to discover capabilities OR Send notification(s): {e}")
 
-    except KeyboardInterrupt or AssertionError:
+    except (KeyboardInterrupt, AssertionError) as e:
+        if isinstance(e, AssertionError):
+            print(e)
         print("\n\nTerminating Publisher\n")
 
+    finally:
+        for receiver in receivers:
+            receiver.session.close()
+            if receiver.spool is not None:
+                receiver.spool.close()
+        if ipr is not None:
+            ipr.close()
+
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,61 @@
+"""
+Retry scheduling for a collector that is unavailable.
+
+Consecutive failures back off exponentially with full jitter: after the nth
+failure the next attempt waits a random time between 0 and
+min(max_delay, base_delay * 2 ** (n - 1)), so that publishers that lost the
+same collector do not come back in lockstep. A Retry-After sent by the
+collector is a lower bound of the wait.
+
+The scheduler is also a circuit breaker:
+
+- closed: requests are sent
+- open: after failure_threshold consecutive failures, or a Retry-After, no
+  request is sent until the wait is over
+- half-open: the wait is over and one probe request may be sent; its success
+  closes the circuit, its failure opens it again with a longer wait
+"""
+
+import random
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class RetryScheduler:
+    def __init__(self, base_delay, max_delay, failure_threshold, clock=time.monotonic, rng=random.uniform):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = max(1, failure_threshold)
+        self.clock = clock
+        self.rng = rng
+        self.state = CLOSED
+        self.failures = 0           # consecutive failures
+        self.retry_at = 0.0
+
+    def allow(self):
+        # Whether a request may be sent now; the first one once an open circuit has waited is the probe
+        if self.state == OPEN and self.clock() >= self.retry_at:
+            self.state = HALF_OPEN
+        return self.state != OPEN
+
+    def wait_time(self):
+        return max(0.0, self.retry_at - self.clock()) if self.state == OPEN else 0.0
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+
+    def record_failure(self, retry_after=None):
+        # Returns the seconds until the next attempt, 0 while the circuit stays closed
+        self.failures += 1
+        if self.state != HALF_OPEN and self.failures < self.failure_threshold and retry_after is None:
+            return 0.0
+        delay = self.rng(0, min(self.max_delay, self.base_delay * 2 ** (self.failures - 1)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        self.state = OPEN
+        self.retry_at = self.clock() + delay
+        return delay
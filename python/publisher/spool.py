@@ -0,0 +1,215 @@
+"""
+Disk spool of undeliverable notifications.
+
+Encoded notifications that could not be delivered are appended to segment
+files in a spool directory and read back, oldest first, once the collector
+accepts notifications again. Segments are append-only and read through mmap;
+a cursor file records how far they have been delivered, so a restarted
+publisher resumes where it stopped. The spool is bounded in size and age:
+the oldest segments are deleted when it grows past max_bytes, and records
+older than max_age are skipped and their segments deleted.
+
+Record layout: timestamp (double), content type length (uint16), body
+length (uint32), content type, body. A record torn by a crash at the end of
+a segment is ignored; every process appends to a new segment.
+
+A spool is used by a single thread at a time.
+"""
+
+import mmap
+import os
+import struct
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+RECORD_HEADER = struct.Struct(">dHI")
+SEGMENT_SUFFIX = ".seg"
+CURSOR_FILE = "cursor"
+
+# Largest segment file; smaller for small spools, so that eviction stays fine-grained
+SEGMENT_MAX_BYTES = 4 * 1024 * 1024
+
+# (segment id, offset in the segment)
+Position = Tuple[int, int]
+
+
+class Record(NamedTuple):
+    timestamp: float
+    content_type: str
+    body: bytes
+    end: Position       # position right after the record, to commit once it was delivered
+
+
+class Spool:
+    def __init__(self, directory, max_bytes, max_age):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.segment_bytes = max(1, min(SEGMENT_MAX_BYTES, max_bytes // 4))
+        os.makedirs(directory, exist_ok=True)
+        self.segments = sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(directory)
+                               if name.endswith(SEGMENT_SUFFIX))
+        self.cursor = self._load_cursor()
+        # Segment ids only grow, so a cursor never points into a newer segment that reused an id
+        self.next_id = max(self.segments + [self.cursor[0]]) + 1
+        self.active = None          # file of the segment appended to, opened on the first append
+        self.active_id = None
+        self.evicted = 0            # segments deleted by size or age before they were delivered
+        for segment_id in [s for s in self.segments if s < self.cursor[0]]:
+            self._delete(segment_id)
+        self._fix_cursor()
+
+    def _path(self, segment_id):
+        return os.path.join(self.directory, f"{segment_id:020d}{SEGMENT_SUFFIX}")
+
+    def _load_cursor(self):
+        try:
+            with open(os.path.join(self.directory, CURSOR_FILE), "r") as f:
+                segment_id, offset = f.read().split()
+            return int(segment_id), int(offset)
+        except (OSError, ValueError):
+            return (self.segments[0] if self.segments else 0), 0
+
+    def _save_cursor(self):
+        # Written next to the cursor and renamed over it, so a crash leaves the old or the new cursor
+        path = os.path.join(self.directory, CURSOR_FILE)
+        with open(path + ".tmp", "w") as f:
+            f.write(f"{self.cursor[0]} {self.cursor[1]}")
+        os.replace(path + ".tmp", path)
+
+    def _delete(self, segment_id):
+        if segment_id == self.active_id:
+            self.active.close()
+            self.active = None
+            self.active_id = None
+        try:
+            os.remove(self._path(segment_id))
+        except OSError:
+            pass
+        self.segments.remove(segment_id)
+
+    def _fix_cursor(self):
+        # Move a cursor whose segment was deleted to the start of the next one
+        if self.cursor[0] not in self.segments:
+            following = [s for s in self.segments if s > self.cursor[0]]
+            self.cursor = (following[0] if following else self.next_id, 0)
+
+    def _size(self, segment_id):
+        try:
+            return os.path.getsize(self._path(segment_id))
+        except OSError:
+            return 0
+
+    def append(self, content_type, body):
+        content_type = content_type.encode("ascii")
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        record = RECORD_HEADER.pack(time.time(), len(content_type), len(body)) + content_type + body
+        if self.active is None or self.active.tell() + len(record) > self.segment_bytes:
+            self._roll()
+        self.active.write(record)
+        self.evict()
+
+    def _roll(self):
+        if self.active is not None:
+            self.active.close()
+        self.active_id = self.next_id
+        self.next_id += 1
+        self.active = open(self._path(self.active_id), "ab", buffering=0)
+        self.segments.append(self.active_id)
+
+    def evict(self):
+        # Whole segments go, oldest first: the segment being appended to is only dropped for its age
+        deadline = time.time() - self.max_age
+        for segment_id in list(self.segments):
+            try:
+                expired = os.path.getmtime(self._path(segment_id)) < deadline
+            except OSError:
+                expired = True
+            if not expired:
+                break
+            self._delete(segment_id)
+            self.evicted += 1
+        total = sum(self._size(segment_id) for segment_id in self.segments)
+        while total > self.max_bytes and len(self.segments) > 1:
+            total -= self._size(self.segments[0])
+            self._delete(self.segments[0])
+            self.evicted += 1
+        self._fix_cursor()
+
+    def pending(self):
+        # Whether records remain after the cursor
+        for segment_id in self.segments:
+            if segment_id > self.cursor[0] and self._size(segment_id):
+                return True
+            if segment_id == self.cursor[0] and self._size(segment_id) > self.cursor[1]:
+                return True
+        return False
+
+    def read(self, limit) -> Tuple[List[Record], Optional[Position]]:
+        """
+        Read up to limit records after the cursor, without consuming them.
+
+        Returns:
+            The records, and the position after the last record examined (expired
+            records are skipped), to commit once all of them were delivered
+        """
+        records = []
+        position = None
+        deadline = time.time() - self.max_age
+        for segment_id in self.segments:
+            if segment_id < self.cursor[0]:
+                continue
+            offset = self.cursor[1] if segment_id == self.cursor[0] else 0
+            complete = self._read_segment(segment_id, offset, limit, deadline, records)
+            if complete is not None:
+                position = complete
+            if len(records) >= limit:
+                break
+        return records, position
+
+    def _read_segment(self, segment_id, offset, limit, deadline, records) -> Optional[Position]:
+        size = self._size(segment_id)
+        if size <= offset:
+            return self._end_of(segment_id, size) if segment_id != self.active_id else None
+        position = None
+        exhausted = False
+        with open(self._path(segment_id), "rb") as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as data:
+            while len(records) < limit:
+                if offset + RECORD_HEADER.size > size:
+                    exhausted = True
+                    break
+                timestamp, type_length, body_length = RECORD_HEADER.unpack_from(data, offset)
+                start = offset + RECORD_HEADER.size
+                end = start + type_length + body_length
+                if end > size:
+                    exhausted = True
+                    break
+                position = (segment_id, end)
+                if timestamp >= deadline:
+                    content_type = data[start:start + type_length].decode("ascii")
+                    records.append(Record(timestamp, content_type, data[start + type_length:end], position))
+                offset = end
+        # What is left at the end of a segment of a crashed process is a torn record
+        if exhausted and segment_id != self.active_id:
+            return self._end_of(segment_id, size)
+        return position
+
+    def _end_of(self, segment_id, size):
+        # A segment that is complete and read to its end hands over to the next one
+        following = [s for s in self.segments if s > segment_id]
+        return (following[0], 0) if following else (segment_id, size)
+
+    def commit(self, position):
+        """Consume the records up to position, deleting the segments delivered completely."""
+        if position is None:
+            return
+        self.cursor = position
+        for segment_id in [s for s in self.segments if s < position[0]]:
+            self._delete(segment_id)
+        self._save_cursor()
+
+    def close(self):
+        if self.active is not None:
+            self.active.close()
+            self.active = None
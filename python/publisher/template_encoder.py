@@ -0,0 +1,178 @@
+"""
+Template encoding of notification payloads.
+
+Consecutive notifications of the publisher have the same structure: the same
+interfaces with the same leaves, only the counters and eventTime change. The
+template encoder renders the payload once per structure and encoding with a
+sentinel in place of every string and integer leaf, and turns the result into
+a %-format whose slots are the leaves. Every following payload of the same
+structure is encoded by splicing its leaf values into the template, without
+walking it through json.dumps, xmltodict.unparse or cbor2.dumps again: JSON
+and XML values are spliced as text, CBOR values as encoded items, which are
+kept per template since most leaves repeat from one notification to the next.
+
+The structure covers member names and order, list lengths, leaf types, and
+the values of booleans, leaf-lists and other leaves that are not spliced, so
+a template is rebuilt whenever the interface list changes. The output is the
+same as the one of the regular encoders; payloads whose strings would need
+escaping are encoded by the regular encoder.
+"""
+
+import os
+import re
+
+import cbor2
+
+# Fixed-length sentinels: their CBOR text header does not depend on the slot
+SENTINEL_TOKEN = "tmpl" + os.urandom(6).hex()
+SLOT_DIGITS = 8
+
+# Characters escaped by the regular encoders; spliced values must not add any
+JSON_ESCAPED = '"\\'
+XML_ESCAPED = "&<>"
+
+# CBOR text string headers by length in bytes
+CBOR_TEXT_HEADERS = [bytes([0x60 + n]) for n in range(24)] + [bytes([0x78, n]) for n in range(24, 256)]
+
+LEAF_KINDS = frozenset((str, int))
+
+
+def flatten(obj, signature, values):
+    # Walks a payload in encoding order: string and integer leaves go to values, the rest to the signature
+    leaves = tuple(obj.values())
+    kinds = tuple(map(type, leaves))
+    signature.append(tuple(obj))
+    signature.append(kinds)
+    if LEAF_KINDS.issuperset(kinds):
+        values.extend(leaves)
+        return
+    for value, kind in zip(leaves, kinds):
+        if kind is str or kind is int:
+            values.append(value)
+        elif kind is dict:
+            flatten(value, signature, values)
+        elif kind is list and value and type(value[0]) is dict:
+            signature.append(len(value))
+            for entry in value:
+                flatten(entry, signature, values)
+        elif kind is list:
+            signature.append(tuple(value))
+        else:
+            signature.append(value)
+
+
+def substitute(obj, counter):
+    # Copy of a payload with a sentinel for every leaf flatten() puts in values, in the same order
+    copy = {}
+    for key, value in obj.items():
+        kind = type(value)
+        if kind is str or kind is int:
+            copy[key] = f"{SENTINEL_TOKEN}{counter[0]:0{SLOT_DIGITS}d}"
+            counter[0] += 1
+        elif kind is dict:
+            copy[key] = substitute(value, counter)
+        elif kind is list and value and type(value[0]) is dict:
+            copy[key] = [substitute(entry, counter) for entry in value]
+        else:
+            copy[key] = value
+    return copy
+
+
+def cbor_item(value):
+    if type(value) is str:
+        data = value.encode("utf-8")
+        return CBOR_TEXT_HEADERS[len(data)] + data if len(data) < 256 else cbor2.dumps(value)
+    return cbor2.dumps(value)
+
+
+class PayloadTemplate:
+    def __init__(self, encoding, payload, encode):
+        # encode is the regular encoder, (payload, encoding) -> (body, headers)
+        values = []
+        flatten(payload, [], values)
+        rendered, self.headers = encode(substitute(payload, [0]), encoding)
+        if encoding == "json":
+            pattern = re.compile('"' + SENTINEL_TOKEN + r'(\d{%d})"' % SLOT_DIGITS)
+            specs = ["%d" if type(value) is int else '"%s"' for value in values]
+        elif encoding == "xml":
+            pattern = re.compile(SENTINEL_TOKEN + r'(\d{%d})' % SLOT_DIGITS)
+            specs = ["%s"] * len(values)
+        else:
+            header = cbor2.dumps(SENTINEL_TOKEN + "0" * SLOT_DIGITS)[:-len(SENTINEL_TOKEN) - SLOT_DIGITS]
+            pattern = re.compile(re.escape(header) + SENTINEL_TOKEN.encode("ascii") + rb'(\d{%d})' % SLOT_DIGITS)
+            specs = [b"%b"] * len(values)
+        parts = pattern.split(rendered)
+        # Slots must come out in walk order, or the values would land in the wrong place
+        if [int(index) for index in parts[1::2]] != list(range(len(values))):
+            raise ValueError("Payload encoder does not keep the member order")
+        static = [part.replace(b"%", b"%%") if isinstance(part, bytes) else part.replace("%", "%%")
+                  for part in parts[0::2]]
+        pieces = [static[0]]
+        for spec, chunk in zip(specs, static[1:]):
+            pieces += [spec, chunk]
+        self.format = (b"" if encoding == "cbor" else "").join(pieces)
+        self.encoding = encoding
+        if encoding == "cbor":
+            self.items = {}         # value -> encoded CBOR item
+            return
+        # A body with exactly the escaped characters of the bare template has no value that needed escaping
+        skeleton = self.format % tuple(0 if type(value) is int else "" for value in values)
+        if encoding == "json" and not (skeleton.isascii() and skeleton.isprintable()):
+            raise ValueError("Payload encoder output is not printable ASCII")
+        self.expected = {char: skeleton.count(char) for char in (JSON_ESCAPED if encoding == "json" else XML_ESCAPED)}
+
+    def render(self, values):
+        # The encoded payload, or None if a string would need escaping
+        if self.encoding == "cbor":
+            return self.format % tuple(self._cbor_items(values))
+        body = self.format % tuple(values)
+        if self.encoding == "json" and not (body.isascii() and body.isprintable()):
+            return None
+        for char, count in self.expected.items():
+            if body.count(char) != count:
+                return None
+        return body
+
+    def _cbor_items(self, values):
+        # Encoded values, looked up in C; only the values not seen before are encoded here
+        if len(self.items) > 4 * len(values):
+            self.items.clear()
+        items = list(map(self.items.get, values))
+        index = -1
+        try:
+            while True:
+                index = items.index(None, index + 1)
+                value = values[index]
+                items[index] = self.items[value] = cbor_item(value)
+        except ValueError:
+            pass
+        return items
+
+
+class TemplateEncoder:
+    # Latest template per encoding; a payload of another structure replaces it
+
+    def __init__(self, encode):
+        self.encode_payload = encode
+        self.templates = {}
+        self.rebuilds = 0
+
+    def encode(self, payload, encoding):
+        signature = []
+        values = []
+        flatten(payload, signature, values)
+        signature = tuple(signature)
+        cached = self.templates.get(encoding)
+        if cached is None or cached[0] != signature:
+            try:
+                template = PayloadTemplate(encoding, payload, self.encode_payload)
+            except ValueError:
+                template = None
+            cached = (signature, template)
+            self.templates[encoding] = cached
+            self.rebuilds += 1
+        template = cached[1]
+        body = template.render(values) if template is not None else None
+        if body is None:
+            return self.encode_payload(payload, encoding)
+        return body, dict(template.headers)
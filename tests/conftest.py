@@ -0,0 +1,62 @@
+"""
+Shared setup of the test suite.
+
+The collectors and the publisher are directories of plain modules rather
+than packages, so their directories are put on sys.path. The collectors load
+the YANG modules relative to their own directory, which therefore is the
+working directory while they are imported.
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FLASK_DIR = os.path.join(ROOT, "python", "flask_impl")
+PUBLISHER_DIR = os.path.join(ROOT, "python", "publisher")
+FAST_API_DIR = os.path.join(ROOT, "python", "fast_api_impl")
+
+for path in (FLASK_DIR, PUBLISHER_DIR, FAST_API_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# No broker in the tests: do not wait for undelivered messages at exit
+os.environ.setdefault("KAFKA_FLUSH_TIMEOUT", "0")
+
+os.chdir(FLASK_DIR)
+
+
+DATA_DIR = os.path.join(ROOT, "perf_analysis", "data")
+
+
+@pytest.fixture(scope="session")
+def notification():
+    """A valid notification, as decoded JSON."""
+    with open(os.path.join(DATA_DIR, "data.json"), "rb") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def collector(monkeypatch):
+    """
+    Test client of the Flask collector, with Kafka replaced by a list.
+
+    Returns:
+        (client, sent): sent receives the (value, content_type) of every produced message
+    """
+    import app
+
+    sent = []
+
+    def produce(value, content_type, *args, **kwargs):
+        sent.append((value, content_type))
+        return True, ""
+
+    def produce_batch(messages, *args, **kwargs):
+        return [produce(value, content_type) for value, content_type in messages]
+
+    monkeypatch.setattr(app, "produce_to_kafka", produce)
+    monkeypatch.setattr(app, "produce_batch_to_kafka", produce_batch)
+    return app.app.test_client(), sent
@@ -0,0 +1,84 @@
+"""POST /relay-notifications: per-notification status and the batch size limit."""
+
+import copy
+import os
+import json
+
+import cbor2
+import pytest
+
+import app
+from conftest import DATA_DIR
+
+LIMIT = 3
+
+
+@pytest.fixture
+def limit(monkeypatch):
+    monkeypatch.setattr(app, "BATCH_MAX_NOTIFICATIONS", LIMIT)
+    analyzed = []
+    from_tree = app.NotificationPipeline.from_tree
+
+    def counting_from_tree(*args, **kwargs):
+        analyzed.append(args)
+        return from_tree(*args, **kwargs)
+
+    monkeypatch.setattr(app.NotificationPipeline, "from_tree", counting_from_tree)
+    return analyzed
+
+
+def xml_sequence(count):
+    with open(os.path.join(DATA_DIR, "data.xml"), "rb") as f:
+        return f.read() * count
+
+
+def test_statuses_in_order(collector, notification):
+    client, sent = collector
+    invalid = copy.deepcopy(notification)
+    invalid["ietf-https-notif:notification"]["bogus"] = 1
+    response = client.post("/relay-notifications", data=json.dumps([notification, invalid, notification]),
+                           headers={"Content-Type": "application/json"})
+    assert response.status_code == 200
+    assert [result["status"] for result in response.json["results"]] == [204, 400, 204]
+    assert "error" in response.json["results"][1]
+    assert len(sent) == 2
+
+
+@pytest.mark.parametrize("content_type, body", [
+    ("application/json", lambda n: json.dumps([n] * (LIMIT + 1))),
+    ("application/cbor-seq", lambda n: cbor2.dumps(n) * (LIMIT + 1)),
+    ("application/xml", lambda n: xml_sequence(LIMIT + 1)),
+])
+def test_batch_over_limit_rejected_before_analysis(collector, notification, limit, content_type, body):
+    client, sent = collector
+    response = client.post("/relay-notifications", data=body(notification), headers={"Content-Type": content_type})
+    assert response.status_code == 413
+    assert len(limit) <= LIMIT
+    assert not sent
+
+
+@pytest.mark.parametrize("content_type, body", [
+    ("application/json", lambda n: json.dumps([n] * LIMIT)),
+    ("application/cbor-seq", lambda n: cbor2.dumps(n) * LIMIT),
+    ("application/xml", lambda n: xml_sequence(LIMIT)),
+])
+def test_batch_at_limit_accepted(collector, notification, limit, content_type, body):
+    client, sent = collector
+    response = client.post("/relay-notifications", data=body(notification), headers={"Content-Type": content_type})
+    assert response.status_code == 200
+    assert [result["status"] for result in response.json["results"]] == [204] * LIMIT
+    assert len(sent) == LIMIT
+
+
+def test_json_over_limit_builds_no_pipeline(collector, notification, limit):
+    client, _ = collector
+    client.post("/relay-notifications", data=json.dumps([notification] * (LIMIT + 1)),
+                headers={"Content-Type": "application/json"})
+    assert limit == []
+
+
+def test_undecodable_batch(collector):
+    client, _ = collector
+    response = client.post("/relay-notifications", data=b'{"not": "an array"}',
+                           headers={"Content-Type": "application/json"})
+    assert response.status_code == 415
@@ -0,0 +1,113 @@
+"""ETags and conditional requests of the /capabilities responses of the Flask collector."""
+
+import pytest
+
+import app
+from capabilities import etag_matches, render_capability_variants
+
+JSON = "application/json"
+XML = "application/xml"
+CBOR = "application/cbor"
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def get(client, accept=None, if_none_match=None):
+    headers = {}
+    if accept is not None:
+        headers["Accept"] = accept
+    if if_none_match is not None:
+        headers["If-None-Match"] = if_none_match
+    return client.get("/capabilities", headers=headers)
+
+
+# =============================================================================
+# ENTITY TAG COMPARISON
+# =============================================================================
+
+@pytest.mark.parametrize("header, expected", [
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"xyz", "abc"', True),
+    ('"xyz" ,W/"abc" ', True),
+    ("*", True),
+    (" * ", True),
+    ('"xyz"', False),
+    ('"ABC"', False),
+    ("abc", False),
+    ('"xyz", *', False),
+    ("", False),
+])
+def test_etag_matches(header, expected):
+    assert etag_matches(header, '"abc"') is expected
+
+
+def test_variants_have_distinct_strong_etags():
+    variants = render_capability_variants(["urn:a"], "no-cache")
+    etags = [headers["ETag"] for _, headers in variants.values()]
+    assert len(set(etags)) == len(variants) == 3
+    assert all(etag.startswith('"') and etag.endswith('"') for etag in etags)
+    # Same configuration, same tags; another one changes them
+    assert render_capability_variants(["urn:a"], "no-cache") == variants
+    assert [headers["ETag"] for _, headers in render_capability_variants(["urn:b"], "no-cache").values()] != etags
+
+
+# =============================================================================
+# CONDITIONAL REQUESTS
+# =============================================================================
+
+@pytest.mark.parametrize("accept", [None, XML, JSON, CBOR])
+def test_200_carries_etag_and_vary(client, accept):
+    response = get(client, accept)
+    assert response.status_code == 200
+    assert response.headers["ETag"]
+    assert response.headers["Vary"] == "Accept"
+    assert response.headers["Cache-Control"] == app.CAPABILITIES_CACHE_CONTROL
+
+
+@pytest.mark.parametrize("accept", [XML, JSON, CBOR])
+@pytest.mark.parametrize("if_none_match", ["{etag}", "W/{etag}", '"other", {etag}', "*"])
+def test_304_when_the_etag_matches(client, accept, if_none_match):
+    current = get(client, accept)
+    etag = current.headers["ETag"]
+    response = get(client, accept, if_none_match.format(etag=etag))
+    assert response.status_code == 304
+    assert response.data == b""
+    assert "Content-Type" not in response.headers
+    assert response.headers["ETag"] == etag
+    assert response.headers["Vary"] == "Accept"
+    assert response.headers["Cache-Control"] == current.headers["Cache-Control"]
+
+
+def test_etag_of_another_variant_does_not_match(client):
+    json_etag = get(client, JSON).headers["ETag"]
+    response = get(client, XML, json_etag)
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == XML
+
+
+def test_stale_etag_after_reload(client, monkeypatch):
+    etag = get(client, JSON).headers["ETag"]
+    monkeypatch.setitem(app.COLLECTOR_CAPABILITIES, "batch_capable", not app.COLLECTOR_CAPABILITIES["batch_capable"])
+    app.reload_capabilities()
+    try:
+        response = get(client, JSON, etag)
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+    finally:
+        monkeypatch.undo()
+        app.reload_capabilities()
+    assert get(client, JSON, etag).status_code == 304
+
+
+def test_failed_negotiation_ignores_if_none_match(client, monkeypatch):
+    monkeypatch.setitem(app.REPLY_SUPPORT, "cbor", False)
+    app.reload_capabilities()
+    try:
+        assert get(client, CBOR, "*").status_code == 406
+    finally:
+        monkeypatch.undo()
+        app.reload_capabilities()
@@ -0,0 +1,106 @@
+"""Compressed request bodies: decoding, decompression bombs and malformed bodies."""
+
+import gzip
+import io
+import json
+import zlib
+
+import pytest
+import zstandard
+
+import app
+from content_coding import BodyTooLarge, decode_stream
+
+BOMB_SIZE = 20 * 1024 * 1024
+
+COMPRESSORS = {
+    "gzip": gzip.compress,
+    "deflate": zlib.compress,
+    "zstd": lambda data: zstandard.ZstdCompressor().compress(data),
+}
+
+
+def post(client, body, coding, path="/relay-notification", content_type="application/json"):
+    return client.post(path, data=body, headers={"Content-Type": content_type, "Content-Encoding": coding})
+
+
+@pytest.mark.parametrize("coding", sorted(COMPRESSORS))
+def test_compressed_notification_accepted(collector, notification, coding):
+    client, sent = collector
+    body = json.dumps(notification).encode()
+    response = post(client, COMPRESSORS[coding](body), coding)
+    assert response.status_code == 204
+    assert len(sent) == 1
+
+
+@pytest.mark.parametrize("coding", sorted(COMPRESSORS))
+def test_compressed_batch_accepted(collector, notification, coding):
+    client, sent = collector
+    body = json.dumps([notification, notification]).encode()
+    response = post(client, COMPRESSORS[coding](body), coding, path="/relay-notifications")
+    assert response.status_code == 200
+    assert [result["status"] for result in response.json["results"]] == [204, 204]
+    assert len(sent) == 2
+
+
+@pytest.mark.parametrize("path", ["/relay-notification", "/relay-notifications"])
+@pytest.mark.parametrize("coding", sorted(COMPRESSORS))
+def test_bomb_rejected_with_413(collector, coding, path):
+    client, sent = collector
+    bomb = COMPRESSORS[coding](b"\0" * BOMB_SIZE)
+    assert len(bomb) < 100 * 1024
+    response = post(client, bomb, coding, path=path)
+    assert response.status_code == 413
+    assert not sent
+
+
+@pytest.mark.parametrize("coding", sorted(COMPRESSORS))
+def test_size_limit_applies_to_the_decompressed_body(collector, monkeypatch, notification, coding):
+    client, sent = collector
+    body = json.dumps(notification).encode()
+    monkeypatch.setattr(app, "MAX_DECOMPRESSED_BODY_SIZE", len(body) - 1)
+    assert post(client, COMPRESSORS[coding](body), coding).status_code == 413
+    monkeypatch.setattr(app, "MAX_DECOMPRESSED_BODY_SIZE", len(body))
+    assert post(client, COMPRESSORS[coding](body), coding).status_code == 204
+    assert len(sent) == 1
+
+
+def test_unsupported_coding_rejected_with_415(collector, notification):
+    client, sent = collector
+    response = post(client, json.dumps(notification).encode(), "br")
+    assert response.status_code == 415
+    accepted = [coding.strip() for coding in response.headers["Accept-Encoding"].split(",")]
+    assert set(accepted) == set(COMPRESSORS)
+    assert not sent
+
+
+@pytest.mark.parametrize("coding", sorted(COMPRESSORS))
+def test_truncated_body_rejected_with_400(collector, notification, coding):
+    client, sent = collector
+    compressed = COMPRESSORS[coding](json.dumps(notification).encode())
+    response = post(client, compressed[:len(compressed) // 2], coding)
+    assert response.status_code == 400
+    assert not sent
+
+
+@pytest.mark.parametrize("coding", sorted(COMPRESSORS))
+def test_corrupt_body_rejected_with_400(collector, notification, coding):
+    client, sent = collector
+    response = post(client, json.dumps(notification).encode(), coding)
+    assert response.status_code == 400
+    assert not sent
+
+
+@pytest.mark.parametrize("coding", ["gzip", "deflate"])
+def test_trailing_data_rejected(coding):
+    stream = io.BytesIO(COMPRESSORS[coding](b"notification") + b"trailer")
+    with pytest.raises(ValueError, match="Trailing data"):
+        decode_stream(stream, coding, 1024)
+
+
+@pytest.mark.parametrize("coding", sorted(COMPRESSORS))
+def test_decode_stream_stops_at_the_limit(coding):
+    data = b"\0" * BOMB_SIZE
+    with pytest.raises(BodyTooLarge):
+        decode_stream(io.BytesIO(COMPRESSORS[coding](data)), coding, 1024 * 1024)
+    assert decode_stream(io.BytesIO(COMPRESSORS[coding](data)), coding, BOMB_SIZE) == data
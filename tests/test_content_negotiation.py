@@ -0,0 +1,123 @@
+"""RFC 9110 Accept negotiation: parsing, weights and specificity, and the /capabilities variant."""
+
+from http import HTTPStatus
+
+import pytest
+
+import app
+from capabilities import negotiate_capabilities_variant
+from content_negotiation import MediaRange, negotiate, parse_accept, weigh
+
+JSON = "application/json"
+XML = "application/xml"
+CBOR = "application/cbor"
+ALL = [XML, JSON, CBOR]
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("application/json", [MediaRange("application", "json", (), 1.0)]),
+    ("Application/JSON;Charset=UTF-8;q=0.5", [MediaRange("application", "json", (("charset", "UTF-8"),), 0.5)]),
+    ("application/xml;q=0", [MediaRange("application", "xml", (), 0.0)]),
+    ("application/xml ; q=1.000", [MediaRange("application", "xml", (), 1.0)]),
+    ("*/*;q=0.1, application/*;q=0.2",
+     [MediaRange("*", "*", (), 0.1), MediaRange("application", "*", (), 0.2)]),
+    # Accept-extensions after the weight are not media type parameters
+    ("application/json;q=0.5;ext=1", [MediaRange("application", "json", (), 0.5)]),
+    # Separators inside quoted strings, and escaped quotes
+    ('application/json;profile="a,b;c";q=0.3, text/plain',
+     [MediaRange("application", "json", (("profile", "a,b;c"),), 0.3), MediaRange("text", "plain", (), 1.0)]),
+    ('application/xml;x="a\\"b"', [MediaRange("application", "xml", (("x", 'a"b'),), 1.0)]),
+    # Empty list elements
+    (", application/cbor,,", [MediaRange("application", "cbor", (), 1.0)]),
+])
+def test_parse_accept(header, expected):
+    assert parse_accept(header) == expected
+
+
+@pytest.mark.parametrize("header", ["json", "*/json", "application/", "/json", "appli cation/json", "application/js:on",
+                                    "text/html, application/"])
+def test_malformed_ranges_ignored(header):
+    assert all(media_range.type == "text" for media_range in parse_accept(header))
+
+
+@pytest.mark.parametrize("header", ["application/json;q=2", "application/json;q=1.5", "application/json;q=0.1234",
+                                    "application/json;q=abc", "application/json;q=", "application/json;q=.5"])
+def test_malformed_q_value_raises(header):
+    with pytest.raises(ValueError):
+        parse_accept(header)
+
+
+SPECIFICITY = "*/*;q=0.1, application/*;q=0.2, application/json;q=0.3, application/json;charset=utf-8;q=0.4"
+
+
+@pytest.mark.parametrize("media_type, expected", [
+    # type/subtype;param > type/subtype > type/* > */*
+    ("application/json;charset=utf-8", (0.4, 3)),
+    ("application/json;charset=latin1", (0.3, 2)),
+    ("application/xml", (0.2, 1)),
+    ("text/plain", (0.1, 0)),
+])
+def test_weigh_takes_the_most_specific_range(media_type, expected):
+    assert weigh(parse_accept(SPECIFICITY), media_type) == expected
+
+
+def test_weigh_without_matching_range():
+    assert weigh(parse_accept("text/html"), JSON) == (0.0, -1)
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("application/json", JSON),
+    ("*/*", XML),
+    ("application/*;q=0.5, application/cbor", CBOR),
+    # q=0 excludes a type, also when a less specific range accepts it
+    ("application/json;q=0, */*", XML),
+    ("application/*, application/xml;q=0", JSON),
+    ("application/xml;q=0, application/json;q=0, */*", CBOR),
+    ("*/*;q=0", None),
+    ("text/html", None),
+    ("garbage", None),
+    # Equal weights: the more specific range wins, then the server's order
+    ("application/*;q=0.5, application/json;q=0.5", JSON),
+    ("application/cbor;q=0.5, application/xml;q=0.5", XML),
+    ("application/json;q=0.9, application/cbor;q=0.91", CBOR),
+])
+def test_negotiate(header, expected):
+    assert negotiate(header, ALL) == expected
+
+
+def test_negotiate_raises_on_malformed_q_value():
+    with pytest.raises(ValueError):
+        negotiate("application/json;q=high", ALL)
+
+
+@pytest.mark.parametrize("header, supported, expected", [
+    (None, ALL, (XML, HTTPStatus.OK)),
+    ("", ALL, (XML, HTTPStatus.OK)),
+    ("application/json", ALL, (JSON, HTTPStatus.OK)),
+    ("*/*", [JSON, CBOR], (JSON, HTTPStatus.OK)),
+    # Names no known encoding: default response
+    ("text/html", ALL, (XML, HTTPStatus.OK)),
+    # Only encodings the collector does not reply in are acceptable
+    ("application/cbor", [XML, JSON], (None, HTTPStatus.NOT_ACCEPTABLE)),
+    ("application/cbor, application/json;q=0", [XML, JSON], (None, HTTPStatus.NOT_ACCEPTABLE)),
+    ("application/json;q=abc", ALL, (None, HTTPStatus.BAD_REQUEST)),
+    (None, [], (None, HTTPStatus.INTERNAL_SERVER_ERROR)),
+])
+def test_negotiate_capabilities_variant(header, supported, expected):
+    assert negotiate_capabilities_variant(header, supported) == expected
+
+
+def test_capabilities_406_and_400(monkeypatch):
+    client = app.app.test_client()
+    monkeypatch.setitem(app.REPLY_SUPPORT, "cbor", False)
+    app.reload_capabilities()
+    try:
+        response = client.get("/capabilities", headers={"Accept": CBOR})
+        assert response.status_code == 406
+        assert response.json == {"error": "Not acceptable"}
+        assert client.get("/capabilities", headers={"Accept": "application/*"}).headers["Content-Type"] == XML
+        assert client.get("/capabilities", headers={"Accept": "application/json;q=x"}).status_code == 400
+    finally:
+        monkeypatch.undo()
+        app.reload_capabilities()
+    assert client.get("/capabilities", headers={"Accept": CBOR}).status_code == 200
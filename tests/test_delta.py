@@ -0,0 +1,113 @@
+"""Delta notifications: merge into the last keyframe, 409 without a base, state keyed per publisher."""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import app
+from conftest import FLASK_DIR
+from delta_merge import DeltaStateStore
+
+CERT_A = "-----BEGIN CERTIFICATE-----\nA\n"
+CERT_B = "-----BEGIN CERTIFICATE-----\nB\n"
+
+
+@pytest.fixture(autouse=True)
+def delta_states(monkeypatch):
+    monkeypatch.setattr(app, "delta_states", DeltaStateStore(app.DELTA_MAX_PUBLISHERS))
+
+
+def delta_of(notification, octets):
+    first = notification["ietf-https-notif:notification"]["interface_data"]["interface"][0]
+    return {"ietf-https-notif:notification": {
+        "eventTime": "2025-03-17T19:43:29.972894Z",
+        "interface_data": {"interface": [{"name": first["name"], "statistics": {"in-octets": octets}}]},
+    }}
+
+
+def send(client, body, kind, sequence, publisher="router-1", cert=CERT_A):
+    headers = {"Content-Type": "application/json", "Notif-Delta": kind, "Notif-Sequence": str(sequence)}
+    if publisher is not None:
+        headers["Notif-Publisher-Id"] = publisher
+    environ = {"SSL_CLIENT_CERT": cert} if cert is not None else {}
+    return client.post("/relay-notification", data=json.dumps(body), headers=headers, environ_overrides=environ)
+
+
+def test_delta_merged_into_keyframe(collector, notification):
+    client, sent = collector
+    assert send(client, notification, "keyframe", 1).status_code == 204
+    assert send(client, delta_of(notification, "1600000000"), "delta", 2).status_code == 204
+    assert send(client, delta_of(notification, "1700000000"), "delta", 3).status_code == 204
+
+    merged = json.loads(sent[-1][0])["ietf-https-notif:notification"]
+    interfaces = merged["interface_data"]["interface"]
+    original = notification["ietf-https-notif:notification"]["interface_data"]["interface"]
+    assert merged["eventTime"] == "2025-03-17T19:43:29.972894Z"
+    assert interfaces[0]["statistics"]["in-octets"] == "1700000000"
+    assert interfaces[0]["statistics"]["out-octets"] == original[0]["statistics"]["out-octets"]
+    assert interfaces[1:] == original[1:]
+
+
+def test_delta_without_base_conflicts(collector, notification):
+    client, sent = collector
+    assert send(client, delta_of(notification, "1"), "delta", 1).status_code == 409
+    assert send(client, notification, "keyframe", 1).status_code == 204
+    # Sequence gap: a notification in between was lost
+    assert send(client, delta_of(notification, "1"), "delta", 3).status_code == 409
+    assert len(sent) == 1
+
+
+def test_state_is_kept_per_publisher_id(collector, notification):
+    client, _ = collector
+    assert send(client, notification, "keyframe", 1, publisher="router-1").status_code == 204
+    # Same certificate, other publisher: no state to merge into
+    assert send(client, delta_of(notification, "1"), "delta", 2, publisher="router-2").status_code == 409
+    assert send(client, delta_of(notification, "1"), "delta", 2, publisher="router-1").status_code == 204
+
+
+def test_state_is_kept_per_client_certificate(collector, notification):
+    client, _ = collector
+    assert send(client, notification, "keyframe", 1, publisher=None, cert=CERT_A).status_code == 204
+    assert send(client, delta_of(notification, "1"), "delta", 2, publisher=None, cert=CERT_B).status_code == 409
+    assert send(client, delta_of(notification, "1"), "delta", 2, publisher=None, cert=CERT_A).status_code == 204
+
+
+def test_publisher_id_does_not_reach_another_certificate(collector, notification):
+    client, _ = collector
+    assert send(client, notification, "keyframe", 1, publisher="router-1", cert=CERT_A).status_code == 204
+    # Another client claiming the same Notif-Publisher-Id neither sees nor replaces that state
+    assert send(client, delta_of(notification, "1"), "delta", 2, publisher="router-1", cert=CERT_B).status_code == 409
+    assert send(client, notification, "keyframe", 7, publisher="router-1", cert=CERT_B).status_code == 204
+    assert send(client, delta_of(notification, "1"), "delta", 2, publisher="router-1", cert=CERT_A).status_code == 204
+
+
+def test_delta_needs_client_certificate(collector, notification):
+    client, sent = collector
+    assert send(client, notification, "keyframe", 1, publisher=None, cert=None).status_code == 400
+    # The header alone could be sent by any client
+    assert send(client, notification, "keyframe", 1, publisher="router-1", cert=None).status_code == 400
+    assert send(client, notification, "keyframe", 1, publisher="x" * 1000).status_code == 400
+    assert not sent
+
+
+def test_publisher_id_header_ignored_without_certificate():
+    with app.app.test_request_context(headers={"Notif-Publisher-Id": "router-1"},
+                                      environ_base={"REMOTE_ADDR": "192.0.2.7"}):
+        assert app.get_publisher_id() == "addr:192.0.2.7"
+    with app.app.test_request_context(headers={"Notif-Publisher-Id": "router-1"},
+                                      environ_base={"SSL_CLIENT_CERT": CERT_A}):
+        assert app.get_publisher_id().startswith("cert:")
+        assert app.get_publisher_id().endswith(";id:router-1")
+
+
+@pytest.mark.parametrize("workers, advertised", [("1", True), ("4", False)])
+def test_delta_only_advertised_by_a_single_process(workers, advertised):
+    # The capabilities are fixed at import time, as in a worker forked by serve.py
+    env = dict(os.environ, COLLECTOR_WORKERS=workers, KAFKA_FLUSH_TIMEOUT="0")
+    script = ("import app; print(any(cap.endswith(':delta') for cap in app.build_capabilities_data()))")
+    output = subprocess.run([sys.executable, "-c", script], cwd=FLASK_DIR, env=env, capture_output=True,
+                            text=True, timeout=120, check=True).stdout
+    assert output.strip().splitlines()[-1] == str(advertised)
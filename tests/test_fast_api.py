@@ -0,0 +1,152 @@
+"""FastAPI collector: shared pipeline and capabilities, request metrics and recovery of the validation pool."""
+
+import json
+import os
+import signal
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from yangson import DataModel
+
+from conftest import DATA_DIR
+from notification_pipeline import NotificationPipeline, PipelineContext
+
+
+@pytest.fixture(scope="module")
+def main():
+    """The FastAPI collector, with the default Prometheus registry to itself."""
+    # Both collectors register metrics of the same names in the default registry
+    flask_collectors = list(REGISTRY._collector_to_names)
+    for collector in flask_collectors:
+        REGISTRY.unregister(collector)
+    try:
+        import main
+        yield main
+    finally:
+        for collector in list(REGISTRY._collector_to_names):
+            REGISTRY.unregister(collector)
+        for collector in flask_collectors:
+            REGISTRY.register(collector)
+
+
+@pytest.fixture(scope="module")
+def client(main):
+    main.VALIDATION_WORKERS = 1
+    sent = []
+
+    async def send(value, content_type):
+        sent.append((value, content_type))
+        return True, ""
+
+    with TestClient(main.app) as client:
+        client.app.state.kafka.send = send
+        client.sent = sent
+        yield client
+
+
+def post(client, body, content_type="application/json"):
+    return client.post("/relay-notification", content=body, headers={"Content-Type": content_type})
+
+
+def sample(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_valid_notification_forwarded(client, notification):
+    client.sent.clear()
+    assert post(client, json.dumps(notification)).status_code == 204
+    value, content_type = client.sent[0]
+    assert content_type == "application/json"
+    assert json.loads(value) == notification
+
+
+def test_xml_forwarded_as_by_shared_pipeline(client, main):
+    with open(os.path.join(DATA_DIR, "data.xml"), "rb") as f:
+        body = f.read()
+    client.sent.clear()
+    assert post(client, body, "application/xml").status_code == 204
+    context = PipelineContext(DataModel.from_file(main.YANG_LIBRARY_PATH, [main.YANG_DIR_PATH]))
+    pipeline = NotificationPipeline(context, body, "application/xml")
+    assert pipeline.decode() == (True, None)
+    assert client.sent == [(pipeline.serialize().encode("utf-8"), "application/json")]
+
+
+def test_invalid_notifications_rejected(client, notification):
+    invalid = dict(notification)
+    invalid["ietf-https-notif:notification"] = dict(notification["ietf-https-notif:notification"], bogus=1)
+    assert post(client, json.dumps(invalid)).status_code == 400
+    assert post(client, b"{not json").status_code == 415
+
+
+def test_request_labels_normalized(client, notification):
+    labels = {"method": "POST", "endpoint": "/relay-notification", "encoding": "json"}
+    before = sample("http_request_duration_seconds_count", labels)
+    post(client, json.dumps(notification), "application/json; charset=utf-8")
+    assert sample("http_request_duration_seconds_count", labels) == before + 1
+
+    other = {"method": "GET", "endpoint": "other", "status_code": "404", "content_type": "other"}
+    before = sample("http_requests_total", other)
+    client.get("/no-such-path/12345", headers={"Content-Type": "text/x-anything"})
+    assert sample("http_requests_total", other) == before + 1
+    assert sample("http_requests_total", dict(other, endpoint="/no-such-path/12345")) == 0.0
+
+
+@pytest.mark.parametrize("accept", ["application/json", "application/xml", "application/cbor", "*/*"])
+def test_capabilities_identical_to_flask_collector(client, main, monkeypatch, accept):
+    import app
+
+    # Same configuration: both collectors serve the same bytes under the same ETag
+    monkeypatch.setattr(app, "COLLECTOR_CAPABILITIES", dict(main.COLLECTOR_CAPABILITIES))
+    app.reload_capabilities()
+    try:
+        fast = client.get("/capabilities", headers={"Accept": accept})
+        flask = app.app.test_client().get("/capabilities", headers={"Accept": accept})
+    finally:
+        monkeypatch.undo()
+        app.reload_capabilities()
+    assert fast.status_code == flask.status_code == 200
+    assert fast.content == flask.data
+    for header in ("Content-Type", "ETag", "Vary", "Cache-Control"):
+        assert fast.headers[header] == flask.headers[header]
+
+
+@pytest.mark.parametrize("if_none_match", ["{etag}", "W/{etag}", '"stale", {etag}', "*"])
+def test_capabilities_not_modified(client, if_none_match):
+    etag = client.get("/capabilities", headers={"Accept": "application/json"}).headers["ETag"]
+    response = client.get("/capabilities", headers={"Accept": "application/json",
+                                                    "If-None-Match": if_none_match.format(etag=etag)})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+    assert response.headers["Vary"] == "Accept"
+    stale = client.get("/capabilities", headers={"Accept": "application/json", "If-None-Match": '"stale"'})
+    assert stale.status_code == 200
+
+
+def test_body_size_histogram(client, notification):
+    body = json.dumps(notification)
+    before = sample("post_request_body_size_bytes_sum", {"encoding": "json"})
+    post(client, body)
+    assert sample("post_request_body_size_bytes_sum", {"encoding": "json"}) == before + len(body)
+
+
+def test_dead_worker_answers_503_and_replaces_pool(client, main, notification):
+    body = json.dumps(notification)
+    assert post(client, body).status_code == 204
+    pool = client.app.state.pool
+    for pid in list(pool._processes):
+        os.kill(pid, signal.SIGKILL)
+    deadline = time.monotonic() + 10
+    while not pool._broken and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    restarts = sample("notification_validation_pool_restarts_total", {})
+    response = post(client, body)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(main.VALIDATION_RETRY_AFTER_SECONDS)
+    assert client.app.state.pool is not pool
+    assert sample("notification_validation_pool_restarts_total", {}) == restarts + 1
+
+    assert post(client, body).status_code == 204
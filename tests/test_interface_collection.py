@@ -0,0 +1,120 @@
+"""Interface records of the publisher, built from a stub netlink link dump."""
+
+import pytest
+from yangson.enumerations import ContentType
+
+import app
+import publisher
+from publisher import build_payload, fetch_data_new, get_interface_info
+
+STATS64 = {"rx_bytes": 2 ** 40, "rx_packets": 6749769, "multicast": 3, "rx_dropped": 30220, "rx_errors": 1,
+           "tx_bytes": 85014831, "tx_packets": 197084, "tx_dropped": 2, "tx_errors": 0}
+
+
+class Link:
+    """An RTM_NEWLINK message as returned by IPRoute.link("dump")."""
+
+    def __init__(self, name, index, flags=0x1, carrier=1, operstate="UP", address="3c:91:80:2b:68:23",
+                 ifi_type=1, stats64=STATS64):
+        self.fields = {"index": index, "flags": flags, "ifi_type": ifi_type}
+        self.attrs = {"IFLA_IFNAME": name, "IFLA_OPERSTATE": operstate, "IFLA_CARRIER": carrier,
+                      "IFLA_ADDRESS": address, "IFLA_STATS64": stats64}
+
+    def __getitem__(self, name):
+        return self.fields[name]
+
+    def get_attr(self, name):
+        return self.attrs.get(name)
+
+
+class IPRoute:
+    def __init__(self, links):
+        self.links = links
+        self.dumps = 0
+
+    def link(self, command):
+        assert command == "dump"
+        self.dumps += 1
+        return list(self.links)
+
+
+@pytest.fixture(autouse=True)
+def discontinuity_times(monkeypatch):
+    times = {}
+    monkeypatch.setattr(publisher, "discontinuity_times", times)
+    return times
+
+
+def test_record_from_link_message():
+    record = get_interface_info(Link("wlp2s0", 2))
+    statistics = record.pop("statistics")
+    assert record == {
+        "name": "wlp2s0", "type": "1", "enabled": True, "admin-status": "up", "oper-status": "up", "if-index": 2,
+        "phys-address": "3c:91:80:2b:68:23", "higher-layer-if": [], "lower-layer-if": [], "speed": "0",
+    }
+    assert statistics.pop("discontinuity-time").endswith("Z")
+    # 64-bit counters as strings, 32-bit ones as numbers
+    assert statistics == {
+        "in-octets": "1099511627776", "in-unicast-pkts": "6749769", "in-multicast-pkts": "3", "in-discards": 30220,
+        "in-errors": 1, "out-octets": "85014831", "out-unicast-pkts": "197084", "out-discards": 2, "out-errors": 0,
+    }
+
+
+@pytest.mark.parametrize("flags, carrier, enabled", [(0x1, 1, True), (0x1, 0, False), (0x0, 1, False),
+                                                     (0x1043, 1, True), (0x1002, None, False)])
+def test_enabled_needs_up_and_carrier(flags, carrier, enabled):
+    assert get_interface_info(Link("eth0", 3, flags=flags, carrier=carrier))["enabled"] is enabled
+
+
+@pytest.mark.parametrize("operstate, admin, oper", [("UP", "up", "up"), ("DOWN", "down", "down"),
+                                                    ("UNKNOWN", "testing", "unknown"), ("DORMANT", "dormant", "dormant")])
+def test_status_from_operstate(operstate, admin, oper):
+    record = get_interface_info(Link("eth0", 3, operstate=operstate))
+    assert (record["admin-status"], record["oper-status"]) == (admin, oper)
+
+
+def test_link_without_address():
+    assert get_interface_info(Link("tun0", 9, address=None, ifi_type=65534))["phys-address"] == ""
+
+
+def test_sysfs_fallback_without_stats64(monkeypatch):
+    read = []
+
+    def read_file(path):
+        read.append(path)
+        return "7"
+
+    monkeypatch.setattr(publisher, "read_file", read_file)
+    statistics = get_interface_info(Link("eth0", 3, stats64=None))["statistics"]
+    assert statistics["in-octets"] == "7" and statistics["in-errors"] == 7
+    assert all(path.startswith("/sys/class/net/eth0/statistics/") for path in read)
+    assert len(read) == 9
+
+
+def test_discontinuity_time_kept_per_interface():
+    ipr = IPRoute([Link("eth0", 2), Link("eth1", 3)])
+    first = fetch_data_new(ipr)
+    second = fetch_data_new(ipr)
+    assert [record["statistics"]["discontinuity-time"] for record in first] == \
+        [record["statistics"]["discontinuity-time"] for record in second]
+
+
+def test_one_dump_per_cycle():
+    ipr = IPRoute([Link(f"veth{index}", index) for index in range(1, 51)])
+    records = fetch_data_new(ipr)
+    assert ipr.dumps == 1
+    assert [record["if-index"] for record in records] == list(range(1, 51))
+
+
+def test_broken_link_message_reported_with_its_name():
+    link = Link("eth0", 2)
+    del link.fields["ifi_type"]
+    with pytest.raises(AssertionError, match="eth0"):
+        fetch_data_new(IPRoute([link]))
+
+
+def test_records_conform_to_the_yang_module():
+    records = fetch_data_new(IPRoute([Link("wlp2s0", 2), Link("lo", 1, operstate="UNKNOWN", ifi_type=772),
+                                      Link("docker0", 4, flags=0x1003, carrier=0, operstate="DOWN")]))
+    instance = app.data_model.from_raw(build_payload("2026-10-18T12:00:00Z", records))
+    instance.validate(ctype=ContentType.all)
@@ -0,0 +1,215 @@
+"""
+Kafka forwarding of the Flask collector against a stub producer.
+
+The stub takes the place of app.producer, so the collector's own poll thread
+serves its delivery reports exactly as it serves those of librdkafka.
+"""
+
+import json
+import os
+import threading
+import time
+
+import cbor2
+import pytest
+from confluent_kafka import KafkaError
+
+import app
+from conftest import DATA_DIR
+
+JSON = "application/json"
+XML = "application/xml"
+CBOR = "application/cbor"
+
+
+class Message:
+    def __init__(self, topic, value, headers):
+        self._topic = topic
+        self._value = value
+        self._headers = headers
+
+    def latency(self):
+        return 0.001
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return 0
+
+    def value(self):
+        return self._value
+
+    def headers(self):
+        return self._headers
+
+
+class StubProducer:
+    """
+    Producer whose queue can be full, and whose delivery reports are served
+    by poll() once released, with an optional delivery error.
+    """
+
+    def __init__(self):
+        self.messages = []
+        self.queue_full = False
+        self.error = None
+        self.release = threading.Event()
+        self.release.set()
+        self.reported = threading.Event()
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def produce(self, topic, key=None, value=None, headers=None, callback=None):
+        if self.queue_full:
+            raise BufferError("Local: Queue full")
+        message = Message(topic, value, headers)
+        with self._lock:
+            self.messages.append(message)
+            self._pending.append((callback, message))
+
+    def poll(self, timeout):
+        if not self.release.wait(timeout):
+            return 0
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for callback, message in pending:
+            callback(self.error, message)
+        if pending:
+            self.reported.set()
+        else:
+            time.sleep(min(timeout, 0.01))
+        return len(pending)
+
+    def flush(self, timeout=None):
+        return 0
+
+
+@pytest.fixture
+def producer(monkeypatch):
+    stub = StubProducer()
+    monkeypatch.setattr(app, "producer", stub)
+    monkeypatch.setattr(app, "KAFKA_ACK_TIMEOUT", 2.0)
+    yield stub
+    stub.release.set()
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def read(name):
+    with open(os.path.join(DATA_DIR, name), "rb") as f:
+        return f.read()
+
+
+def post(client, body, content_type=JSON, path="/relay-notification"):
+    return client.post(path, data=body, headers={"Content-Type": content_type})
+
+
+def content_type_header(message):
+    return dict(message.headers())["content-type"].decode("ascii")
+
+
+# =============================================================================
+# FULL PRODUCER QUEUE
+# =============================================================================
+
+def test_queue_full_is_503_with_retry_after(client, producer, monkeypatch):
+    monkeypatch.setattr(app, "KAFKA_RETRY_AFTER_SECONDS", 7)
+    producer.queue_full = True
+    response = post(client, read("data.json"))
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
+
+
+def test_queue_full_in_batch_is_503_per_notification(client, producer, notification):
+    producer.queue_full = True
+    response = post(client, json.dumps([notification, {"bad": 1}]), path="/relay-notifications")
+    assert response.status_code == 200
+    assert response.headers["Retry-After"] == str(app.KAFKA_RETRY_AFTER_SECONDS)
+    assert [result["status"] for result in response.json["results"]] == [503, 400]
+
+
+# =============================================================================
+# DELIVERY MODES
+# =============================================================================
+
+def test_fire_and_forget_answers_before_the_delivery_report(client, producer, monkeypatch):
+    monkeypatch.setattr(app, "KAFKA_DELIVERY_MODE", app.KAFKA_DELIVERY_MODE_FIRE_AND_FORGET)
+    producer.release.clear()
+    assert post(client, read("data.json")).status_code == 204
+    assert len(producer.messages) == 1
+    assert not producer.reported.is_set()
+
+
+def test_ack_waits_for_the_delivery_report(client, producer, monkeypatch):
+    monkeypatch.setattr(app, "KAFKA_DELIVERY_MODE", app.KAFKA_DELIVERY_MODE_ACK)
+    producer.release.clear()
+    threading.Timer(0.2, producer.release.set).start()
+    started = time.monotonic()
+    assert post(client, read("data.json")).status_code == 204
+    assert time.monotonic() - started >= 0.2
+    assert producer.reported.is_set()
+
+
+def test_ack_without_delivery_report_is_500(client, producer, monkeypatch):
+    monkeypatch.setattr(app, "KAFKA_DELIVERY_MODE", app.KAFKA_DELIVERY_MODE_ACK)
+    monkeypatch.setattr(app, "KAFKA_ACK_TIMEOUT", 0.1)
+    producer.release.clear()
+    assert post(client, read("data.json")).status_code == 500
+
+
+def test_ack_with_delivery_error_is_500(client, producer, monkeypatch):
+    monkeypatch.setattr(app, "KAFKA_DELIVERY_MODE", app.KAFKA_DELIVERY_MODE_ACK)
+    producer.error = KafkaError(KafkaError._MSG_TIMED_OUT)
+    assert post(client, read("data.json")).status_code == 500
+
+
+def test_ack_batch_awaits_all_reports(client, producer, monkeypatch, notification):
+    monkeypatch.setattr(app, "KAFKA_DELIVERY_MODE", app.KAFKA_DELIVERY_MODE_ACK)
+    response = post(client, json.dumps([notification] * 3), path="/relay-notifications")
+    assert [result["status"] for result in response.json["results"]] == [204] * 3
+    assert len(producer.messages) == 3
+
+
+def test_produce_batch_results_in_order(producer, monkeypatch):
+    monkeypatch.setattr(app, "KAFKA_DELIVERY_MODE", app.KAFKA_DELIVERY_MODE_FIRE_AND_FORGET)
+    assert app.produce_batch_to_kafka([("{}", JSON), (b"\xa0", CBOR)]) == [(True, ""), (True, "")]
+    assert [content_type_header(message) for message in producer.messages] == [JSON, CBOR]
+    producer.queue_full = True
+    assert app.produce_to_kafka("{}", JSON) == (False, app.KAFKA_QUEUE_FULL_ERROR)
+
+
+# =============================================================================
+# FORWARD MODES
+# =============================================================================
+
+@pytest.mark.parametrize("fixture, content_type", [("data.json", JSON), ("data.cbor", CBOR)])
+def test_raw_mode_forwards_the_body(client, producer, monkeypatch, fixture, content_type):
+    monkeypatch.setattr(app, "KAFKA_FORWARD_MODE", app.KAFKA_FORWARD_MODE_RAW)
+    body = read(fixture)
+    assert post(client, body, content_type).status_code == 204
+    [message] = producer.messages
+    assert message.value() == body
+    assert content_type_header(message) == content_type
+
+
+def test_raw_mode_reencodes_xml(client, producer, monkeypatch):
+    monkeypatch.setattr(app, "KAFKA_FORWARD_MODE", app.KAFKA_FORWARD_MODE_RAW)
+    assert post(client, read("data.xml"), XML).status_code == 204
+    [message] = producer.messages
+    assert content_type_header(message) == JSON
+    assert "notification" in json.loads(message.value())
+
+
+@pytest.mark.parametrize("fixture, content_type", [("data.json", JSON), ("data.cbor", CBOR)])
+def test_json_mode_normalizes(client, producer, monkeypatch, fixture, content_type):
+    monkeypatch.setattr(app, "KAFKA_FORWARD_MODE", app.KAFKA_FORWARD_MODE_JSON)
+    body = read(fixture)
+    assert post(client, body, content_type).status_code == 204
+    [message] = producer.messages
+    assert content_type_header(message) == JSON
+    decoded = json.loads(body) if content_type == JSON else cbor2.loads(body)
+    assert json.loads(message.value()) == decoded
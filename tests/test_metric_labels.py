@@ -0,0 +1,62 @@
+"""Label values of the request metrics: allowlists, normalization, and the Flask request counter."""
+
+import pytest
+from prometheus_client import REGISTRY
+
+import app
+from metric_labels import METRICS_LABEL_OTHER, METRICS_LABEL_UNKNOWN, request_labels
+
+
+@pytest.mark.parametrize("method, content_type, endpoint, labels, normalized", [
+    ("POST", "application/json", "/relay-notification",
+     {"method": "POST", "endpoint": "/relay-notification", "content_type": "application/json"}, []),
+    # Parameters and case of the media type are not part of the label
+    ("POST", "Application/XML; charset=utf-8", "/relay-notification",
+     {"method": "POST", "endpoint": "/relay-notification", "content_type": "application/xml"}, []),
+    ("POST", "application/cbor-seq", "/relay-notifications",
+     {"method": "POST", "endpoint": "/relay-notifications", "content_type": "application/cbor-seq"}, []),
+    ("GET", None, "/capabilities",
+     {"method": "GET", "endpoint": "/capabilities", "content_type": METRICS_LABEL_UNKNOWN}, []),
+    # Values taken from the request that are not allowlisted
+    ("POST", "text/x-anything-goes", "/relay-notification",
+     {"method": "POST", "endpoint": "/relay-notification", "content_type": METRICS_LABEL_OTHER}, ["content_type"]),
+    ("PROPFIND", "application/json", "/relay-notification",
+     {"method": METRICS_LABEL_OTHER, "endpoint": "/relay-notification", "content_type": "application/json"},
+     ["method"]),
+    ("get", None, "/capabilities",
+     {"method": METRICS_LABEL_OTHER, "endpoint": "/capabilities", "content_type": METRICS_LABEL_UNKNOWN}, ["method"]),
+    # Unrouted paths
+    ("GET", None, None,
+     {"method": "GET", "endpoint": METRICS_LABEL_OTHER, "content_type": METRICS_LABEL_UNKNOWN}, ["endpoint"]),
+    ("BREW", "", None,
+     {"method": METRICS_LABEL_OTHER, "endpoint": METRICS_LABEL_OTHER, "content_type": METRICS_LABEL_OTHER},
+     ["content_type", "endpoint", "method"]),
+])
+def test_request_labels(method, content_type, endpoint, labels, normalized):
+    assert request_labels(method, content_type, endpoint) == (labels, normalized)
+
+
+def sample(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_flask_unrouted_paths_share_one_series():
+    client = app.app.test_client()
+    labels = {"method": "GET", "endpoint": METRICS_LABEL_OTHER, "status_code": "404",
+              "content_type": METRICS_LABEL_UNKNOWN}
+    before = sample("http_requests_total", labels)
+    normalized = sample("metrics_labels_normalized_total", {"label": "endpoint"})
+    for path in ("/a", "/b/c", "/relay-notification/../../etc"):
+        assert client.get(path).status_code == 404
+    assert sample("http_requests_total", labels) == before + 3
+    assert sample("metrics_labels_normalized_total", {"label": "endpoint"}) == normalized + 3
+
+
+def test_flask_content_type_outside_the_allowlist():
+    client = app.app.test_client()
+    labels = {"method": "POST", "endpoint": "/relay-notification", "status_code": "415",
+              "content_type": METRICS_LABEL_OTHER}
+    before = sample("http_requests_total", labels)
+    for index in range(3):
+        client.post("/relay-notification", data=b"x", headers={"Content-Type": f"text/x-{index}"})
+    assert sample("http_requests_total", labels) == before + 3
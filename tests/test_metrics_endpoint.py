@@ -0,0 +1,60 @@
+"""/metrics of the Flask collector: the TTL cache of the rendered exposition and multi-process aggregation."""
+
+import pytest
+from prometheus_client import CollectorRegistry, Counter, values
+
+import app
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Count the renderings of /metrics, starting from an expired cache."""
+    calls = []
+
+    def render():
+        calls.append(None)
+        return f"render {len(calls)}\n".encode("ascii")
+
+    monkeypatch.setattr(app, "render_metrics", render)
+    monkeypatch.setitem(app.metrics_cache, "expires", 0.0)
+    monkeypatch.setitem(app.metrics_cache, "body", b"")
+    return calls
+
+
+def test_rendered_once_per_ttl(renders, monkeypatch):
+    monkeypatch.setattr(app, "METRICS_CACHE_TTL", 60.0)
+    client = app.app.test_client()
+    bodies = [client.get("/metrics").data for _ in range(5)]
+    assert bodies == [b"render 1\n"] * 5
+    assert len(renders) == 1
+
+
+def test_rendered_again_once_expired(renders, monkeypatch):
+    monkeypatch.setattr(app, "METRICS_CACHE_TTL", 60.0)
+    client = app.app.test_client()
+    client.get("/metrics")
+    app.metrics_cache["expires"] = 0.0
+    assert client.get("/metrics").data == b"render 2\n"
+    assert client.get("/metrics").data == b"render 2\n"
+
+
+def test_zero_ttl_renders_every_scrape(renders, monkeypatch):
+    monkeypatch.setattr(app, "METRICS_CACHE_TTL", 0.0)
+    client = app.app.test_client()
+    assert [client.get("/metrics").data for _ in range(3)] == [b"render 1\n", b"render 2\n", b"render 3\n"]
+
+
+def test_single_process_exposition(monkeypatch):
+    monkeypatch.setattr(app, "PROMETHEUS_MULTIPROC_DIR", None)
+    assert b"http_requests_total" in app.render_metrics()
+
+
+def test_multiprocess_counters_summed(tmp_path, monkeypatch):
+    # Two worker processes wrote their counter files into the shared directory
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    for pid, count in ((101, 2), (102, 3)):
+        monkeypatch.setattr(values, "ValueClass", values.MultiProcessValue(lambda pid=pid: pid))
+        counter = Counter("worker_test_notifications", "Test counter", registry=CollectorRegistry())
+        counter.inc(count)
+    monkeypatch.setattr(app, "PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    assert b"worker_test_notifications_total 5.0" in app.render_metrics()
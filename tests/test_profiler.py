@@ -0,0 +1,74 @@
+"""Stack sampler of /debug/profile: busy threads are sampled, waiting and ignored ones are not."""
+
+import selectors
+import socket
+import threading
+import time
+
+import pytest
+
+from profiler import StackSampler
+
+
+def spin(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def sleep_loop(stop):
+    while not stop.is_set():
+        time.sleep(0.001)
+
+
+def select_loop(stop):
+    with selectors.DefaultSelector() as selector:
+        selector.register(socket.socketpair()[0], selectors.EVENT_READ)
+        while not stop.is_set():
+            selector.select(0.05)
+
+
+@pytest.fixture
+def threads():
+    stop = threading.Event()
+    reader, writer = socket.socketpair()
+    started = []
+
+    def start(target, name, *args):
+        thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+        thread.start()
+        started.append(thread)
+
+    start(spin, "busy", stop)
+    start(stop.wait, "event")
+    start(reader.makefile("rb").readline, "keep-alive")
+    start(select_loop, "serve", stop)
+    start(sleep_loop, "watch-master", stop)
+    yield start, stop
+    stop.set()
+    writer.close()
+    for thread in started:
+        thread.join(1)
+    reader.close()
+
+
+def functions(profile):
+    return {frame.split("(")[0] for stack in profile.stacks for frame in stack}
+
+
+def test_idle_and_ignored_threads_are_not_sampled(threads):
+    sampler = StackSampler(0.005, 64, frozenset(["watch-master", "drain"]))
+    profile = sampler.sample(0.3)
+    assert "spin" in functions(profile)
+    assert not functions(profile) & {"wait", "readinto", "select", "sleep_loop"}
+    assert profile.idle_samples >= 3 * (profile.samples - 1)
+
+
+def test_ignored_thread_started_during_the_run(threads):
+    start, stop = threads
+    sampler = StackSampler(0.005, 64, frozenset(["drain"]))
+    timer = threading.Timer(0.05, start, args=(spin, "drain", stop))
+    timer.start()
+    profile = sampler.sample(0.3)
+    timer.join()
+    # Only the busy thread spins; the drain thread would double its samples
+    assert sum(count for stack, count in profile.stacks.items() if stack[-1].startswith("spin(")) <= profile.samples
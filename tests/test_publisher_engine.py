@@ -0,0 +1,168 @@
+"""Asyncio engine of the publisher: concurrent receivers, isolation of a blackholed one, discovery."""
+
+import argparse
+import asyncio
+import threading
+
+import pytest
+
+import publisher
+from publisher import URN_ENCODING, Receiver
+
+CAPABILITIES = {"receiver-capabilities": {"receiver-capability": [URN_ENCODING + "json"]}}
+
+
+class Response:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.headers = {"Content-Type": "application/json"}
+        self.body = body
+        self.text = ""
+
+    def json(self):
+        return self.body
+
+
+def make_args(**overrides):
+    values = dict(time=0.02, random=None, queue_size=10, verbose=False, pool_size=1, num_retries=3, batch_size=1,
+                  delta=False, compression="none", keyframe_interval=10, publisher_id="test", timeout=1,
+                  backoff_base=1, backoff_max=60, failure_threshold=3, replay_rate=50, spool_dir=None,
+                  spool_max_bytes=1024 * 1024, spool_max_age=86400, client_cert=None, client_key=None)
+    values.update(overrides)
+    return argparse.Namespace(**values)
+
+
+class Network:
+    """Collectors answered by per-receiver handlers, and a netlink dump that counts its calls."""
+
+    def __init__(self):
+        self.discovered = []
+        self.sent = []
+        self.fetches = 0
+        self.handlers = {}
+        self.capabilities = {}
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+
+    def get_capabilities(self, url, session=None, timeout=None):
+        name = url.split("/")[2]
+        with self.lock:
+            self.discovered.append(name)
+        return self.capabilities.get(name, lambda: Response(200, CAPABILITIES))()
+
+    def send_notification(self, url, payload, headers, session=None, timeout=None, content_coding=None):
+        name = url.split("/")[2]
+        status = self.handlers.get(name, lambda: 204)()
+        with self.lock:
+            self.sent.append((name, status))
+        return Response(status)
+
+    def fetch_data_new(self, ipr):
+        with self.lock:
+            self.fetches += 1
+        return [{"name": "eth0", "statistics": {"in-octets": self.fetches}}]
+
+    def blackhole(self):
+        # A collector that accepts the connection and never answers, until the test ends
+        self.release.wait(10)
+        return 204
+
+    def count(self, name):
+        with self.lock:
+            return sum(1 for sent, status in self.sent if sent == name and status == 204)
+
+
+@pytest.fixture
+def network(monkeypatch):
+    network = Network()
+    monkeypatch.setattr(publisher, "get_capabilities", network.get_capabilities)
+    monkeypatch.setattr(publisher, "send_notification", network.send_notification)
+    monkeypatch.setattr(publisher, "fetch_data_new", network.fetch_data_new)
+    yield network
+    network.release.set()
+    # Let the delivery threads finish while their output is still captured
+    for thread in threading.enumerate():
+        if thread.name.startswith("deliver"):
+            thread.join(5)
+
+
+def run(receivers, until, args=None, timeout=5.0):
+    """Run the publisher until until() holds or timeout seconds have passed."""
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        task = asyncio.create_task(publisher.run_publisher(None, args or make_args(), receivers))
+        deadline = loop.time() + timeout
+        while not until() and loop.time() < deadline and not task.done():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+
+
+def receivers(*names, args=None):
+    return [Receiver(name, 443, args or make_args()) for name in names]
+
+
+def test_receivers_are_delivered_to_in_parallel(network):
+    # Both first requests must be in flight at the same time to pass the barrier
+    barrier = threading.Barrier(2, timeout=2)
+    passed = []
+
+    def meet():
+        if not passed:
+            try:
+                barrier.wait()
+                passed.append(True)
+            except threading.BrokenBarrierError:
+                passed.append(False)
+        return 204
+
+    network.handlers = {"a:443": meet, "b:443": meet}
+    run(receivers("a", "b"), lambda: network.count("a:443") >= 2 and network.count("b:443") >= 2)
+    assert passed[:2] == [True, True]
+    assert network.count("a:443") >= 2 and network.count("b:443") >= 2
+
+
+def test_blackholed_receiver_does_not_block_the_other(network):
+    network.handlers = {"slow:443": network.blackhole}
+    run(receivers("slow", "fast"), lambda: network.count("fast:443") >= 5)
+    assert network.count("fast:443") >= 5
+    assert network.count("slow:443") == 0
+
+
+def test_collection_not_starved_by_blackholed_receivers(network):
+    # More blackholed receivers than threads in the default executor
+    names = [f"r{index}" for index in range(40)]
+    network.handlers = {f"{name}:443": network.blackhole for name in names}
+    run(receivers(*names), lambda: network.fetches >= 5)
+    assert network.fetches >= 5
+
+
+def test_rediscover_runs_for_each_receiver(network):
+    # Discovery is concurrent: all three capability requests must be in flight together
+    barrier = threading.Barrier(3, timeout=2)
+
+    def reachable():
+        barrier.wait()
+        return Response(200, CAPABILITIES)
+
+    def unreachable():
+        barrier.wait()
+        raise AssertionError("Failed to discover capabilities: connection refused")
+
+    network.capabilities = {"a:443": reachable, "b:443": reachable, "down:443": unreachable}
+    group = receivers("a", "b", "down")
+    run(group, lambda: network.count("a:443") >= 1 and network.count("b:443") >= 1)
+    assert sorted(network.discovered[:3]) == ["a:443", "b:443", "down:443"]
+    assert [receiver.encoding for receiver in group] == ["json", "json", None]
+    assert group[2].breaker.failures == 1
+
+
+def test_415_rediscovers_and_resends(network):
+    statuses = iter([415])
+    network.handlers = {"a:443": lambda: next(statuses, 204)}
+    run(receivers("a"), lambda: network.count("a:443") >= 1)
+    assert network.discovered.count("a:443") == 2
+    assert network.sent[:2] == [("a:443", 415), ("a:443", 204)]
@@ -0,0 +1,122 @@
+"""Backoff and circuit breaker of the publisher towards an unavailable collector."""
+
+import email.utils
+import time
+
+import pytest
+
+from publisher import parse_retry_after
+from retry_scheduler import CLOSED, HALF_OPEN, OPEN, RetryScheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def upper_bound(low, high):
+    return high
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def scheduler(clock, threshold=3, rng=upper_bound):
+    return RetryScheduler(1.0, 60.0, threshold, clock=clock, rng=rng)
+
+
+def test_failures_below_threshold_keep_circuit_closed(clock):
+    breaker = scheduler(clock)
+    assert breaker.record_failure() == 0.0
+    assert breaker.record_failure() == 0.0
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+    assert breaker.wait_time() == 0.0
+
+
+def test_threshold_opens_circuit_until_the_wait_is_over(clock):
+    breaker = scheduler(clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.record_failure() == 4.0    # base * 2 ** (3 - 1)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    clock.now += 3.0
+    assert breaker.wait_time() == pytest.approx(1.0)
+    assert not breaker.allow()
+
+    clock.now += 1.0
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+
+
+def test_probe_success_closes_circuit(clock):
+    breaker = scheduler(clock, threshold=1)
+    breaker.record_failure()
+    clock.now += 1.0
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+    # The count starts over: the next failure waits base_delay again
+    assert breaker.record_failure() == 1.0
+
+
+def test_probe_failure_reopens_with_longer_wait(clock):
+    breaker = scheduler(clock, threshold=1)
+    waits = []
+    for _ in range(8):
+        waits.append(breaker.record_failure())
+        assert breaker.state == OPEN
+        clock.now += waits[-1]
+        assert breaker.allow()
+        assert breaker.state == HALF_OPEN
+    assert waits == [1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 60.0, 60.0]
+
+
+def test_full_jitter_draws_between_zero_and_the_cap(clock):
+    draws = []
+
+    def rng(low, high):
+        draws.append((low, high))
+        return high / 2
+
+    breaker = scheduler(clock, threshold=1, rng=rng)
+    assert breaker.record_failure() == 0.5
+    assert draws == [(0, 1.0)]
+
+
+def test_retry_after_opens_at_once_and_is_a_lower_bound(clock):
+    breaker = scheduler(clock, threshold=5)
+    assert breaker.record_failure(retry_after=30) == 30
+    assert breaker.state == OPEN
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+    # A longer backoff wins over a short Retry-After
+    breaker = scheduler(clock, threshold=1)
+    for _ in range(5):
+        breaker.record_failure()
+    assert breaker.record_failure(retry_after=1) == 32.0
+
+
+class Response:
+    def __init__(self, retry_after):
+        self.headers = {} if retry_after is None else {"Retry-After": retry_after}
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(Response("120")) == 120.0
+    assert parse_retry_after(Response("-5")) == 0.0
+    assert parse_retry_after(Response(None)) is None
+    assert parse_retry_after(Response("soon")) is None
+    assert parse_retry_after(None) is None
+    date = email.utils.formatdate(time.time() + 60, usegmt=True)
+    assert 55 <= parse_retry_after(Response(date)) <= 60
@@ -0,0 +1,146 @@
+"""Shape splitting, structural fingerprints, namespace renaming and the LRU shape cache."""
+
+import copy
+
+import pytest
+
+from shape_cache import (
+    ShapeCache, prefixed_member_paths, split_structure, strip_prefixes_at, structural_fingerprint,
+)
+
+
+def interface(name="eth0", in_octets="0", enabled=True):
+    return {"name": name, "enabled": enabled, "statistics": {"in-octets": in_octets, "in-errors": 0}}
+
+
+def notification(*interfaces):
+    return {"ietf-https-notif:notification": {"interface_data": {"interface": list(interfaces)}}}
+
+
+# =============================================================================
+# FINGERPRINTS
+# =============================================================================
+
+def test_split_structure_collects_values_in_order():
+    shape, values = split_structure(notification(interface("eth0", "1"), interface("eth1", "2", False)))
+    assert values == ["eth0", True, "1", 0, "eth1", False, "2", 0]
+    assert split_structure(notification(interface("lo", "9"), interface("wl0", "8")))[0] == shape
+
+
+def test_same_shape_different_values_same_fingerprint():
+    assert structural_fingerprint(notification(interface("eth0", "1"))) == \
+        structural_fingerprint(notification(interface("veth12", "18446744073709551615", False)))
+
+
+@pytest.mark.parametrize("other", [
+    # One more list entry
+    notification(interface(), interface()),
+    # Another scalar type
+    notification(interface(in_octets=0)),
+    notification(interface(enabled="true")),
+    # Another member name, or another member order
+    {"ietf-https-notif:notification": {"interface_data": {"interfaces": [interface()]}}},
+    notification({"enabled": True, "name": "eth0", "statistics": {"in-octets": "0", "in-errors": 0}}),
+    # A prefixed member name
+    notification({"if:name": "eth0", "enabled": True, "statistics": {"in-octets": "0", "in-errors": 0}}),
+])
+def test_different_shape_different_fingerprint(other):
+    assert structural_fingerprint(notification(interface())) != structural_fingerprint(other)
+
+
+# =============================================================================
+# NAMESPACE RENAMING
+# =============================================================================
+
+PREFIXED = {
+    "ietf-https-notif:notification": {
+        "if:eventTime": "2025-03-17T22:33:58Z",
+        "interface_data": {"if:interface": [{"if:name": "eth0"}, {"name": "eth1", "x:stats": {"y:in": "1"}}]},
+    },
+}
+
+
+def test_prefixed_member_paths_parents_first():
+    assert prefixed_member_paths(PREFIXED) == [
+        (),
+        ("ietf-https-notif:notification",),
+        ("ietf-https-notif:notification", "interface_data"),
+        ("ietf-https-notif:notification", "interface_data", "if:interface", 0),
+        ("ietf-https-notif:notification", "interface_data", "if:interface", 1),
+        ("ietf-https-notif:notification", "interface_data", "if:interface", 1, "x:stats"),
+    ]
+
+
+def test_strip_prefixes_at_renames_in_place():
+    tree = copy.deepcopy(PREFIXED)
+    assert strip_prefixes_at(tree, prefixed_member_paths(tree)) is tree
+    assert tree == {
+        "notification": {
+            "eventTime": "2025-03-17T22:33:58Z",
+            "interface_data": {"interface": [{"name": "eth0"}, {"name": "eth1", "stats": {"in": "1"}}]},
+        },
+    }
+
+
+def test_strip_prefixes_at_paths_of_another_tree_of_the_shape():
+    paths = prefixed_member_paths(PREFIXED)
+    tree = copy.deepcopy(PREFIXED)
+    tree["ietf-https-notif:notification"]["interface_data"]["if:interface"][0]["if:name"] = "wl0"
+    strip_prefixes_at(tree, paths)
+    assert tree["notification"]["interface_data"]["interface"][0] == {"name": "wl0"}
+
+
+def test_strip_prefixes_at_keeps_member_order():
+    tree = {"a:x": 1, "y": 2, "b:z": 3}
+    assert list(strip_prefixes_at(tree, [()])) == ["x", "y", "z"]
+
+
+# =============================================================================
+# SHAPE CACHE
+# =============================================================================
+
+class Builder:
+    def __init__(self):
+        self.built = []
+
+    def __call__(self, shape):
+        def build():
+            self.built.append(shape)
+            return f"plan-{shape}"
+        return build
+
+
+def test_hit_returns_the_cached_result():
+    cache, build = ShapeCache(4), Builder()
+    assert cache.get("a", build("a")) == ("plan-a", False)
+    assert cache.get("a", build("a")) == ("plan-a", True)
+    assert build.built == ["a"]
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1, "evictions": 0}
+
+
+def test_least_recently_used_shape_evicted():
+    cache, build = ShapeCache(2), Builder()
+    cache.get("a", build("a"))
+    cache.get("b", build("b"))
+    # A hit makes "a" the most recently used
+    cache.get("a", build("a"))
+    cache.get("c", build("c"))
+    assert cache.get("a", build("a"))[1] is True
+    assert cache.get("b", build("b"))[1] is False
+    assert build.built == ["a", "b", "c", "b"]
+    assert cache.stats() == {"size": 2, "hits": 2, "misses": 4, "evictions": 2}
+
+
+def test_size_bounded_below_by_one():
+    cache, build = ShapeCache(0), Builder()
+    cache.get("a", build("a"))
+    cache.get("b", build("b"))
+    assert cache.stats()["size"] == 1
+
+
+def test_split_shapes_as_keys():
+    cache, build = ShapeCache(4), Builder()
+    first, _ = split_structure(notification(interface("eth0", "1")))
+    second, _ = split_structure(notification(interface("eth1", "2")))
+    cache.get(first, build(1))
+    assert cache.get(second, build(2)) == ("plan-1", True)
@@ -0,0 +1,124 @@
+"""Disk spool of the publisher: commit, restart, torn records and eviction."""
+
+import os
+import time
+
+import spool as spool_module
+from spool import SEGMENT_SUFFIX, Spool
+
+DAY = 86400
+
+
+def bodies(records):
+    return [record.body for record in records]
+
+
+def fill(spool, count, size=100, prefix=b"n"):
+    for index in range(count):
+        spool.append("application/json", (prefix + b"%04d" % index).ljust(size, b"."))
+
+
+def test_records_read_in_order_and_consumed_on_commit(tmp_path):
+    spool = Spool(str(tmp_path), 1024 * 1024, DAY)
+    for index in range(5):
+        spool.append("application/cbor", b"body-%d" % index)
+
+    records, position = spool.read(3)
+    assert bodies(records) == [b"body-0", b"body-1", b"body-2"]
+    assert records[0].content_type == "application/cbor"
+    # Not consumed until committed
+    assert bodies(spool.read(3)[0]) == [b"body-0", b"body-1", b"body-2"]
+
+    spool.commit(position)
+    records, position = spool.read(10)
+    assert bodies(records) == [b"body-3", b"body-4"]
+    spool.commit(position)
+    assert not spool.pending()
+    assert spool.read(10)[0] == []
+
+
+def test_restart_resumes_after_the_committed_records(tmp_path):
+    spool = Spool(str(tmp_path), 1024 * 1024, DAY)
+    spool.append("application/json", "first")
+    spool.append("application/json", "second")
+    spool.append("application/json", "third")
+    records, _ = spool.read(2)
+    spool.commit(records[-1].end)
+    spool.close()
+
+    restarted = Spool(str(tmp_path), 1024 * 1024, DAY)
+    assert restarted.pending()
+    restarted.append("application/json", "fourth")
+    records, position = restarted.read(10)
+    assert bodies(records) == [b"third", b"fourth"]
+    restarted.commit(position)
+    restarted.close()
+
+    assert not Spool(str(tmp_path), 1024 * 1024, DAY).pending()
+
+
+def test_torn_record_of_a_crashed_process_is_skipped(tmp_path):
+    spool = Spool(str(tmp_path), 1024 * 1024, DAY)
+    spool.append("application/json", "complete")
+    segment = spool._path(spool.active_id)
+    spool.close()
+    with open(segment, "ab") as f:
+        f.write(b"\x00\x01\x02")
+
+    restarted = Spool(str(tmp_path), 1024 * 1024, DAY)
+    restarted.append("application/json", "after restart")
+    records, position = restarted.read(10)
+    assert bodies(records) == [b"complete", b"after restart"]
+    restarted.commit(position)
+    assert not restarted.pending()
+
+
+def test_oldest_segments_evicted_beyond_max_bytes(tmp_path):
+    max_bytes = 2000
+    spool = Spool(str(tmp_path), max_bytes, DAY)
+    fill(spool, 60)
+
+    segments = [name for name in os.listdir(str(tmp_path)) if name.endswith(SEGMENT_SUFFIX)]
+    assert sum(os.path.getsize(os.path.join(str(tmp_path), name)) for name in segments) <= max_bytes
+    assert spool.evicted > 0
+
+    records, _ = spool.read(100)
+    kept = bodies(records)
+    assert kept[-1].startswith(b"n0059")
+    # The newest records survive, still in order and without gaps
+    first = int(kept[0][1:5])
+    assert [int(body[1:5]) for body in kept] == list(range(first, 60))
+
+
+def test_eviction_moves_an_uncommitted_cursor(tmp_path):
+    spool = Spool(str(tmp_path), 2000, DAY)
+    fill(spool, 3)
+    records, _ = spool.read(1)
+    spool.commit(records[0].end)
+    fill(spool, 60, prefix=b"m")
+    records, _ = spool.read(100)
+    assert records and all(body.startswith(b"m") for body in bodies(records))
+
+
+def test_expired_records_and_segments_dropped(tmp_path, monkeypatch):
+    spool = Spool(str(tmp_path), 1024 * 1024, 60)
+    now = time.time()
+    monkeypatch.setattr(spool_module.time, "time", lambda: now - 120)
+    spool.append("application/json", "expired")
+    monkeypatch.setattr(spool_module.time, "time", lambda: now)
+    spool.append("application/json", "fresh")
+
+    records, position = spool.read(10)
+    assert bodies(records) == [b"fresh"]
+    spool.commit(position)
+    assert not spool.pending()
+
+    # A whole segment older than max_age is deleted
+    spool.close()
+    restarted = Spool(str(tmp_path), 1024 * 1024, 60)
+    restarted.append("application/json", "new")
+    old = restarted.segments[0]
+    os.utime(restarted._path(old), (now - 120, now - 120))
+    restarted.evict()
+    assert old not in restarted.segments
+    assert restarted.evicted == 1
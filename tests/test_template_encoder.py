@@ -0,0 +1,101 @@
+"""Template encoder of the publisher: same output as encode_payload, rebuilt on structure changes."""
+
+import pytest
+
+from publisher import build_payload, encode_payload
+from template_encoder import TemplateEncoder
+
+ENCODINGS = ["json", "xml", "cbor"]
+
+
+def interface(name, in_octets=1000, out_octets=2000, description="uplink"):
+    return {
+        "name": name,
+        "description": description,
+        "enabled": True,
+        "mtu": 1500,
+        "statistics": {"in-octets": in_octets, "out-octets": out_octets, "in-errors": 0},
+        "ipv4": ["192.0.2.1", "192.0.2.2"],
+    }
+
+
+def payload(tick=0, names=("eth0", "eth1"), description="uplink"):
+    # Counters grow across the 1-, 2-, 4- and 8-byte CBOR integer sizes and the string lengths change
+    return build_payload(
+        f"2026-10-18T12:00:{tick:02d}Z",
+        [interface(name, in_octets=10 ** tick, out_octets=7 * 10 ** tick + tick, description=description * (1 + tick % 3))
+         for name in names],
+    )
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_same_output_as_encode_payload_across_value_changes(encoding):
+    encoder = TemplateEncoder(encode_payload)
+    for tick in range(20):
+        current = payload(tick)
+        assert encoder.encode(current, encoding) == encode_payload(current, encoding)
+    assert encoder.rebuilds == 1
+    # Encoded from the template, not by the fallback
+    assert encoder.templates[encoding][1] is not None
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_notification_data_encoded_like_encode_payload(encoding, notification):
+    encoder = TemplateEncoder(encode_payload)
+    assert encoder.encode(notification, encoding) == encode_payload(notification, encoding)
+    assert encoder.encode(notification, encoding) == encode_payload(notification, encoding)
+    assert encoder.rebuilds == 1
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_structure_change_rebuilds_the_template(encoding):
+    encoder = TemplateEncoder(encode_payload)
+    for names in (("eth0", "eth1"), ("eth0", "eth1", "eth2"), ("eth0",), ("eth0",)):
+        current = payload(3, names)
+        assert encoder.encode(current, encoding) == encode_payload(current, encoding)
+    assert encoder.rebuilds == 3
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_leaf_type_change_rebuilds_the_template(encoding):
+    encoder = TemplateEncoder(encode_payload)
+    first = payload(1)
+    second = payload(1)
+    second["ietf-https-notif:notification"]["interface_data"]["interface"][0]["mtu"] = "1500"
+    for current in (first, second, first):
+        assert encoder.encode(current, encoding) == encode_payload(current, encoding)
+    assert encoder.rebuilds == 3
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+@pytest.mark.parametrize("description", ['say "hi"', "back\\slash", "a & b", "<tag>", "café", "tab\there", "100%", "%s %d"])
+def test_values_that_need_escaping_match_encode_payload(encoding, description):
+    encoder = TemplateEncoder(encode_payload)
+    plain = payload(2)
+    special = payload(2, description=description)
+    for current in (plain, special, plain):
+        assert encoder.encode(current, encoding) == encode_payload(current, encoding)
+    assert encoder.rebuilds == 1
+
+
+def test_long_cbor_strings_match_encode_payload():
+    encoder = TemplateEncoder(encode_payload)
+    for length in (0, 23, 24, 255, 256, 70000):
+        current = payload(1, description="x" * length)
+        assert encoder.encode(current, "cbor") == encode_payload(current, "cbor")
+
+
+def test_negative_and_large_integers_match_encode_payload():
+    encoder = TemplateEncoder(encode_payload)
+    for value in (0, -1, -24, -25, 23, 24, 255, 256, 2 ** 32, 2 ** 64 - 1, 2 ** 64, -(2 ** 64) - 1):
+        current = payload(1)
+        current["ietf-https-notif:notification"]["interface_data"]["interface"][0]["mtu"] = value
+        for encoding in ENCODINGS:
+            assert encoder.encode(current, encoding) == encode_payload(current, encoding)
+
+
+def test_headers_are_a_copy():
+    encoder = TemplateEncoder(encode_payload)
+    body, headers = encoder.encode(payload(1), "cbor")
+    headers["Content-Encoding"] = "gzip"
+    assert encoder.encode(payload(2), "cbor")[1] == {"Content-Type": "application/cbor"}
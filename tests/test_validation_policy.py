@@ -0,0 +1,127 @@
+"""Validation policies: sampling cadence, trusted shapes, and new shapes always validated."""
+
+import pytest
+
+from validation_policy import (
+    OUTCOME_FAILED, OUTCOME_SKIPPED, OUTCOME_VALIDATED, POLICY_ALL, POLICY_SAMPLE, POLICY_TRUSTED,
+    ValidationPolicy,
+)
+
+
+def tree(in_octets="0", extra=None):
+    statistics = {"in-octets": in_octets}
+    if extra:
+        statistics.update(extra)
+    return {"ietf-https-notif:notification": {"interface_data": {"interface": [{"statistics": statistics}]}}}
+
+
+NEW_SHAPE = {"in-errors": 0}
+
+
+class Validator:
+    """Full validation stand-in that records its calls."""
+
+    def __init__(self, result=(True, None)):
+        self.result = result
+        self.calls = 0
+
+    def __call__(self, tree):
+        self.calls += 1
+        return self.result
+
+
+def outcomes(policy, publisher, trees, validate=None):
+    validate = validate or Validator()
+    return [policy.check(publisher, item, validate)[2] for item in trees]
+
+
+def test_all_validates_every_notification():
+    validate = Validator()
+    assert outcomes(ValidationPolicy(POLICY_ALL), "a", [tree()] * 3, validate) == [OUTCOME_VALIDATED] * 3
+    assert validate.calls == 3
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        ValidationPolicy("never")
+
+
+def test_failed_validation_reported():
+    policy = ValidationPolicy(POLICY_ALL)
+    assert policy.check("a", tree(), Validator((False, "bad"))) == (False, "bad", OUTCOME_FAILED)
+
+
+# =============================================================================
+# SAMPLING
+# =============================================================================
+
+def test_sample_rate_cadence_per_publisher():
+    policy = ValidationPolicy(POLICY_SAMPLE, sample_rate=3)
+    expected = [OUTCOME_VALIDATED, OUTCOME_SKIPPED, OUTCOME_SKIPPED] * 3
+    # Interleaved publishers keep their own cadence
+    a, b = [], []
+    for index in range(9):
+        a.append(policy.check("a", tree(str(index)), Validator())[2])
+        b.append(policy.check("b", tree(str(index)), Validator())[2])
+    assert a == expected and b == expected
+
+
+def test_sample_validates_a_new_shape_off_cadence():
+    policy = ValidationPolicy(POLICY_SAMPLE, sample_rate=3)
+    assert outcomes(policy, "a", [tree(), tree(extra=NEW_SHAPE), tree(), tree(extra=NEW_SHAPE)]) == [
+        OUTCOME_VALIDATED, OUTCOME_VALIDATED, OUTCOME_SKIPPED, OUTCOME_VALIDATED]
+
+
+def test_sample_revalidates_a_shape_that_failed():
+    policy = ValidationPolicy(POLICY_SAMPLE, sample_rate=10)
+    assert policy.check("a", tree(), Validator((False, "bad")))[2] == OUTCOME_FAILED
+    assert policy.check("a", tree(), Validator())[2] == OUTCOME_VALIDATED
+    assert policy.check("a", tree(), Validator())[2] == OUTCOME_SKIPPED
+
+
+# =============================================================================
+# TRUSTED PUBLISHERS
+# =============================================================================
+
+def test_trusted_shape_skips_validation():
+    policy = ValidationPolicy(POLICY_TRUSTED, trust_threshold=2)
+    validate = Validator()
+    trees = [tree(str(index)) for index in range(5)]
+    assert outcomes(policy, "a", trees, validate) == [OUTCOME_VALIDATED] * 2 + [OUTCOME_SKIPPED] * 3
+    assert validate.calls == 2
+
+
+def test_trusted_publisher_new_shape_validated():
+    policy = ValidationPolicy(POLICY_TRUSTED, trust_threshold=1)
+    assert outcomes(policy, "a", [tree(), tree("1"), tree(extra=NEW_SHAPE), tree(extra=NEW_SHAPE)]) == [
+        OUTCOME_VALIDATED, OUTCOME_SKIPPED, OUTCOME_VALIDATED, OUTCOME_SKIPPED]
+
+
+def test_trust_is_per_publisher():
+    policy = ValidationPolicy(POLICY_TRUSTED, trust_threshold=1)
+    assert outcomes(policy, "a", [tree(), tree()]) == [OUTCOME_VALIDATED, OUTCOME_SKIPPED]
+    assert outcomes(policy, "b", [tree()]) == [OUTCOME_VALIDATED]
+
+
+def test_failure_withdraws_trust():
+    policy = ValidationPolicy(POLICY_TRUSTED, trust_threshold=2)
+    outcomes(policy, "a", [tree()])
+    assert policy.check("a", tree(), Validator((False, "bad")))[2] == OUTCOME_FAILED
+    assert outcomes(policy, "a", [tree()] * 3) == [OUTCOME_VALIDATED, OUTCOME_VALIDATED, OUTCOME_SKIPPED]
+
+
+def test_fingerprint_given_by_the_caller():
+    policy = ValidationPolicy(POLICY_TRUSTED, trust_threshold=1)
+    validate = Validator()
+    policy.check("a", tree(), validate, fingerprint=1)
+    assert policy.check("a", tree(extra=NEW_SHAPE), validate, fingerprint=1)[2] == OUTCOME_SKIPPED
+
+
+def test_least_recently_seen_publishers_forgotten():
+    policy = ValidationPolicy(POLICY_TRUSTED, trust_threshold=1, max_publishers=2)
+    outcomes(policy, "a", [tree()])
+    outcomes(policy, "b", [tree()])
+    outcomes(policy, "a", [tree()])
+    outcomes(policy, "c", [tree()])
+    assert outcomes(policy, "a", [tree()]) == [OUTCOME_SKIPPED]
+    assert outcomes(policy, "b", [tree()]) == [OUTCOME_VALIDATED]
@@ -0,0 +1,218 @@
+"""
+Single-pass XML decoder and schema-driven type coercion.
+
+The decoder must produce the tree of the former path: xmltodict, namespace
+prefixes stripped below the top-level member, YANG lists and leaf-lists forced
+to arrays, and the coercion table applied. The only intended difference is
+that an empty leaf decodes to '' (its RFC 7951 value) instead of None.
+"""
+
+import json
+import os
+
+import cbor2
+import pytest
+import xmltodict
+from yangson.schemanode import InternalNode, LeafListNode, ListNode
+
+import app
+from conftest import DATA_DIR
+from publisher import encode_payload
+from xml_decoder import SequenceTooLong
+
+CONTEXT = app.pipeline_context
+DECODER = CONTEXT.xml_decoder
+TABLE = CONTEXT.coercion_table
+TOP = "ietf-https-notif:notification"
+
+
+def array_paths(node, path=()):
+    """Schema paths of every list and leaf-list of the data model."""
+    paths = set()
+    for child in node.data_children():
+        child_path = path + (child.name,)
+        if isinstance(child, (ListNode, LeafListNode)):
+            paths.add(child_path)
+        if isinstance(child, InternalNode):
+            paths |= array_paths(child, child_path)
+    return paths
+
+
+ARRAYS = array_paths(app.data_model.schema)
+
+
+def local(name):
+    return name.rpartition(":")[2]
+
+
+def strip_prefixes(tree):
+    if isinstance(tree, dict):
+        return {local(key): strip_prefixes(value) for key, value in tree.items()}
+    if isinstance(tree, list):
+        return [strip_prefixes(item) for item in tree]
+    return tree
+
+
+def xmltodict_path(body):
+    """The former decoding path, with the lists of the schema forced to arrays."""
+
+    def force_list(path, key, value):
+        return tuple(local(name) for name, _ in path[1:]) + (local(key),) in ARRAYS
+
+    def empty_leaf(path, key, value):
+        return key, "" if value is None else value
+
+    tree = xmltodict.parse(body, process_namespaces=False, force_list=force_list, postprocessor=empty_leaf)
+    tree = {key: strip_prefixes(value) for key, value in tree.items()}
+    return TABLE.apply(tree)
+
+
+def read(name):
+    with open(os.path.join(DATA_DIR, name), "rb") as f:
+        return f.read()
+
+
+def rendered(notification):
+    body, _ = encode_payload(notification, "xml")
+    return body.encode("utf-8")
+
+
+def notification_xml(interfaces, root=f"<{TOP}>", end=f"</{TOP}>"):
+    return (f"{root}<eventTime>2025-03-17T22:33:58Z</eventTime>"
+            f"<interface_data>{interfaces}</interface_data>{end}").encode("utf-8")
+
+
+# =============================================================================
+# PARITY WITH THE FORMER PATH
+# =============================================================================
+
+@pytest.mark.parametrize("fixture", ["data.xml", "data.json"])
+def test_same_tree_as_xmltodict_path(fixture, notification):
+    body = read(fixture) if fixture.endswith(".xml") else rendered(notification)
+    assert DECODER.decode(body) == xmltodict_path(body)
+
+
+def test_rendered_json_fixture_decodes_to_the_json_fixture(notification):
+    decoded = DECODER.decode(rendered(notification))
+    # Empty leaf-lists have no XML representation
+    expected = json.loads(json.dumps(notification))
+    for interface in expected[TOP]["interface_data"]["interface"]:
+        for name in ("higher-layer-if", "lower-layer-if"):
+            if interface[name] == []:
+                del interface[name]
+    assert decoded == expected
+
+
+def test_cbor_fixture_coerced_to_the_json_fixture(notification):
+    assert TABLE.apply(cbor2.loads(read("data.cbor"))) == notification
+
+
+def test_sequence_decoded_like_single_documents():
+    body = read("data.xml")
+    sequence = b'<?xml version="1.0" encoding="UTF-8"?>\n' + body + b"\n" + body
+    assert DECODER.decode_sequence(sequence) == [DECODER.decode(body)] * 2
+
+
+# =============================================================================
+# LISTS AND REPEATED ELEMENTS
+# =============================================================================
+
+def test_single_list_entry_is_an_array():
+    tree = DECODER.decode(notification_xml(
+        "<interface><name>eth0</name><higher-layer-if>lo</higher-layer-if></interface>"))
+    assert tree[TOP]["interface_data"]["interface"] == [{"name": "eth0", "higher-layer-if": ["lo"]}]
+
+
+def test_list_entries_keep_their_order():
+    tree = DECODER.decode(notification_xml(
+        "<interface><name>eth0</name><lower-layer-if>a</lower-layer-if><lower-layer-if>b</lower-layer-if>"
+        "</interface><interface><name>eth1</name></interface>"))
+    interfaces = tree[TOP]["interface_data"]["interface"]
+    assert [interface["name"] for interface in interfaces] == ["eth0", "eth1"]
+    assert interfaces[0]["lower-layer-if"] == ["a", "b"]
+
+
+@pytest.mark.parametrize("element, expected", [
+    # Containers and leaves of the schema keep every occurrence, for validation to reject
+    ("<name>eth0</name><name>eth1</name><name>eth2</name>", {"name": ["eth0", "eth1", "eth2"]}),
+    ("<statistics><in-errors>1</in-errors></statistics><statistics><in-errors>2</in-errors></statistics>",
+     {"statistics": [{"in-errors": 1}, {"in-errors": 2}]}),
+    # Unknown elements are decoded without coercion
+    ("<vendor>1</vendor><vendor><x>2</x></vendor>", {"vendor": ["1", {"x": "2"}]}),
+    ("<vendor/>", {"vendor": None}),
+])
+def test_repeated_and_unknown_elements(element, expected):
+    tree = DECODER.decode(notification_xml(f"<interface>{element}</interface>"))
+    assert tree[TOP]["interface_data"]["interface"] == [expected]
+
+
+# =============================================================================
+# SEQUENCES
+# =============================================================================
+
+def test_sequence_too_long():
+    document = notification_xml("<interface><name>eth0</name></interface>")
+    assert len(DECODER.decode_sequence(document * 3, max_items=3)) == 3
+    with pytest.raises(SequenceTooLong):
+        DECODER.decode_sequence(document * 4, max_items=3)
+    # A ValueError, reported like any other malformed sequence
+    assert issubclass(SequenceTooLong, ValueError)
+
+
+# =============================================================================
+# NAMESPACES
+# =============================================================================
+
+@pytest.mark.parametrize("root, end", [
+    # Module prefix sent without a declaration
+    (f"<{TOP}>", f"</{TOP}>"),
+    ('<notification xmlns="urn:ietf:params:xml:ns:netconf:notification:1.0">', "</notification>"),
+    ('<if:notification xmlns:if="urn:ietf:params:xml:ns:netconf:notification:1.0">', "</if:notification>"),
+])
+def test_namespace_prefixes_stripped(root, end):
+    body = notification_xml(
+        "<if:interface><if:name>eth0</if:name><if:statistics><if:in-errors>3</if:in-errors></if:statistics>"
+        "</if:interface>", root, end)
+    tree = DECODER.decode(body)
+    # Only the top-level member is module-qualified, whatever prefix the document uses
+    assert list(tree) == [TOP]
+    assert tree[TOP]["interface_data"]["interface"] == [{"name": "eth0", "statistics": {"in-errors": 3}}]
+
+
+# =============================================================================
+# TYPE COERCION
+# =============================================================================
+
+def statistics(xml):
+    tree = DECODER.decode(notification_xml(f"<interface><statistics>{xml}</statistics></interface>"))
+    return tree[TOP]["interface_data"]["interface"][0]["statistics"]
+
+
+@pytest.mark.parametrize("xml, expected", [
+    # counter64 stays a string, also beyond the int64 range
+    ("<in-octets>18446744073709551615</in-octets>", {"in-octets": "18446744073709551615"}),
+    ("<in-octets>0</in-octets>", {"in-octets": "0"}),
+    # counter32 becomes a number, unless it is not a YANG integer
+    ("<in-errors>4294967295</in-errors>", {"in-errors": 4294967295}),
+    ("<in-errors>1_000</in-errors>", {"in-errors": "1_000"}),
+    ("<in-errors>many</in-errors>", {"in-errors": "many"}),
+])
+def test_integer_leaves(xml, expected):
+    assert statistics(xml) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    (2 ** 63, "9223372036854775808"),
+    (0, "0"),
+    ("12", "12"),
+])
+def test_cbor_int64_becomes_a_string(value, expected):
+    tree = {TOP: {"interface_data": {"interface": [{"speed": value, "statistics": {"in-octets": value}}]}}}
+    interface = TABLE.apply(tree)[TOP]["interface_data"]["interface"][0]
+    assert interface == {"speed": expected, "statistics": {"in-octets": expected}}
+
+
+@pytest.mark.parametrize("text, expected", [("true", True), ("false", False), ("yes", "yes")])
+def test_boolean_leaf(text, expected):
+    tree = DECODER.decode(notification_xml(f"<interface><enabled>{text}</enabled></interface>"))
+    assert tree[TOP]["interface_data"]["interface"] == [{"enabled": expected}]
@@ -0,0 +1,150 @@
+"""
+Conformance of the compiled YANG validator with yangson.
+
+The compiled validator must accept exactly what yangson accepts: every
+notification of the corpus is checked by both, and they have to agree.
+"""
+
+import copy
+from typing import Any, Dict, List, Tuple
+
+import pytest
+from yangson.enumerations import ContentType
+
+import app
+from shape_cache import split_structure
+from yang_validator import CompiledValidator
+
+CONFORMANCE_SAMPLE = {
+    "ietf-https-notif:notification": {
+        "eventTime": "2025-03-17T19:43:27.972894Z",
+        "interface_data": {
+            "interface": [
+                {
+                    "name": "eth0",
+                    "description": "",
+                    "type": "1",
+                    "enabled": True,
+                    "admin-status": "up",
+                    "oper-status": "up",
+                    "if-index": 2,
+                    "phys-address": "3c:91:80:2b:68:23",
+                    "higher-layer-if": ["lo"],
+                    "lower-layer-if": [],
+                    "speed": "0",
+                    "statistics": {
+                        "discontinuity-time": "2025-03-17T19:43:27.952507Z",
+                        "in-octets": "1592834446",
+                        "in-unicast-pkts": "5375799",
+                        "in-multicast-pkts": "0",
+                        "in-discards": 24880,
+                        "in-errors": 0,
+                        "out-octets": "70768027",
+                        "out-unicast-pkts": "173281",
+                        "out-discards": 0,
+                        "out-errors": 0
+                    }
+                },
+                {
+                    "name": "lo",
+                    "type": "772",
+                    "enabled": False,
+                    "admin-status": "testing",
+                    "oper-status": "unknown",
+                    "if-index": 1,
+                    "statistics": {
+                        "discontinuity-time": "2025-03-17T19:43:27+02:00",
+                        "in-octets": "18446744073709551615",
+                        "in-unknown-protos": 4294967295
+                    }
+                }
+            ]
+        }
+    }
+}
+
+
+def _mutate(path: Tuple[Any, ...], value: Any = None, delete: bool = False) -> Dict[str, Any]:
+    """Return a copy of CONFORMANCE_SAMPLE with one member replaced or deleted."""
+    sample = copy.deepcopy(CONFORMANCE_SAMPLE)
+    target = sample["ietf-https-notif:notification"]
+    for step in path[:-1]:
+        target = target[step]
+    if delete:
+        del target[path[-1]]
+    else:
+        target[path[-1]] = value
+    return sample
+
+
+def conformance_corpus() -> List[Tuple[str, Any]]:
+    """Valid and invalid notifications, as (label, raw_instance) pairs."""
+    iface = ("interface_data", "interface", 0)
+    stats = iface + ("statistics",)
+    return [
+        ("valid sample", CONFORMANCE_SAMPLE),
+        ("empty notification", {"ietf-https-notif:notification": {}}),
+        ("unqualified root", {"notification": CONFORMANCE_SAMPLE["ietf-https-notif:notification"]}),
+        ("root is not an object", []),
+        ("unknown member", _mutate(("bogus",), 1)),
+        ("eventTime without timezone", _mutate(("eventTime",), "2025-03-17T19:43:27")),
+        ("eventTime as integer", _mutate(("eventTime",), 1742240607)),
+        ("interface list as object", _mutate(("interface_data", "interface"), {"name": "eth0"})),
+        ("empty interface list", _mutate(("interface_data", "interface"), [])),
+        ("missing mandatory type", _mutate(iface + ("type",), delete=True)),
+        ("missing mandatory statistics", _mutate(iface + ("statistics",), delete=True)),
+        ("missing discontinuity-time", _mutate(stats + ("discontinuity-time",), delete=True)),
+        ("enabled as string", _mutate(iface + ("enabled",), "true")),
+        ("unknown admin-status", _mutate(iface + ("admin-status",), "disabled")),
+        ("oper-status not in enum", _mutate(iface + ("oper-status",), "testing")),
+        ("if-index out of range", _mutate(iface + ("if-index",), 0)),
+        ("if-index as string", _mutate(iface + ("if-index",), "2")),
+        ("if-index as boolean", _mutate(iface + ("if-index",), True)),
+        ("bad phys-address", _mutate(iface + ("phys-address",), "not-a-mac")),
+        ("counter64 as integer", _mutate(stats + ("in-octets",), 1592834446)),
+        ("counter64 not numeric", _mutate(stats + ("in-octets",), "many")),
+        ("counter64 overflow", _mutate(stats + ("in-octets",), "18446744073709551616")),
+        ("negative counter64", _mutate(stats + ("out-octets",), "-1")),
+        ("counter32 as string", _mutate(stats + ("in-discards",), "24880")),
+        ("counter32 overflow", _mutate(stats + ("in-errors",), 4294967296)),
+        ("negative counter32", _mutate(stats + ("out-errors",), -1)),
+        ("gauge64 as integer", _mutate(iface + ("speed",), 0)),
+        ("leafref to unknown interface", _mutate(iface + ("higher-layer-if",), ["eth9"])),
+        ("leafref not a list", _mutate(iface + ("lower-layer-if",), "lo")),
+        ("qualified member name", _mutate(("interface_data", "interface", 1, "ietf-https-notif:description"),
+                                          "loopback")),
+        ("duplicate key", _mutate(("interface_data", "interface", 1, "name"), "eth0")),
+    ]
+
+
+@pytest.fixture(scope="module")
+def validator() -> CompiledValidator:
+    return CompiledValidator(app.data_model)
+
+
+def yangson_accepts(raw: Any) -> bool:
+    try:
+        app.data_model.from_raw(raw).validate(ctype=ContentType.all)
+        return True
+    except Exception:
+        return False
+
+
+@pytest.mark.parametrize("label, raw", conformance_corpus(), ids=[label for label, _ in conformance_corpus()])
+def test_compiled_validator_agrees_with_yangson(validator, label, raw):
+    assert validator.check(raw) == yangson_accepts(raw)
+
+
+def test_corpus_has_valid_and_invalid_cases():
+    verdicts = {yangson_accepts(raw) for _, raw in conformance_corpus()}
+    assert verdicts == {True, False}
+
+
+def test_plan_checks_values_of_same_shape(validator):
+    # The plan of one notification decides on every notification with its shape from the values alone
+    shape, _ = split_structure(CONFORMANCE_SAMPLE)
+    plan = validator.compile_plan(CONFORMANCE_SAMPLE)
+    same_shape = [(label, raw) for label, raw in conformance_corpus() if split_structure(raw)[0] == shape]
+    assert len(same_shape) > 5
+    for label, raw in same_shape:
+        assert plan.check(split_structure(raw)[1]) == yangson_accepts(raw), label